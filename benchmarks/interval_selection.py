@@ -0,0 +1,57 @@
+'''
+filter_images_by_interval on a large search result: single grouped pass against
+the historical implementation, which rescanned all the images for every selected date.
+
+    python benchmarks/interval_selection.py --items 100000 --days 1095 --interval 3
+'''
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions import gee_delivery
+
+
+def filter_images_by_interval_reference(image_ids, interval_days):
+    dates_images = sorted([(datetime.strptime(image_id.split('_')[0], '%Y%m%d'), image_id) for image_id in image_ids], key=lambda x: x[0])
+    filtered_image_ids = []
+    last_selected_date = None
+    for date, image_id in dates_images:
+        if last_selected_date is None or date >= last_selected_date + timedelta(days=interval_days):
+            last_selected_date = date
+            filtered_image_ids.extend([img_id for img_date, img_id in dates_images if img_date == date])
+    return filtered_image_ids
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=1095, help='number of acquisition days spanned by the items')
+    parser.add_argument('--interval', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    first = datetime(2020, 1, 1)
+    image_ids = [f'{first + timedelta(days=rng.randrange(args.days)):%Y%m%d}_101010_{i:06d}_1234' for i in range(args.items)]
+
+    new, new_time = timed(gee_delivery.filter_images_by_interval, image_ids, args.interval)
+    old, old_time = timed(filter_images_by_interval_reference, image_ids, args.interval)
+    assert new == old
+
+    print(f'{args.items} items over {args.days} days, interval {args.interval} days: {len(new)} selected')
+    print(f'  historical: {old_time:7.3f} s')
+    print(f'  grouped   : {new_time:7.3f} s (x{old_time / new_time:.0f})')
+
+
+if __name__ == '__main__':
+    main()
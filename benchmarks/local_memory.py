@@ -0,0 +1,126 @@
+'''
+Peak memory (RSS) of the local backend on synthetic scenes of growing size:
+whole image in memory (processImage) against tiles (processImageTiled). With
+tiles, the peak RSS should stay flat as the scene grows (O(tile) memory).
+
+Each run happens in a fresh process so that its peak RSS is measured alone,
+with GDAL's block cache bounded by GDAL_CACHEMAX (--gdal-cachemax, in MB):
+by default GDAL caches up to 5 % of the RAM of blocks already read, which grows
+with the scene and hides the memory bound of the tiles.
+
+    python benchmarks/local_memory.py --sizes 2000 3500 5000 --tile-sizes 512 1024
+'''
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENE = '20200101_101010_00_1234_3B_AnalyticMS_SR.tif'
+
+
+def writeScene(path, size, block=1000, seed=0):
+    # Scène synthétique écrite par blocs : la génération ne charge jamais toute l'image
+    import rasterio
+    from rasterio import windows
+    from rasterio.transform import from_origin
+    from scipy import ndimage
+
+    rng = np.random.default_rng(seed)
+    with rasterio.open(path, 'w', driver='GTiff', height=size, width=size, count=5, dtype='uint16', tiled=True,
+                       crs='EPSG:32631', transform=from_origin(600000, 5000000, 3, 3)) as dst:
+        for row in range(0, size, block):
+            for col in range(0, size, block):
+                window = windows.Window(col, row, min(block, size - col), min(block, size - row))
+                shape = (window.height, window.width)
+                field = lambda: ndimage.gaussian_filter(rng.normal(size=shape), 4) * 4000
+                data = np.stack([500 + np.zeros(shape), 1000 + field(), 800 + field() * 0.75, 1000 + field(),
+                                 (field() > -80).astype(float)]).clip(1, 65535)
+                dst.write(data.astype('uint16'), window=window)
+
+
+def dgoGrid(size, n=4):
+    # n x n DGOs rectangulaires couvrant la scène
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    step = size * 3 / n
+    boxes = [box(600000 + i * step, 5000000 - (j + 1) * step, 600000 + (i + 1) * step, 5000000 - j * step)
+             for j in range(n) for i in range(n)]
+    return gpd.GeoDataFrame({'DGO_FID': range(len(boxes))}, geometry=boxes, crs='EPSG:32631')
+
+
+def run(path, size, tile_size):
+    # Exécuté dans un processus dédié : affiche la durée et le pic de RSS en Mo
+    from functions import local_planet
+
+    dgos = dgoGrid(size)
+    start = time.perf_counter()
+    if tile_size:
+        local_planet.processImageTiled(path, dgos, 3, -0.05, tile_size)
+    else:
+        local_planet.processImage(path, dgos, 3, -0.05)
+    elapsed = time.perf_counter() - start
+
+    print(f'{elapsed:.2f} {peakRSS():.0f}')
+
+
+def peakRSS():
+    # Pic de RSS du processus en Mo. Sous Linux, ru_maxrss conserve après exec le pic du processus parent
+    # (qui a écrit les scènes) : VmHWM est remis à zéro par exec
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+
+    # ru_maxrss est en octets sous macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 3500, 5000], help='scene widths and heights in pixels')
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[512, 1024])
+    parser.add_argument('--gdal-cachemax', type=int, default=32, help='GDAL block cache size in MB')
+    parser.add_argument('--no-memory', action='store_true', help='skip the whole-image runs')
+    parser.add_argument('--run', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        path, size, tile_size = args.run
+        return run(path, int(size), int(tile_size))
+
+    env = dict(os.environ, GDAL_CACHEMAX=str(args.gdal_cachemax))
+    configurations = ([] if args.no_memory else [0]) + args.tile_sizes
+    results = {tile_size: [] for tile_size in configurations}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            # Le nom de fichier donne la date d'acquisition : une scène par sous-dossier
+            os.makedirs(os.path.join(directory, str(size)))
+            path = os.path.join(directory, str(size), SCENE)
+            writeScene(path, size)
+            print(f'scene {size} x {size} px, {os.path.getsize(path) / 1024**2:.0f} MB on disk')
+
+            for tile_size in configurations:
+                output = subprocess.run([sys.executable, __file__, '--run', path, str(size), str(tile_size)],
+                                        check=True, capture_output=True, text=True, env=env).stdout.split()
+                results[tile_size].append((float(output[0]), float(output[1])))
+            os.remove(path)
+
+    # Pic de RSS (et durée) par configuration et par taille de scène
+    print(f'\npeak RSS in MB (time in s), GDAL_CACHEMAX={args.gdal_cachemax} MB')
+    print(f'{"":>12} ' + ' '.join(f'{f"{size} px":>16}' for size in args.sizes))
+    for tile_size, values in results.items():
+        label = f'tiles {tile_size}' if tile_size else 'in memory'
+        print(f'{label:>12} ' + ' '.join(f'{f"{peak:.0f} ({elapsed:.1f})":>16}' for elapsed, peak in values))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+'''
+Scaling of the local backend with the number of worker processes (one image per
+task, chunksize images sent at once to each process).
+
+    python benchmarks/local_workers.py --images 16 --size 1500 --workers 1 2 4 8
+'''
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_memory import SCENE, dgoGrid, writeScene
+from functions import local_planet
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=16)
+    parser.add_argument('--size', type=int, default=1500, help='scene width and height in pixels')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunksize', type=int, default=1)
+    parser.add_argument('--tile-size', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Une scène générée puis copiée à des dates successives
+        first = os.path.join(directory, SCENE)
+        writeScene(first, args.size)
+        for i in range(1, args.images):
+            shutil.copy(first, os.path.join(directory, SCENE.replace('20200101', f'2020{1 + i // 28:02d}{1 + i % 28:02d}')))
+
+        image_paths = local_planet.listPlanetImages(directory)
+        dgos = dgoGrid(args.size)
+        print(f'{len(image_paths)} scenes of {args.size} x {args.size} px, {len(dgos)} DGOs, {os.cpu_count()} CPUs')
+
+        reference = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            metrics = local_planet.calculateDGOsMetrics(image_paths, dgos, 3, -0.05, args.tile_size, workers, args.chunksize)
+            elapsed = time.perf_counter() - start
+
+            # Les résultats ne dépendent pas du nombre de processus
+            if reference is None:
+                reference, baseline = metrics, elapsed
+            else:
+                pd.testing.assert_frame_equal(reference, metrics)
+            print(f'{workers:>2} workers: {elapsed:7.2f} s, speedup x{baseline / elapsed:.2f}')
+
+
+if __name__ == '__main__':
+    main()
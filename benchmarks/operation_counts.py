@@ -0,0 +1,60 @@
+'''
+Server-side operations of one image x DGO pair: the historical per-class
+metrics (imageDGOMetrics(fused=False): three vectorizations and separate
+reductions) against the fused computation (fused=True), counted on the
+serialized computation graph with dgo_metrics_planet.countOperations.
+
+Requires Earth Engine credentials (the graph is built with the server's
+function signatures) but no asset: the scene is a synthetic random image and
+the DGO a square. Nothing is computed, only serialized.
+
+    python benchmarks/operation_counts.py --project my-project
+'''
+import os
+import sys
+import argparse
+
+import ee
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions import classification_planet, dgo_metrics_planet
+
+OPERATIONS = ['Image.reduceRegion', 'Image.reduceToVectors', 'Collection.reduceColumns', 'Image.convolve']
+
+
+def syntheticScene(crs):
+    # Bandes PlanetScope aléatoires (une graine par bande) et masque clair, classées comme par startWorkflow
+    bands = [ee.Image.random(seed).multiply(3000).rename(name) for seed, name in enumerate(['blue', 'green', 'red', 'nir'])]
+    clear = ee.Image.random(4).gt(0.2).rename('CLEAR')
+    image = ee.Image.cat(bands + [clear]).reproject(ee.Projection(crs).atScale(3)).set('acquired', '2020-01-01T10:00:00')
+    collection = classification_planet.calculateIndicators(ee.ImageCollection([image]))
+    return ee.Image(classification_planet.classifyObjects(collection, -0.2).first())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project', required=True)
+    parser.add_argument('--perimeter', choices=['vector', 'raster'], default='vector', help='perimeter mode of the fused computation')
+    args = parser.parse_args()
+
+    ee.Initialize(project=args.project)
+
+    crs = 'EPSG:32631'
+    image = syntheticScene(crs)
+    dgo = ee.Feature(ee.Geometry.Rectangle([600000, 4999700, 600300, 5000000], crs, False), {'DGO_FID': 1})
+
+    versions = {
+        'per class': dgo_metrics_planet.imageDGOMetrics(image, dgo, 3, fused=False),
+        'fused': dgo_metrics_planet.imageDGOMetrics(image, dgo, 3, fused=True, perimeter=args.perimeter),
+    }
+    counts = {name: dgo_metrics_planet.countOperations(graph) for name, graph in versions.items()}
+
+    print(f'{"operation":>26} ' + ' '.join(f'{name:>10}' for name in versions))
+    for operation in OPERATIONS:
+        print(f'{operation:>26} ' + ' '.join(f'{counts[name][operation]:>10}' for name in versions))
+    print(f'{"all operations":>26} ' + ' '.join(f'{sum(counts[name].values()):>10}' for name in versions))
+
+
+if __name__ == '__main__':
+    main()
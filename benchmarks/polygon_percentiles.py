@@ -0,0 +1,104 @@
+'''
+Polygon-size percentiles on Earth Engine: reduceColumns on the vectorized
+polygons (polygonPercentiles) against the historical aggregate_array(...).reduce,
+which first materializes the list of polygon sizes.
+
+Requires Earth Engine credentials but no asset: the WATER masks are synthetic,
+heavily fragmented random checkerboards (ee.Image.random in cells of --cell
+metres, one seed per image) and the DGOs a grid of squares, so the benchmark is
+reproducible. Both versions are timed alternately (median wall time of getInfo)
+and their results are checked to be equal.
+
+    python benchmarks/polygon_percentiles.py --project my-project --images 5 --dgo-count 20
+'''
+import os
+import sys
+import time
+import argparse
+import statistics
+
+import ee
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions import dgo_metrics_planet
+
+PERCENTILES = list(range(0, 110, 10))
+
+
+def aggregatePercentiles(vectors, prefix):
+    # Implémentation historique
+    return vectors.aggregate_array('count').reduce(ee.Reducer.percentile(
+        percentiles=PERCENTILES,
+        outputNames=[f'{prefix}_POLYGONS_p{pc}' for pc in PERCENTILES]
+    ))
+
+
+def syntheticWater(seed, fraction, cell, crs):
+    # Damier aléatoire : chaque cellule de cell mètres est en eau avec la probabilité fraction
+    return ee.Image.random(seed).reproject(ee.Projection(crs).atScale(cell)).lt(fraction).rename('WATER')
+
+
+def syntheticDGOs(count, size, origin, crs):
+    # Grille de DGOs carrés de size mètres, en rangées de 10 DGOs
+    x0, y0 = origin
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Rectangle([x0 + (i % 10) * size, y0 - (i // 10 + 1) * size,
+                                          x0 + (i % 10 + 1) * size, y0 - (i // 10) * size], crs, False), {'DGO_FID': i})
+        for i in range(count)
+    ])
+
+
+def pairPercentiles(collection, dgos, scale, percentiles):
+    # Percentiles de taille des polygones d'eau pour chaque paire image × DGO
+    def dgoPercentiles(dgo):
+        def imagePercentiles(image):
+            vectors = ee.Image(image).select('WATER').reduceToVectors(
+                geometry=dgo.geometry(), scale=scale, eightConnected=True, maxPixels=1e16, geometryType='polygon'
+            ).filter('label == 1')
+            return ee.Feature(None, ee.Dictionary(percentiles(vectors, 'WATER')))
+        return ee.FeatureCollection(collection.map(imagePercentiles))
+    return dgos.map(dgoPercentiles).flatten()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--project', required=True)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--dgo-count', type=int, default=20)
+    parser.add_argument('--dgo-size', type=float, default=300, help='side of the square DGOs in metres')
+    parser.add_argument('--cell', type=float, default=3, help='side of the checkerboard cells in metres')
+    parser.add_argument('--water-fraction', type=float, default=0.4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ee.Initialize(project=args.project)
+
+    crs = 'EPSG:32631'
+    dgos = syntheticDGOs(args.dgo_count, args.dgo_size, (600000, 5000000), crs)
+    collection = ee.ImageCollection([syntheticWater(seed, args.water_fraction, args.cell, crs) for seed in range(args.images)])
+
+    versions = {
+        'aggregate_array': pairPercentiles(collection, dgos, 3, aggregatePercentiles),
+        'reduceColumns': pairPercentiles(collection, dgos, 3, dgo_metrics_planet.polygonPercentiles),
+    }
+
+    times = {name: [] for name in versions}
+    results = {}
+    for i in range(args.repeat):
+        # Ordre alterné pour ne pas avantager la version qui profite du cache du serveur
+        for name in (list(versions) if i % 2 == 0 else list(versions)[::-1]):
+            start = time.perf_counter()
+            results[name] = versions[name].getInfo()['features']
+            times[name].append(time.perf_counter() - start)
+
+    old, new = ([f['properties'] for f in results[name]] for name in versions)
+    assert old == new, 'percentiles differ'
+
+    print(f'{len(new)} image x DGO pairs, {args.repeat} runs')
+    for name, values in times.items():
+        print(f'{name:>16}: median {statistics.median(values):6.2f} s (min {min(values):.2f} s)')
+
+
+if __name__ == '__main__':
+    main()
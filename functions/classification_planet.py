@@ -1,5 +1,33 @@
 import ee
 
+######
+## Preprocessing
+
+def mosaicSameDay(collection):
+    '''
+    Mosaic the scenes acquired the same day into one image per date, giving
+    priority at each pixel to the scenes flagged clear (CLEAR band).
+    '''
+    collection = collection.map(lambda image: image.set('DAY', ee.Date(image.get('acquired')).format('YYYY-MM-dd')))
+    days = collection.aggregate_array('DAY').distinct()
+
+    def mosaicDay(day):
+        images = collection.filter(ee.Filter.eq('DAY', day)).sort('system:time_start')
+        first = ee.Image(images.first())
+
+        # Conserver la grille des scènes et les propriétés de la première acquisition du jour
+        # La mosaïque est découpée à l'emprise des scènes du jour : sans cela elle est non bornée et
+        # filterBounds, les jointures spatiales et les réductions sur image.geometry() la voient partout
+        mosaic = images.qualityMosaic('CLEAR').setDefaultProjection(first.select('blue').projection()).clip(images.geometry())
+
+        # system:index stable pour l'index DGO -> images : la date et le nombre de scènes,
+        # pour qu'une date complétée par une livraison ultérieure soit réindexée
+        index = ee.String(day).cat('_').cat(images.size().format())
+        return mosaic.copyProperties(first, ['acquired', 'system:time_start', 'DAY']).set('SCENES', images.size(), 'system:index', index)
+
+    return ee.ImageCollection(days.map(mosaicDay))
+
+
 ######
 ## Indicators
 
@@ -30,9 +58,64 @@ def calculateIndicators(collection):
 ######
 ## Thresholds to classify objects
 
-def extractWater(image, water_threshold_ndwi):
+# Seuil d'eau adaptatif (Otsu) : histogramme NDWI de toute la scène, 200 classes de -1 à 1, à 30 m
+HISTOGRAM_MIN = -1
+HISTOGRAM_MAX = 1
+HISTOGRAM_BINS = 200
+HISTOGRAM_SCALE = 30
+
+# Seuil utilisé lorsque l'histogramme d'une scène est vide
+ADAPTIVE_FALLBACK_NDWI = -0.2
+
+
+def otsuThreshold(histogram):
+    '''
+    Otsu threshold of an ee.Reducer.fixedHistogram output: the bucket edge
+    that maximizes the between-class variance (pixels >= threshold are water).
+    '''
+    histogram = ee.Array(histogram)
+    edges = histogram.slice(1, 0, 1).project([0])
+    counts = histogram.slice(1, 1, 2).project([0])
+    # Centres des classes : bord inférieur plus une demi-largeur de classe
+    means = edges.add((HISTOGRAM_MAX - HISTOGRAM_MIN) / HISTOGRAM_BINS / 2)
+
+    total = counts.reduce(ee.Reducer.sum(), [0]).get([0])
+    total_sum = means.multiply(counts).reduce(ee.Reducer.sum(), [0]).get([0])
+    mean = total_sum.divide(total.max(1))
+
+    def betweenVariance(i):
+        # Variance inter-classes (à un facteur près) lorsque les i premières classes sont sèches
+        a_counts = counts.slice(0, 0, i)
+        a_count = a_counts.reduce(ee.Reducer.sum(), [0]).get([0])
+        a_sum = means.slice(0, 0, i).multiply(a_counts).reduce(ee.Reducer.sum(), [0]).get([0])
+        b_count = total.subtract(a_count)
+        return mean.multiply(a_count).subtract(a_sum).pow(2).divide(a_count.multiply(b_count).max(1))
+
+    variances = ee.List.sequence(1, HISTOGRAM_BINS - 1).map(betweenVariance)
+
+    # Premier maximum (comme np.argmax en local) ; la coupure i sépare les classes i-1 et i
+    best = ee.Number(ee.Array(variances).argmax().get(0))
+    return edges.get([best.add(1)])
+
+
+def adaptiveWaterThreshold(image):
+    # Une seule réduction (histogramme fixe) du NDWI sur l'emprise de la scène
+    histogram = image.select('NDWI').reduceRegion(
+        reducer = ee.Reducer.fixedHistogram(HISTOGRAM_MIN, HISTOGRAM_MAX, HISTOGRAM_BINS),
+        geometry = image.geometry(),
+        scale = HISTOGRAM_SCALE,
+        maxPixels = 1e13,
+        bestEffort = True
+    ).get('NDWI')
+
+    # fixedHistogram renvoie toujours ses classes : la scène est vide lorsque leur effectif total est nul
+    total = ee.Array(histogram).slice(1, 1, 2).reduce(ee.Reducer.sum(), [0]).get([0, 0])
+    return ee.Number(ee.Algorithms.If(total.gt(0), otsuThreshold(histogram), ADAPTIVE_FALLBACK_NDWI))
+
+
+def extractWater(image, water_threshold_ndwi, name='WATER'):
     # Seuillage du raster with dynamic threshold incorporation
-    output_img = image.expression('NDWI >= {0}'.format(water_threshold_ndwi),  {'NDWI': image.select('NDWI')}).rename('WATER')
+    output_img = image.expression('NDWI >= {0}'.format(water_threshold_ndwi),  {'NDWI': image.select('NDWI')}).rename(name)
     
     # Filtre modal pour retirer les pixels isolés
     output_img = output_img.focalMode(3)
@@ -42,9 +125,9 @@ def extractWater(image, water_threshold_ndwi):
     
     return image.addBands(output_img)
 
-def extractVegetation(image):
+def extractVegetation(image, vegetation_threshold_ndvi=0.3, name='VEGETATION'):
     # Seuillage du raster
-    output_img = image.expression('NDVI > 0.3', {'NDVI': image.select('NDVI')}).rename('VEGETATION')
+    output_img = image.expression('NDVI > {0}'.format(vegetation_threshold_ndvi), {'NDVI': image.select('NDVI')}).rename(name)
     
     # Filtre modal pour retirer les pixels isolés
     output_img = output_img.focalMode(3)
@@ -73,8 +156,44 @@ def extractActiveChannel(image):
     return image.addBands(output_img)
 
 
-def classifyObjects(collection, water_threshold_ndwi):
-    
-    collection = collection.map(lambda image: extractWater(image, water_threshold_ndwi)).map(extractVegetation).map(extractActiveChannel)
+def extractWaterAdaptive(image):
+    # Seuillage du NDWI avec le seuil d'Otsu de la scène
+    threshold = adaptiveWaterThreshold(image)
+    output_img = image.select('NDWI').gte(threshold).rename('WATER')
+
+    # Filtre modal pour retirer les pixels isolés
+    output_img = output_img.focalMode(3)
+
+    # Masquer ce qui n'est pas classé
+    output_img = output_img.selfMask()
+
+    return image.addBands(output_img).set('THRESHOLD_NDWI', threshold)
+
+
+def classifyObjects(collection, water_threshold_ndwi, vegetation_threshold_ndvi=0.3):
+    # water_threshold_ndwi='adaptive' : seuil d'Otsu calculé pour chaque scène
+    # Le seuil appliqué est enregistré dans la propriété THRESHOLD_NDWI des images
+    if water_threshold_ndwi == 'adaptive':
+        collection = collection.map(extractWaterAdaptive)
+    else:
+        collection = collection.map(lambda image: extractWater(image, water_threshold_ndwi).set('THRESHOLD_NDWI', float(water_threshold_ndwi)))
+
+    collection = collection.map(lambda image: extractVegetation(image, vegetation_threshold_ndvi)).map(extractActiveChannel)
 
     return collection
+
+
+def classifyObjectsSweep(collection, ndwi_thresholds, ndvi_thresholds=(0.3,)):
+    '''
+    Classify the objects for several thresholds at once: one water band per
+    NDWI threshold (WATER0, WATER1...) and one vegetation band per NDVI
+    threshold (VEGETATION0...). The active channel keeps its fixed thresholds.
+    '''
+    def classify(image):
+        for k, threshold in enumerate(ndwi_thresholds):
+            image = extractWater(image, threshold, f'WATER{k}')
+        for k, threshold in enumerate(ndvi_thresholds):
+            image = extractVegetation(image, threshold, f'VEGETATION{k}')
+        return extractActiveChannel(image)
+
+    return collection.map(classify)
@@ -1,4 +1,6 @@
 import ee
+import json
+from collections import Counter
 
 def calculateClearScore(image, dgo_shape, scale):
     
@@ -48,6 +50,45 @@ def calculateCoverage(image, dgo_shape, scale):
     return coverage_score
 
 
+def calculateClearCoverage(image, dgo_shape, scale):
+    # CLEAR_SCORE et COVERAGE_SCORE en une seule réduction sur une pile de bandes préparées
+    stack = ee.Image.cat([
+        # Pixels clairs (les pixels masqués valent 0)
+        image.unmask().select('CLEAR').eq(1).rename('CLEAR_PIXELS'),
+        # Pixels valides de la bande CLEAR
+        image.select('CLEAR'),
+        # Tous les pixels du DGO
+        image.select('blue').unmask(0).rename('AOI_PIXELS'),
+    ])
+
+    counts = stack.reduceRegion(
+        reducer=ee.Reducer.sum().combine(ee.Reducer.count(), sharedInputs=True),
+        geometry=dgo_shape.geometry(),
+        scale=scale,
+        maxPixels=1e16
+    )
+
+    # Calculate the expected total number of pixels in the AOI at the given scale
+    aoi_pixel_count = dgo_shape.area().divide(scale**2)
+
+    clear_score = counts.getNumber('CLEAR_PIXELS_sum').divide(counts.getNumber('CLEAR_count')).multiply(100).round()
+    coverage_score = counts.getNumber('AOI_PIXELS_count').divide(aoi_pixel_count).multiply(100).round()
+
+    return clear_score, coverage_score
+
+
+def polygonPercentiles(vectors, prefix):
+    # Percentiles de taille des polygones (colonne count) réduits directement sur la collection,
+    # sans matérialiser la liste des tailles
+    return vectors.reduceColumns(
+        reducer = ee.Reducer.percentile(
+            percentiles=list(range(0,110,10)),
+            outputNames=[f'{prefix}_POLYGONS_p{pc}' for pc in range(0,110,10)]
+        ),
+        selectors = ['count']
+    )
+
+
 def calculateWaterMetrics(image, dgo, scale):
     # Vectorisation des surfaces
     water = image.select('WATER').reduceToVectors(
@@ -65,10 +106,7 @@ def calculateWaterMetrics(image, dgo, scale):
     geoms_water = vector_water.geometry()
 
     # Calculer les percentiles de taille de polygones
-    water_percentiles = vector_water.aggregate_array('count').reduce(ee.Reducer.percentile(
-        percentiles=list(range(0,110,10)),
-        outputNames=[f'WATER_POLYGONS_p{pc}' for pc in range(0,110,10)]
-    ))
+    water_percentiles = polygonPercentiles(vector_water, 'WATER')
 
     # Initialisation du dictionnaire des résultats
     results = ee.Dictionary(water_percentiles).combine(ee.Dictionary({
@@ -119,10 +157,7 @@ def calculateVegetationMetrics(image, dgo, scale):
     geom_vegetation = vector_vegetation.geometry()
 
     # Calculer les percentiles de taille de polygones
-    veget_percentiles = vector_vegetation.aggregate_array('count').reduce(ee.Reducer.percentile(
-        percentiles=list(range(0,110,10)),
-        outputNames=[f'VEGETATION_POLYGONS_p{pc}' for pc in range(0,110,10)]
-    ))
+    veget_percentiles = polygonPercentiles(vector_vegetation, 'VEGETATION')
 
     # Initialisation du dictionnaire des résultats
     results = ee.Dictionary(veget_percentiles).combine(ee.Dictionary({
@@ -203,31 +238,263 @@ def calculateACMetrics(image, dgo, scale):
     return results
 
 
-def dgoMetrics(collection, scale):
+def rasterEdges(band, geometry, name):
+    # Arêtes de pixels séparant la classe du reste (voisinage 4-connexe), comptées sur les pixels de la classe :
+    # 4 moins le nombre de voisins de la même classe. Les pixels hors du DGO comptent comme hors classe.
+    # Image 0/1 sans masque ni emprise (unmask sans conserver l'emprise) : le voisinage de la convolution
+    # ne dépend pas du traitement des pixels masqués en bordure du DGO ou de la scène.
+    # Le DGO est rasterisé par paint (pixels dont le centre est dans le DGO, comme reduceToVectors) et non par clip,
+    # dont le masque fractionnaire garderait dans le voisinage les pixels de bordure à peine recouverts
+    inside = ee.Image(0).paint(ee.FeatureCollection([ee.Feature(geometry)]), 1)
+    binary = band.unmask(0, False).multiply(inside)
+    neighbours = binary.convolve(ee.Kernel.fixed(3, 3, [[0, 1, 0], [1, 0, 1], [0, 1, 0]]))
+    return binary.multiply(ee.Image(4).subtract(neighbours)).rename(f'{name}_EDGES')
+
+
+def stackBand(image, geometry, name):
+    # Bandes de la réduction groupée : classes, indices, indices masqués par classe (WATER_NDWI...)
+    # et arêtes de pixels des classes (WATER_EDGES...)
+    if name.endswith('_EDGES'):
+        class_name = name[:-len('_EDGES')]
+        return rasterEdges(image.select(class_name), geometry, class_name)
+    if '_' in name:
+        class_name, index = name.split('_')
+        return image.select(index).updateMask(image.select(class_name)).rename(name)
+    return image.select(name)
+
+
+def reduceClassBands(image, geometry, bands, scale):
+    # Somme et moyenne des bandes de classes (voir stackBand), sans pondération : chaque pixel dont le centre
+    # est dans le DGO compte pour 1, comme dans les polygones vectorisés du calcul par classe
+    return ee.Image.cat([stackBand(image, geometry, band) for band in bands]).reduceRegion(
+        reducer = ee.Reducer.sum().unweighted().combine(ee.Reducer.mean().unweighted(), sharedInputs=True),
+        geometry = geometry,
+        scale = scale
+    )
+
+
+def reduceDGOBands(image, geometry, bands, scale):
+    # Moyenne pondérée des indices sur tout le DGO
+    return image.select(bands).reduceRegion(
+        reducer = ee.Reducer.mean(),
+        geometry = geometry,
+        scale = scale
+    )
+
+
+def polygonMetric(class_name, metric):
+    # Métrique calculée sur les polygones vectorisés d'une classe
+    return {'bands': [], 'vectors': class_name, 'compute': metric}
+
+
+def stackMetric(band, statistic):
+    # Métrique d'une bande masquée par sa classe, lue dans la réduction groupée non pondérée
+    return {'bands': [band], 'compute': lambda sources: sources['stats'].getNumber(f'{band}_{statistic}')}
+
+
+def dgoMeanMetric(band):
+    # Moyenne d'un indice sur tout le DGO, lue dans la réduction pondérée (comme le calcul par classe)
+    return {'bands': [], 'dgo_bands': [band], 'compute': lambda sources: sources['dgo_stats'].getNumber(band)}
+
+
+def perimeterMetric(class_name):
+    # Périmètre raster (arêtes de pixels) ou vectoriel (fusion des polygones) selon le mode choisi
+    def compute(sources):
+        if sources['perimeter'] == 'raster':
+            return sources['stats'].getNumber(f'{class_name}_EDGES_sum').multiply(sources['scale'])
+        return sources['vectors'](class_name).geometry().perimeter(sources['scale'])
+    return {'bands': [f'{class_name}_EDGES'], 'vectors': class_name, 'compute': compute}
+
+
+def percentileMetric(class_name, pc):
+    return polygonMetric(class_name, lambda sources: sources['percentiles'](class_name).get(f'{class_name}_POLYGONS_p{pc}'))
+
+
+# Registre des métriques par classe : colonne -> bandes réduites, classe vectorisée et fonction de calcul
+# Seules les bandes et les vectorisations des métriques demandées entrent dans le graphe de calcul.
+METRICS = {
+    'WATER_AREA': stackMetric('WATER', 'sum'),
+    'WATER_PERIMETER': perimeterMetric('WATER'),
+    'WATER_POLYGONS': polygonMetric('WATER', lambda sources: sources['vectors']('WATER').size()),
+    **{f'WATER_POLYGONS_p{pc}': percentileMetric('WATER', pc) for pc in range(0,110,10)},
+    'MEAN_WATER_NDWI': stackMetric('WATER_NDWI', 'mean'),
+    'MEAN_NDWI': dgoMeanMetric('NDWI'),
+
+    'VEGETATION_AREA': stackMetric('VEGETATION', 'sum'),
+    'VEGETATION_PERIMETER': perimeterMetric('VEGETATION'),
+    'VEGETATION_POLYGONS': polygonMetric('VEGETATION', lambda sources: sources['vectors']('VEGETATION').size()),
+    **{f'VEGETATION_POLYGONS_p{pc}': percentileMetric('VEGETATION', pc) for pc in range(0,110,10)},
+    'MEAN_VEGETATION_NDVI': stackMetric('VEGETATION_NDVI', 'mean'),
+    'MEAN_VEGETATION_NDWI': stackMetric('VEGETATION_NDWI', 'mean'),
+    'MEAN_NDVI': dgoMeanMetric('NDVI'),
+
+    'AC_AREA': stackMetric('AC', 'sum'),
+    'MEAN_AC_NDVI': stackMetric('AC_NDVI', 'mean'),
+    'MEAN_AC_NDWI': stackMetric('AC_NDWI', 'mean'),
+
+    # Seuil NDWI appliqué à l'image (fixe ou adaptatif, voir classification_planet.classifyObjects)
+    'THRESHOLD_NDWI': {'bands': [], 'compute': lambda sources: sources['image'].get('THRESHOLD_NDWI')},
+}
+
+# Métriques exportées par défaut par startWorkflow (celles conservées historiquement par getResults)
+DEFAULT_METRICS = [
+    'AC_AREA',
+    'MEAN_AC_NDWI',
+    'MEAN_AC_NDVI',
+    'MEAN_NDWI',
+    'MEAN_NDVI',
+    'MEAN_VEGETATION_NDWI',
+    'MEAN_VEGETATION_NDVI',
+    'MEAN_WATER_NDWI',
+    'VEGETATION_AREA',
+    'VEGETATION_PERIMETER',
+    'WATER_AREA',
+    'WATER_PERIMETER',
+]
+
+
+def selectMetrics(metrics=None, polygon_stats=True):
+    # Liste validée des métriques à calculer (toutes par défaut)
+    metrics = list(METRICS) if metrics is None else list(metrics)
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics {unknown}, expected some of {list(METRICS)}")
+    if not polygon_stats:
+        metrics = [m for m in metrics if '_POLYGONS' not in m]
+    return metrics
+
+
+def calculateFusedMetrics(image, dgo, scale, perimeter='vector', polygon_stats=True, metrics=None):
+    # Calcul groupé des métriques eau, végétation et bande active : une réduction des classes (et une des indices) par DGO
+    # et une vectorisation par classe portant des statistiques de polygones (eau et végétation).
+    # Géométrie de réduction : le calcul par classe réduit sur les polygones vectorisés, le calcul groupé réduit
+    # sur le DGO avec le masque de chaque classe. Les polygones étant vectorisés dans le DGO à la même échelle,
+    # ils couvrent exactement les pixels de la classe dont le centre est dans le DGO, chacun avec un poids 1.
+    # Sur le DGO, les réducteurs pondérés donnent aux pixels de bordure le poids de leur part dans le DGO (et
+    # comptent ceux dont le centre est dehors) : les bandes de classes sont donc réduites sans pondération, seules
+    # les moyennes d'indices sur tout le DGO (MEAN_NDWI, MEAN_NDVI) restent pondérées comme dans le calcul par classe
+    # (vérifié par tests/test_dgo_metrics_planet.py).
+    # perimeter='raster' compte les arêtes de pixels dans la même réduction au lieu de fusionner les polygones ;
+    # polygon_stats=False n'exporte pas le nombre ni les percentiles de taille des polygones.
+    # metrics : colonnes à calculer (voir METRICS), seules leurs bandes et vectorisations sont construites.
+    if perimeter not in ('vector', 'raster'):
+        raise ValueError(f"Unknown perimeter '{perimeter}', expected 'vector' or 'raster'")
+
+    metrics = selectMetrics(metrics, polygon_stats)
+    geometry = dgo.geometry()
+
+    # Bandes à réduire, sans doublon et dans l'ordre du registre
+    bands, dgo_bands = [], []
+    for name in metrics:
+        for band in METRICS[name]['bands']:
+            if band not in bands and not (band.endswith('_EDGES') and perimeter == 'vector'):
+                bands.append(band)
+        for band in METRICS[name].get('dgo_bands', []):
+            if band not in dgo_bands:
+                dgo_bands.append(band)
+
+    # Une seule réduction combinée (somme et moyenne) non pondérée sur toutes les bandes de classes,
+    # chaque bande portant le masque de sa classe
+    stats = reduceClassBands(image, geometry, bands, scale) if bands else None
+
+    # Moyennes pondérées des indices sur tout le DGO
+    dgo_stats = reduceDGOBands(image, geometry, dgo_bands, scale) if dgo_bands else None
+
+    # Vectorisation d'une classe (une seule fois par classe), uniquement si une métrique demandée l'utilise
+    vectors = {}
+    def classVectors(class_name):
+        if class_name not in vectors:
+            vectors[class_name] = image.select(class_name).reduceToVectors(
+                geometry = geometry,
+                scale = scale,
+                eightConnected = True,
+                maxPixels = 1e16,
+                geometryType = 'polygon').filter("label == 1")
+        return vectors[class_name]
+
+    percentiles = {}
+    def classPercentiles(class_name):
+        if class_name not in percentiles:
+            percentiles[class_name] = polygonPercentiles(classVectors(class_name), class_name)
+        return percentiles[class_name]
+
+    sources = {'image': image, 'stats': stats, 'dgo_stats': dgo_stats, 'vectors': classVectors, 'percentiles': classPercentiles, 'scale': scale, 'perimeter': perimeter}
+
+    return ee.Dictionary({name: METRICS[name]['compute'](sources) for name in metrics})
+
+
+def classMetrics(image, dgo, scale, fused=True, perimeter='vector', polygon_stats=True, metrics=None):
+    if fused:
+        return calculateFusedMetrics(image, dgo, scale, perimeter, polygon_stats, metrics)
+
+    # Le calcul historique par classe ne propose que le périmètre vectoriel et toutes les statistiques
+    if perimeter != 'vector' or not polygon_stats or metrics is not None:
+        raise ValueError("perimeter='raster', polygon_stats=False and metrics require fused=True")
+
+    water_metrics = calculateWaterMetrics(image, dgo, scale)
+    vegetation_metrics = calculateVegetationMetrics(image, dgo, scale)
+    ac_metrics = calculateACMetrics(image, dgo, scale)
+    return water_metrics.combine(vegetation_metrics).combine(ac_metrics)
+
+
+def imageDGOMetrics(image, dgo, scale, fused=True, min_clear_score=None, min_coverage=None, perimeter='vector', polygon_stats=True, metrics=None):
+    # Calculer les métriques
+    if fused:
+        clear_score, coverage_score = calculateClearCoverage(image, dgo, scale)
+    else:
+        clear_score = calculateClearScore(image, dgo, scale)
+        coverage_score = calculateCoverage(image, dgo, scale)
+
+    # Créer un dictionnaire avec toutes les métriques
+    image_metrics = ee.Dictionary({
+                     'DATE': ee.Date(image.get('acquired')).format("YYYY-MM-dd"),
+                     'CLEAR_SCORE': clear_score, 
+                     'COVERAGE_SCORE': coverage_score,
+                    })
+
+    if min_clear_score is None and min_coverage is None:
+        return dgo.set(image_metrics.combine(classMetrics(image, dgo, scale, fused, perimeter, polygon_stats, metrics)))
+
+    # Les paires trop nuageuses ou mal couvertes ne reçoivent qu'une ligne minimale (REJECTED = 1) :
+    # ee.Algorithms.If n'évalue pas la branche des vectorisations et réductions pour ces paires
+    accepted = ee.Number(clear_score).gte(min_clear_score or 0).And(ee.Number(coverage_score).gte(min_coverage or 0))
+    image_metrics = ee.Algorithms.If(accepted,
+                                     image_metrics.combine(classMetrics(image, dgo, scale, fused, perimeter, polygon_stats, metrics)).set('REJECTED', 0),
+                                     image_metrics.set('REJECTED', 1))
+
+    return dgo.set(ee.Dictionary(image_metrics))
+
+
+def attachImageIndex(dgos, image_index):
+    # Ajouter à chaque DGO la liste des images qui l'intersectent (propriété IMAGES) par une jointure attributaire
+    # sur les paires (DGO_FID, IMAGE) de l'index, calculée sur les serveurs
+    joined = ee.Join.saveAll('index').apply(
+        primary = dgos,
+        secondary = image_index,
+        condition = ee.Filter.equals(leftField='DGO_FID', rightField='DGO_FID')
+    )
+
+    return joined.map(lambda dgo: dgo.select(dgo.propertyNames().remove('index')).set(
+        'IMAGES', ee.List(dgo.get('index')).map(lambda pair: ee.Feature(pair).get('IMAGE'))))
+
+
+def dgoMetrics(collection, scale, indexed=False, **options):
     def mapDGO(dgo):
         # Filtrer la collection d'images sur l'emprise du DGO traité
-        dgo_images_collection = collection.filterBounds(dgo.geometry())
+        # (ou sur les images connues de l'index, sans recherche spatiale)
+        if indexed:
+            dgo_images_collection = collection.filter(ee.Filter.inList('system:index', dgo.get('IMAGES')))
+        else:
+            dgo_images_collection = collection.filterBounds(dgo.geometry())
 
         # Définir une fonction qui ajoute les métriques d'une image à la liste des métriques du DGO
         def addMetrics(image, metrics_list, scale):
             # Récupérer la Feature du DGO qui est stocké dans le premier élément de la liste
             dgo = ee.Feature(ee.List(metrics_list).get(0))
             
-            # Calculer les métriques
-            clear_score = calculateClearScore(image, dgo, scale)
-            coverage_score = calculateCoverage(image, dgo, scale)
-            water_metrics = calculateWaterMetrics(image, dgo, scale)
-            vegetation_metrics = calculateVegetationMetrics(image, dgo, scale)
-            ac_metrics = calculateACMetrics(image, dgo, scale)
-            
-            # Créer un dictionnaire avec toutes les métriques
-            image_metrics = dgo.set(ee.Dictionary({
-                                     'DATE': ee.Date(image.get('acquired')).format("YYYY-MM-dd"),
-                                     'CLEAR_SCORE': clear_score, 
-                                     'COVERAGE_SCORE': coverage_score,
-                                    }).combine(water_metrics).combine(vegetation_metrics).combine(ac_metrics))
+            image_metrics = imageDGOMetrics(image, dgo, scale, **options)
             
-            # Always add the image metrics to the list, ignoring the clear score filter.
+            # Always add the image metrics to the list (rejected pairs get a minimal row).
             output_list = ee.List(metrics_list).add(image_metrics)
             # Ajouter ce dictionnaire à la liste des métriques
             return output_list
@@ -247,10 +514,49 @@ def dgoMetrics(collection, scale):
     return mapDGO
 
 
-def calculateDGOsMetrics(collection, dgos, scale):
+def joinPairs(collection, dgos, indexed=False):
+    # Jointure spatiale des DGOs et des images qui les intersectent : une Feature par paire
+    # (jointure attributaire sur la propriété IMAGES si les DGOs portent l'index)
+    if indexed:
+        condition = ee.Filter.listContains(leftField='IMAGES', rightField='system:index')
+    else:
+        condition = ee.Filter.intersects(leftField='.geo', rightField='.geo')
+
+    return ee.Join.inner('dgo', 'image').apply(
+        primary = dgos,
+        secondary = collection,
+        condition = condition
+    )
+
+
+def joinDGOsMetrics(collection, dgos, scale, indexed=False, **options):
+    pairs = joinPairs(collection, dgos, indexed)
+
+    # Chaque paire est calculée indépendamment (map) et la collection obtenue est déjà à plat
+    return pairs.map(lambda pair: imageDGOMetrics(ee.Image(pair.get('image')), ee.Feature(pair.get('dgo')), scale, **options))
+
+
+def calculateDGOsMetrics(collection, dgos, scale, method='iterate', image_index=None, **options):
+    # method='join' calcule les paires image × DGO en parallèle au lieu de les itérer par DGO
+    # image_index : FeatureCollection des paires (DGO_FID, IMAGE = system:index) (voir image_index.updateImageIndex)
+    # options (voir imageDGOMetrics) :
+    # - fused=False conserve le calcul historique par classe (trois vectorisations et cinq réductions par image et DGO)
+    # - min_clear_score / min_coverage rejettent les paires inutilisables avant le calcul des métriques
+    # - perimeter='raster' estime les périmètres par comptage d'arêtes de pixels (sans fusion des polygones)
+    # - polygon_stats=False supprime les statistiques de polygones (et la vectorisation avec perimeter='raster')
+    # - metrics=[...] limite le calcul aux colonnes demandées du registre METRICS (toutes par défaut)
+    if image_index is not None:
+        dgos = attachImageIndex(dgos, image_index)
+        options['indexed'] = True
+
+    if method == 'join':
+        return joinDGOsMetrics(collection, dgos, scale, **options)
+    elif method != 'iterate':
+        raise ValueError(f"Unknown method '{method}', expected 'iterate' or 'join'")
+
     # Ajouter les listes de métriques aux attributs des DGOs
     # Use a lambda function to pass the scale argument to mapDGO
-    metrics = dgos.map(lambda dgo: dgoMetrics(collection, scale)(dgo))
+    metrics = dgos.map(lambda dgo: dgoMetrics(collection, scale, **options)(dgo))
 
     # Dé-empiler les métriques stockées dans un attribut de la FeatureCollection
     unnested = ee.FeatureCollection(metrics.aggregate_array('metrics').flatten())
@@ -258,3 +564,127 @@ def calculateDGOsMetrics(collection, dgos, scale):
     # Retourner uniquement les métriques (pas la Feature complète)
     return unnested
 
+
+# Colonnes des résultats d'un balayage de seuils (une ligne par image, DGO et couple de seuils)
+# Les périmètres sont estimés par comptage d'arêtes de pixels (voir rasterEdges)
+SWEEP_METRICS = [
+    'THRESHOLD_NDWI',
+    'THRESHOLD_NDVI',
+    'WATER_AREA',
+    'WATER_PERIMETER',
+    'MEAN_WATER_NDWI',
+    'MEAN_NDWI',
+    'VEGETATION_AREA',
+    'VEGETATION_PERIMETER',
+    'MEAN_VEGETATION_NDVI',
+    'MEAN_VEGETATION_NDWI',
+    'MEAN_NDVI',
+    'AC_AREA',
+    'MEAN_AC_NDVI',
+    'MEAN_AC_NDWI',
+]
+
+
+def calculateSweepMetrics(image, dgo, scale, ndwi_thresholds, ndvi_thresholds):
+    # Toutes les classes seuillées (WATER0..., VEGETATION0..., voir classifyObjectsSweep) sont réduites ensemble,
+    # puis les statistiques sont réparties en une liste de dictionnaires, un par couple de seuils
+    geometry = dgo.geometry()
+
+    bands = ['AC', 'AC_NDVI', 'AC_NDWI']
+    for i in range(len(ndwi_thresholds)):
+        bands += [f'WATER{i}', f'WATER{i}_NDWI', f'WATER{i}_EDGES']
+    for j in range(len(ndvi_thresholds)):
+        bands += [f'VEGETATION{j}', f'VEGETATION{j}_NDVI', f'VEGETATION{j}_NDWI', f'VEGETATION{j}_EDGES']
+
+    # Bandes de classes sans pondération, indices du DGO avec pondération (voir calculateFusedMetrics)
+    stats = reduceClassBands(image, geometry, bands, scale)
+    dgo_stats = reduceDGOBands(image, geometry, ['NDWI', 'NDVI'], scale)
+
+    rows = []
+    for i, ndwi_threshold in enumerate(ndwi_thresholds):
+        for j, ndvi_threshold in enumerate(ndvi_thresholds):
+            rows.append(ee.Dictionary({
+                'THRESHOLD_NDWI': float(ndwi_threshold),
+                'THRESHOLD_NDVI': float(ndvi_threshold),
+
+                'WATER_AREA': stats.getNumber(f'WATER{i}_sum'),
+                'WATER_PERIMETER': stats.getNumber(f'WATER{i}_EDGES_sum').multiply(scale),
+                'MEAN_WATER_NDWI': stats.getNumber(f'WATER{i}_NDWI_mean'),
+                'MEAN_NDWI': dgo_stats.getNumber('NDWI'),
+
+                'VEGETATION_AREA': stats.getNumber(f'VEGETATION{j}_sum'),
+                'VEGETATION_PERIMETER': stats.getNumber(f'VEGETATION{j}_EDGES_sum').multiply(scale),
+                'MEAN_VEGETATION_NDVI': stats.getNumber(f'VEGETATION{j}_NDVI_mean'),
+                'MEAN_VEGETATION_NDWI': stats.getNumber(f'VEGETATION{j}_NDWI_mean'),
+                'MEAN_NDVI': dgo_stats.getNumber('NDVI'),
+
+                'AC_AREA': stats.getNumber('AC_sum'),
+                'MEAN_AC_NDVI': stats.getNumber('AC_NDVI_mean'),
+                'MEAN_AC_NDWI': stats.getNumber('AC_NDWI_mean'),
+            }))
+
+    return rows
+
+
+def imageDGOSweepMetrics(image, dgo, scale, ndwi_thresholds, ndvi_thresholds, min_clear_score=None, min_coverage=None):
+    # Liste des Features d'une paire image × DGO, une par couple de seuils
+    clear_score, coverage_score = calculateClearCoverage(image, dgo, scale)
+
+    image_metrics = ee.Dictionary({
+                     'DATE': ee.Date(image.get('acquired')).format("YYYY-MM-dd"),
+                     'CLEAR_SCORE': clear_score,
+                     'COVERAGE_SCORE': coverage_score,
+                    })
+
+    rows = [image_metrics.combine(row) for row in calculateSweepMetrics(image, dgo, scale, ndwi_thresholds, ndvi_thresholds)]
+
+    if min_clear_score is None and min_coverage is None:
+        return ee.List([dgo.set(row) for row in rows])
+
+    # Une seule ligne minimale (REJECTED = 1) pour les paires rejetées, comme imageDGOMetrics
+    accepted = ee.Number(clear_score).gte(min_clear_score or 0).And(ee.Number(coverage_score).gte(min_coverage or 0))
+    rows = ee.Algorithms.If(accepted,
+                            ee.List([row.set('REJECTED', 0) for row in rows]),
+                            ee.List([image_metrics.set('REJECTED', 1)]))
+
+    return ee.List(rows).map(lambda row: dgo.set(ee.Dictionary(row)))
+
+
+def calculateDGOsSweepMetrics(collection, dgos, scale, ndwi_thresholds, ndvi_thresholds=(0.3,), image_index=None, **options):
+    '''
+    Metrics of every image x DGO pair for several classification thresholds,
+    in long form (THRESHOLD_NDWI and THRESHOLD_NDVI columns). The collection
+    must be classified with classification_planet.classifyObjectsSweep using
+    the same thresholds.
+    '''
+    indexed = image_index is not None
+    if indexed:
+        dgos = attachImageIndex(dgos, image_index)
+
+    pairs = joinPairs(collection, dgos, indexed)
+
+    # Une FeatureCollection de lignes par paire, mises à plat sur les serveurs (sans liste intermédiaire de toutes les lignes)
+    rows = pairs.map(lambda pair: ee.FeatureCollection(imageDGOSweepMetrics(ee.Image(pair.get('image')), ee.Feature(pair.get('dgo')),
+                                                                            scale, ndwi_thresholds, ndvi_thresholds, **options)))
+    return rows.flatten()
+
+
+def countOperations(computed_object):
+    '''
+    Count the server-side operations of a computation graph by function name
+    (shared sub-expressions are counted once), e.g.
+    countOperations(imageDGOMetrics(image, dgo, 3))['Image.reduceRegion'].
+    '''
+    def walk(node):
+        if isinstance(node, dict):
+            if 'functionName' in node:
+                counts[node['functionName']] += 1
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    counts = Counter()
+    walk(json.loads(computed_object.serialize()))
+    return counts
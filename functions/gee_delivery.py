@@ -1,11 +1,54 @@
+import ee
 from planet import Session, DataClient, OrdersClient
 import json
+import time
+import sqlite3
+import hashlib
 import requests
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import groupby
+from operator import itemgetter
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+# session with a connection pool large enough for concurrent searches
+def pooled_session(api_key, pool_size=10):
+    session = requests.Session()
+    session.auth = (api_key, "")
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# send a request, waiting and retrying when Planet answers 429 (rate limit)
+def planet_request(planet_session, method, url, max_retries=5, **kwargs):
+    for attempt in range(max_retries + 1):
+        res = planet_session.request(method, url, **kwargs)
+        if res.status_code != 429 or attempt == max_retries:
+            res.raise_for_status()
+            return res
+
+        # Honour the Retry-After header when present, otherwise exponential backoff
+        retry_after = res.headers.get("Retry-After")
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = 2 ** attempt
+        time.sleep(delay)
+
+
+# largest page returned by the Planet quick search
+MAX_PAGE_SIZE = 250
+
+
+# yield the search results page by page
+def iter_search_pages(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL, page_size=MAX_PAGE_SIZE):
+    # Larger pages are cut to MAX_PAGE_SIZE by Planet and would look short
+    page_size = min(page_size, MAX_PAGE_SIZE)
 
-# request all images matching the filter
-def request_itemids(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL):
-    
     # Setup the quick search endpoint url
     search_url = "{}/quick-search".format(planet_baseURL)
 
@@ -16,56 +59,188 @@ def request_itemids(satellite_product: "PSScene", img_filter, planet_session, pl
     }
 
     # Send the POST request to the API quick search endpoint
-    res = planet_session.post(search_url, json=request)
-    geojson = res.json()
+    geojson = planet_request(planet_session, "POST", search_url, json=request, params={"_page_size": page_size}).json()
+
+    while True:
+        features = geojson["features"]
+        if features:
+            yield features
+
+        # A short page or a missing link is the last page: no extra round trip for an empty page
+        next_url = geojson.get("_links", {}).get("_next")
+        if not next_url or len(features) < page_size:
+            break
+
+        geojson = planet_request(planet_session, "GET", next_url).json()
+
 
-    # Initialize the item_ids list to collect all item ids
-    item_ids = []
+# yield every item record matching the filter
+def iter_items(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL, page_size=MAX_PAGE_SIZE):
+    for features in iter_search_pages(satellite_product, img_filter, planet_session, planet_baseURL, page_size):
+        yield from features
 
-    # Collect item IDs from current page
-    features = geojson["features"]
-    current_page_item_ids = [f['id'] for f in features]
-    item_ids.extend(current_page_item_ids)
 
-    # loop to paginate through all available pages to extract >250 items
-    while current_page_item_ids:
+# request all item records (full search features, with geometry and properties) matching the filter
+def request_items(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL):
+    return list(iter_items(satellite_product, img_filter, planet_session, planet_baseURL))
 
-        # Check if there's a next page, if not, break the loop
-        next_url = geojson["_links"]["_next"] 
-    
-        # Update the request URL for the next iteration
-        res_next = planet_session.get(next_url)
-        geojson = res_next.json()
-    
-        # Collect item IDs from next page
-        features_next = geojson["features"]
-        current_page_item_ids = [f['id'] for f in features_next]
-        item_ids.extend(current_page_item_ids)
 
-    return item_ids
+# canonical hash of a search (item type + filter), used as cache key
+def search_key(satellite_product, img_filter):
+    search = json.dumps({"item_types": [satellite_product], "filter": img_filter}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(search.encode()).hexdigest()
+
+
+# request all item records matching the filter, through an on-disk SQLite cache
+def cached_request_items(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL,
+                         cache_path='planet_search_cache.sqlite', ttl_hours=24, incremental=True):
+    key = search_key(satellite_product, img_filter)
+
+    # closing() closes the connection, the inner block commits the transaction
+    with closing(sqlite3.connect(cache_path)) as db, db:
+        db.execute("CREATE TABLE IF NOT EXISTS searches (key TEXT PRIMARY KEY, updated REAL, high_water TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS items (key TEXT, id TEXT, acquired TEXT, record TEXT, PRIMARY KEY (key, id))")
+
+        cached = db.execute("SELECT updated, high_water FROM searches WHERE key = ?", (key,)).fetchone()
+
+        # Fresh cache: no request at all
+        if cached is None or time.time() - cached[0] > ttl_hours * 3600:
+
+            # Expired cache: only query the acquisitions from the cached high-water mark on
+            # (gte: scenes sharing the last acquired time are re-read, the primary key drops duplicates)
+            search_filter = img_filter
+            if cached is not None and incremental and cached[1]:
+                search_filter = {
+                    "type": "AndFilter",
+                    "config": [img_filter, {"type": "DateRangeFilter", "field_name": "acquired", "config": {"gte": cached[1]}}]
+                }
+            elif cached is not None:
+                db.execute("DELETE FROM items WHERE key = ?", (key,))
+
+            db.executemany("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)", (
+                (key, f['id'], f['properties'].get('acquired'), json.dumps(f))
+                for f in iter_items(satellite_product, search_filter, planet_session, planet_baseURL)
+            ))
+
+            high_water = db.execute("SELECT MAX(acquired) FROM items WHERE key = ?", (key,)).fetchone()[0]
+            db.execute("INSERT OR REPLACE INTO searches VALUES (?, ?, ?)", (key, time.time(), high_water))
+
+        rows = db.execute("SELECT record FROM items WHERE key = ? ORDER BY acquired, id", (key,)).fetchall()
+
+    return [json.loads(record) for record, in rows]
+
+
+# request all images matching the filter
+def request_itemids(satellite_product: "PSScene", img_filter, planet_session, planet_baseURL):
+    return [f['id'] for f in iter_items(satellite_product, img_filter, planet_session, planet_baseURL)]
+
+
+# run the searches of several AOIs concurrently, sharing the session connection pool
+def request_itemids_concurrently(satellite_product: "PSScene", img_filters: dict, planet_session, planet_baseURL, max_workers=4):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(request_itemids, satellite_product, img_filter, planet_session, planet_baseURL)
+            for name, img_filter in img_filters.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+# IDs of the images already delivered into the GEE ImageCollection (one bulk request)
+def collection_item_ids(collection_assetID):
+    return set(ee.ImageCollection(collection_assetID).aggregate_array('system:index').getInfo())
+
+
+# remove the items already present in the ImageCollection before ordering
+# list_ids can be replaced (e.g. by a stub returning a set of IDs) to run without Earth Engine
+def remove_delivered(image_ids, collection_assetID, list_ids=collection_item_ids):
+    delivered = list_ids(collection_assetID)
+    missing = [item for item in image_ids if parse_item(item)[1] not in delivered]
+
+    print(f'{len(image_ids) - len(missing)} items already in the collection, {len(missing)} to order')
+
+    return missing
+
+
+# acquisition date and ID of an item given as ID string, item record (search feature) or (date, id) tuple
+def parse_item(item):
+    if isinstance(item, str):
+        return datetime.strptime(item.split('_')[0], '%Y%m%d'), item
+    if isinstance(item, tuple):
+        return item
+    return datetime.strptime(item['properties']['acquired'][:10], '%Y-%m-%d'), item['id']
+
+
+# share of the AOI covered by clear pixels for a set of items acquired the same day
+def clear_coverage(items, aoi=None):
+    clear = [f['properties'].get('clear_percent', 0) for f in items]
+
+    # Without AOI, only the clear percentage of the scenes is known
+    if aoi is None:
+        return sum(clear) / len(clear)
+
+    aoi_shape = shape(aoi)
+    footprints = [shape(f['geometry']).intersection(aoi_shape) for f in items]
+    areas = [footprint.area for footprint in footprints]
+    if not sum(areas):
+        return 0
+
+    # AOI coverage of the strip set, weighted by the clear percentage of each scene over the AOI
+    coverage = unary_union(footprints).area / aoi_shape.area
+    clear_percent = sum(c * a for c, a in zip(clear, areas)) / sum(areas)
+
+    return coverage * clear_percent
+
+
+# keep, in each window of interval_days, the date whose scenes give the best clear coverage of the AOI
+def filter_images_by_quality(items, interval_days, aoi=None):
+    # The clear percentage and footprint are only known from the item records of the search
+    if not all(isinstance(f, dict) and 'properties' in f for f in items):
+        raise ValueError("mode='best' needs item records (e.g. from request_items), not item IDs")
+    if aoi is not None and not all('geometry' in f for f in items):
+        raise ValueError("item records without geometry cannot be compared over an AOI")
+
+    items_by_date = sorted(((parse_item(f)[0], f) for f in items), key=itemgetter(0))
+    if not items_by_date:
+        return []
+
+    first_date = items_by_date[0][0]
+    filtered_image_ids = []
+
+    # Fixed windows counted from the first acquisition
+    window_of = lambda date_item: (date_item[0] - first_date).days // interval_days
+    for _, window in groupby(items_by_date, key=window_of):
+
+        # Candidate strip sets: all the scenes of a same date; ties keep the earliest date
+        candidates = [[f for _, f in scenes] for _, scenes in groupby(window, key=itemgetter(0))]
+        best = max(candidates, key=lambda scenes: clear_coverage(scenes, aoi))
+
+        filtered_image_ids.extend(f['id'] for f in best)
+
+    return filtered_image_ids
 
 
 # filter to only get item with predefined interval
-def filter_images_by_interval(image_ids, interval_days):
-    # Convert image IDs to datetime objects and sort
-    dates_images = sorted([
-        (datetime.strptime(image_id.split('_')[0], '%Y%m%d'), image_id)
-        for image_id in image_ids
-    ], key=lambda x: x[0])
+# mode='best' selects the best scenes of each window from item records (see filter_images_by_quality)
+def filter_images_by_interval(image_ids, interval_days, mode='first', aoi=None):
+    if mode == 'best':
+        return filter_images_by_quality(image_ids, interval_days, aoi)
+    elif mode != 'first':
+        raise ValueError(f"Unknown mode '{mode}', expected 'first' or 'best'")
+
+    # Parse (if needed) and sort the items by date
+    dates_images = sorted(map(parse_item, image_ids), key=itemgetter(0))
 
     # Initialize variables
     filtered_image_ids = []
     last_selected_date = None
 
-    for date_image in dates_images:
-        date, image_id = date_image
+    # Single pass over the images grouped by date
+    for date, images in groupby(dates_images, key=itemgetter(0)):
 
-        # If this is the first image or the date is at least interval_days after the last selected date, select it
+        # If this is the first date or the date is at least interval_days after the last selected date, select it
         if last_selected_date is None or date >= last_selected_date + timedelta(days=interval_days):
             last_selected_date = date
-            # Find and include all images for the selected date
-            filtered_image_ids.extend([
-                img_id for img_date, img_id in dates_images if img_date == date
-            ])
+            # Include all images for the selected date
+            filtered_image_ids.extend(img_id for _, img_id in images)
             
     return filtered_image_ids
@@ -0,0 +1,110 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from functions.gee_delivery import planet_request
+
+# final states of a Planet order
+FINAL_STATES = {'success', 'partial', 'failed', 'cancelled'}
+
+
+# split the item IDs into size-bounded batches (Planet accepts at most 500 items per order)
+def batch_item_ids(item_ids, max_items=500):
+    return [item_ids[i:i + max_items] for i in range(0, len(item_ids), max_items)]
+
+
+# build an order request delivering the items into the GEE ImageCollection, as in the delivery notebook
+def build_order(name, item_ids, aoi, delivery_config, item_type='PSScene', product_bundle='analytic_sr_udm2', target_sensor='Sentinel-2'):
+    return {
+        "name":     name,
+        "products": [
+            {
+                "item_ids":       item_ids,
+                "item_type":      item_type,
+                "product_bundle": product_bundle
+            }
+        ],
+        "delivery": delivery_config,
+        "tools":    [
+            {"clip": {"aoi": aoi}},
+            {"harmonize": {"target_sensor": target_sensor}}
+        ]
+    }
+
+
+# one order per batch of items, named after the base order name
+def build_orders(name, item_ids, aoi, delivery_config, max_items=500, **order_options):
+    batches = batch_item_ids(item_ids, max_items)
+    return [build_order(f'{name}_{i+1}of{len(batches)}', batch, aoi, delivery_config, **order_options)
+            for i, batch in enumerate(batches)]
+
+
+# submit the orders concurrently
+# return the IDs of the submitted orders (in the order of `orders`) and the failed submissions by order name
+def submit_orders(orders, planet_session, orders_url, max_workers=4):
+    def submit(order):
+        return planet_request(planet_session, "POST", orders_url, json=order).json()['id']
+
+    order_ids = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(submit, order): i for i, order in enumerate(orders)}
+
+        # A failed submission does not stop the others
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                order_ids[i] = future.result()
+            except Exception as e:
+                failures[orders[i]['name']] = e
+                print(f"order {orders[i]['name']} not submitted: {e}")
+
+    return [order_ids[i] for i in sorted(order_ids)], failures
+
+
+# poll all the orders with one session until they reach a final state
+def poll_orders(order_ids, planet_session, orders_url, min_delay=10, max_delay=300, max_workers=4):
+    states = {}
+    delay = min_delay
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            pending = [oid for oid in order_ids if states.get(oid) not in FINAL_STATES]
+            if not pending:
+                break
+
+            # A failed poll keeps the previous state of the order (unchanged), it is polled again next round
+            def poll(oid):
+                try:
+                    return planet_request(planet_session, "GET", f'{orders_url}/{oid}').json()['state']
+                except Exception as e:
+                    print(f'order {oid} not polled: {e}')
+                    return states.get(oid)
+
+            new_states = dict(zip(pending, executor.map(poll, pending)))
+            changed = any(states.get(oid) != state for oid, state in new_states.items())
+            states.update({oid: state for oid, state in new_states.items() if state is not None})
+
+            # Aggregate progress of all the orders
+            progress = Counter(states.values())
+            print(', '.join(f'{n} {state}' for state, n in sorted(progress.items())))
+
+            if all(states.get(oid) in FINAL_STATES for oid in order_ids):
+                break
+
+            # Adaptive backoff: poll again quickly after a change, slow down while nothing moves
+            delay = min_delay if changed else min(max_delay, delay * 2)
+            time.sleep(delay)
+
+    return {oid: states[oid] for oid in order_ids}
+
+
+# split, submit and follow the orders of a list of selected images
+# return the final states of the submitted orders and the failed submissions (see submit_orders)
+def order_images(name, item_ids, aoi, delivery_config, planet_session, orders_url, max_items=500, max_workers=4, **order_options):
+    orders = build_orders(name, item_ids, aoi, delivery_config, max_items, **order_options)
+    order_ids, failures = submit_orders(orders, planet_session, orders_url, max_workers)
+
+    print(f'{len(order_ids)} orders submitted, {len(failures)} failed')
+
+    return poll_orders(order_ids, planet_session, orders_url, max_workers=max_workers), failures
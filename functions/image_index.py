@@ -0,0 +1,71 @@
+import ee
+
+# Index DGO_FID -> images qui intersectent le DGO, calculé sur les serveurs Earth Engine et stocké en assets.
+# Chaque run n'exporte que ce qui manque (nouvelles images, nouveaux DGOs) dans un asset `{index_asset}_{run_id}` ;
+# l'index est l'union de ces assets. Aucune lecture côté client : pas de limite de 5000 éléments.
+#
+# Un asset d'index contient des paires (DGO_FID, IMAGE) et des marqueurs des images et DGOs déjà joints
+# (une seule des deux propriétés), pour ne pas rejoindre une image qui n'intersecte aucun DGO.
+
+
+def indexAssets(index_asset):
+    # Assets d'index existants : l'asset initial et les compléments des runs suivants
+    parent = index_asset.rsplit('/', 1)[0]
+    assets = ee.data.listAssets({'parent': parent}).get('assets', [])
+    return sorted(a['name'] for a in assets if a['name'] == index_asset or a['name'].startswith(f'{index_asset}_'))
+
+
+def loadImageIndex(index_asset):
+    # Union des assets d'index (FeatureCollection vide s'il n'y en a pas encore)
+    index = ee.FeatureCollection([])
+    for asset in indexAssets(index_asset):
+        index = index.merge(ee.FeatureCollection(asset))
+    return index
+
+
+def indexPairs(index):
+    # Paires (DGO_FID, IMAGE) de l'index, sans les marqueurs
+    return index.filter(ee.Filter.notNull(['DGO_FID', 'IMAGE']))
+
+
+def joinImageIndex(collection, dgo_features):
+    # Jointure spatiale des emprises d'images et des DGOs : une Feature sans géométrie par paire
+    pairs = ee.Join.inner('dgo', 'image').apply(
+        primary = dgo_features,
+        secondary = collection,
+        condition = ee.Filter.intersects(leftField='.geo', rightField='.geo')
+    )
+    return pairs.map(lambda pair: ee.Feature(None, {
+        'DGO_FID': ee.Feature(pair.get('dgo')).get('DGO_FID'),
+        'IMAGE': ee.Image(pair.get('image')).get('system:index'),
+    }))
+
+
+def updateImageIndex(collection, dgo_features, index_asset, run_id):
+    '''
+    Join only what the index stored at index_asset is missing: the footprints
+    of new images over the indexed DGOs, and every footprint over new DGOs.
+    The additions are exported to `{index_asset}_{run_id}` and the updated
+    index is returned as a FeatureCollection usable in the same run.
+    '''
+    index = loadImageIndex(index_asset)
+    indexed_images = index.aggregate_array('IMAGE').distinct()
+    indexed_dgos = index.aggregate_array('DGO_FID').distinct()
+
+    new_images = collection.filter(ee.Filter.inList('system:index', indexed_images).Not())
+    new_dgos = dgo_features.filter(ee.Filter.inList('DGO_FID', indexed_dgos).Not())
+    known_dgos = dgo_features.filter(ee.Filter.inList('DGO_FID', indexed_dgos))
+
+    new_pairs = joinImageIndex(new_images, known_dgos).merge(joinImageIndex(collection, new_dgos))
+    markers = new_images.map(lambda image: ee.Feature(None, {'IMAGE': image.get('system:index')})) \
+        .merge(new_dgos.map(lambda dgo: ee.Feature(None, {'DGO_FID': dgo.get('DGO_FID')})))
+
+    # La description ne contient pas "run <id>" : la tâche n'est pas comptée parmi celles du run (voir task_registry)
+    task = ee.batch.Export.table.toAsset(
+        collection=ee.FeatureCollection(new_pairs.merge(markers)),
+        description=f'Image index update {run_id}',
+        assetId=f'{index_asset}_{run_id}'
+    )
+    task.start()
+
+    return indexPairs(index).merge(new_pairs)
@@ -0,0 +1,730 @@
+import os
+import glob
+from datetime import datetime
+from collections import Counter
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import rasterio
+from affine import Affine
+from rasterio import features, windows
+from rasterio.enums import Resampling
+from scipy import ndimage
+
+# Moteur local (NumPy/rasterio) reproduisant classification_planet et dgo_metrics_planet
+# sur des GeoTIFF PlanetScope déjà téléchargés.
+
+bnd_names = ['blue', 'green', 'red', 'nir', 'CLEAR']
+
+# Voisinage 8-connexe utilisé par reduceToVectors(eightConnected=True)
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+# Rayon du filtre modal, identique à focalMode(3) (noyau circulaire de 3 pixels)
+FOCAL_RADIUS = 3
+
+# Seuil d'eau adaptatif (Otsu), comme classification_planet : histogramme NDWI de toute la scène,
+# 200 classes de -1 à 1, à 30 m, et seuil de repli pour les scènes sans pixel valide
+HISTOGRAM_BINS = 200
+HISTOGRAM_SCALE = 30
+ADAPTIVE_FALLBACK_NDWI = -0.2
+
+
+######
+## Lecture des images
+
+def listPlanetImages(directory):
+    # Lister les scènes analytiques, les masques UDM2 étant lus à côté de leur scène
+    paths = glob.glob(os.path.join(directory, '*.tif'))
+    return sorted(p for p in paths if 'udm' not in os.path.basename(p).lower())
+
+
+def findUDM(path):
+    # Retrouver le masque UDM2 livré avec une scène (même identifiant de scène)
+    scene_id = '_'.join(os.path.basename(path).split('_')[:3])
+    candidates = glob.glob(os.path.join(os.path.dirname(path), f'{scene_id}*udm2*.tif'))
+    return candidates[0] if candidates else None
+
+
+def acquiredDate(path):
+    # Date d'acquisition lue dans l'identifiant PlanetScope (YYYYMMDD_HHMMSS_...)
+    date, time = os.path.basename(path).split('_')[:2]
+    return datetime.strptime(f'{date}_{time}', '%Y%m%d_%H%M%S')
+
+
+def readPlanetImage(path, scale=3, window=None, resampling=Resampling.nearest):
+    '''
+    Read a PlanetScope scene as masked bands (blue, green, red, nir, CLEAR).
+
+    Bands 1-4 are B1-B4. Q1 is read from band 5 when the file carries the UDM2
+    bands, otherwise from the sibling udm2 file. The grid is resampled to
+    `scale` when the native resolution differs, with `resampling` for the
+    reflectance bands (the masks and Q1 always use nearest).
+    '''
+    with rasterio.open(path) as src:
+        if window is None:
+            window = windows.Window(0, 0, src.width, src.height)
+        factor = src.res[0] / scale
+        out_shape = (max(1, int(round(window.height * factor))), max(1, int(round(window.width * factor))))
+        transform = src.window_transform(window) * Affine.scale(1 / factor)
+
+        data = src.read([1, 2, 3, 4], window=window, out_shape=(4,) + out_shape,
+                        resampling=resampling, boundless=True, fill_value=0).astype('float32')
+        valid = src.read_masks(1, window=window, out_shape=out_shape,
+                               resampling=Resampling.nearest, boundless=True) > 0
+        valid &= np.any(data != 0, axis=0)
+
+        if src.count >= 5:
+            clear = src.read(5, window=window, out_shape=out_shape,
+                             resampling=Resampling.nearest, boundless=True, fill_value=0)
+        else:
+            clear = None
+        bounds = windows.bounds(window, src.transform)
+        crs = src.crs
+
+    if clear is None:
+        udm_path = findUDM(path)
+        if udm_path is None:
+            raise FileNotFoundError(f'No Q1 band or udm2 file found for {path}')
+        with rasterio.open(udm_path) as udm:
+            clear = udm.read(1, window=windows.from_bounds(*bounds, transform=udm.transform), out_shape=out_shape,
+                             resampling=Resampling.nearest, boundless=True, fill_value=0)
+
+    image = {name: np.ma.MaskedArray(band, mask=~valid) for name, band in zip(bnd_names[:4], data)}
+    image['CLEAR'] = np.ma.MaskedArray(clear.astype('uint8'), mask=~valid)
+
+    return {
+        'bands': image,
+        'transform': transform,
+        'crs': crs,
+        'scale': scale,
+        'acquired': acquiredDate(path),
+    }
+
+
+######
+## Indicators
+
+def normalizedDifference(first, second):
+    # Même convention que ee.Image.normalizedDifference : 0 lorsque les deux bandes sont nulles
+    total = first + second
+    output = np.ma.where(total == 0, 0, (first - second) / np.ma.where(total == 0, 1, total))
+    return output.astype('float32')
+
+
+def calculateIndicators(image):
+    bands = image['bands']
+    bands['NDVI'] = normalizedDifference(bands['nir'], bands['red'])
+    bands['NDWI'] = normalizedDifference(bands['green'], bands['nir'])
+    return image
+
+
+######
+## Thresholds to classify objects
+
+def circleKernel(radius):
+    y, x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    return (x**2 + y**2 <= radius**2).astype('int32')
+
+
+def focalMode(binary, radius=FOCAL_RADIUS):
+    '''
+    Modal filter of a masked 0/1 image, equivalent to ee.Image.focalMode(radius).
+
+    The mode is obtained from two box counts (class pixels and valid pixels)
+    under a circular kernel. Ties resolve to 0 and the output is valid wherever
+    the kernel contains at least one valid input pixel.
+    '''
+    kernel = circleKernel(radius)
+    valid = ~np.ma.getmaskarray(binary)
+    ones = (np.ma.filled(binary, 0) == 1) & valid
+
+    n_ones = ndimage.correlate(ones.astype('int32'), kernel, mode='constant', cval=0)
+    n_valid = ndimage.correlate(valid.astype('int32'), kernel, mode='constant', cval=0)
+
+    output = (2 * n_ones > n_valid).astype('uint8')
+    return np.ma.MaskedArray(output, mask=n_valid == 0)
+
+
+def selfMask(binary):
+    return np.ma.masked_where(np.ma.filled(binary, 0) != 1, binary)
+
+
+def extractWater(image, water_threshold_ndwi):
+    ndwi = image['bands']['NDWI']
+    output = (ndwi >= float(water_threshold_ndwi)).astype('uint8')
+    image['bands']['WATER'] = selfMask(focalMode(output))
+    return image
+
+
+def extractVegetation(image, vegetation_threshold_ndvi=0.3):
+    ndvi = image['bands']['NDVI']
+    output = (ndvi > vegetation_threshold_ndvi).astype('uint8')
+    image['bands']['VEGETATION'] = selfMask(focalMode(output))
+    return image
+
+
+def extractActiveChannel(image):
+    bands = image['bands']
+    output = ((bands['NDWI'] > -0.4) & (bands['NDVI'] < 0.2)).astype('uint8')
+    image['bands']['AC'] = selfMask(focalMode(output))
+    return image
+
+
+def otsuThreshold(values, bins=HISTOGRAM_BINS, value_range=(-1, 1)):
+    '''
+    Otsu threshold of `values`: the histogram bucket edge that maximizes the
+    between-class variance (values >= threshold form the upper class).
+    Returns None when there is no value.
+    '''
+    counts, edges = np.histogram(np.asarray(values, dtype='float64'), bins=bins, range=value_range)
+    total = counts.sum()
+    if total == 0:
+        return None
+
+    means = (edges[:-1] + edges[1:]) / 2
+    mean = (counts * means).sum() / total
+
+    # Variance inter-classes (à un facteur près) pour chaque coupure entre deux classes de l'histogramme
+    a_count = np.cumsum(counts)[:-1]
+    a_sum = np.cumsum(counts * means)[:-1]
+    b_count = total - a_count
+    variances = (mean * a_count - a_sum)**2 / np.maximum(a_count * b_count, 1)
+
+    return float(edges[1:-1][np.argmax(variances)])
+
+
+def adaptiveThreshold(path):
+    # Seuil d'Otsu du NDWI de toute la scène, lue à HISTOGRAM_SCALE en moyennant les pixels (comme la pyramide GEE)
+    image = calculateIndicators(readPlanetImage(path, HISTOGRAM_SCALE, resampling=Resampling.average))
+    threshold = otsuThreshold(image['bands']['NDWI'].compressed())
+    return ADAPTIVE_FALLBACK_NDWI if threshold is None else threshold
+
+
+def classifyObjects(image, water_threshold_ndwi, vegetation_threshold_ndvi=0.3):
+    image = extractWater(image, water_threshold_ndwi)
+    image = extractVegetation(image, vegetation_threshold_ndvi)
+    image = extractActiveChannel(image)
+    return image
+
+
+######
+## Metrics
+
+def dgoBoundingBox(geometry, transform, n_rows, n_cols):
+    # Emprise du DGO en pixels de la grille de l'image, limitée à l'image
+    window = windows.from_bounds(*geometry.bounds, transform=transform)
+    row_min = max(0, int(np.floor(window.row_off)))
+    col_min = max(0, int(np.floor(window.col_off)))
+    row_max = min(n_rows, int(np.ceil(window.row_off + window.height)))
+    col_max = min(n_cols, int(np.ceil(window.col_off + window.width)))
+    return row_min, row_max, col_min, col_max
+
+
+def sliceImage(image, rows, cols):
+    sliced = dict(image)
+    sliced['bands'] = {name: band[rows, cols] for name, band in image['bands'].items()}
+    sliced['transform'] = image['transform'] * Affine.translation(cols.start, rows.start)
+    return sliced
+
+
+def cropImage(image, geometry):
+    # Restreindre l'image à l'emprise du DGO pour ne rasteriser et réduire que cette fenêtre
+    row_min, row_max, col_min, col_max = dgoBoundingBox(geometry, image['transform'], *image['bands']['blue'].shape)
+    if row_min >= row_max or col_min >= col_max:
+        return None
+
+    return sliceImage(image, slice(row_min, row_max), slice(col_min, col_max))
+
+
+def rasterizeDGO(geometry, image):
+    # Pixels dont le centre est dans le DGO, comme reduceRegion/reduceToVectors
+    shape = image['bands']['blue'].shape
+    return features.geometry_mask([geometry], out_shape=shape, transform=image['transform'], invert=True)
+
+
+def maskedMean(values, mask):
+    selected = np.ma.getdata(values)[mask & ~np.ma.getmaskarray(values)]
+    return float(selected.mean(dtype='float64')) if selected.size else None
+
+
+def classMask(image, band, dgo_mask):
+    return (np.ma.filled(image['bands'][band], 0) == 1) & dgo_mask
+
+
+def exposedEdges(mask):
+    # Nombre d'arêtes de pixels séparant la classe du reste (contours extérieurs et trous)
+    padded = np.pad(mask, 1, constant_values=False)
+    horizontal = np.count_nonzero(padded[:, 1:] != padded[:, :-1])
+    vertical = np.count_nonzero(padded[1:, :] != padded[:-1, :])
+    return horizontal + vertical
+
+
+def polygonStatistics(sizes, n_edges, name, scale, polygon_stats=True):
+    # Nombre, percentiles de taille (en pixels) et périmètre des polygones d'une classe
+    # Le périmètre est le nombre d'arêtes de pixels (équivalent de perimeter='raster' sur GEE)
+    if not polygon_stats:
+        return {f'{name}_PERIMETER': int(n_edges) * scale}
+
+    n_polygons = len(sizes)
+
+    results = {f'{name}_POLYGONS': n_polygons}
+    for pc in range(0, 110, 10):
+        results[f'{name}_POLYGONS_p{pc}'] = float(np.percentile(sizes, pc)) if n_polygons else None
+    results[f'{name}_PERIMETER'] = int(n_edges) * scale
+
+    return results
+
+
+def polygonMetrics(mask, name, scale, polygon_stats=True):
+    if not polygon_stats:
+        return polygonStatistics(None, exposedEdges(mask), name, scale, polygon_stats)
+
+    # Étiquetage en composantes 8-connexes, équivalent des polygones de reduceToVectors
+    labels, n_polygons = ndimage.label(mask, structure=EIGHT_CONNECTED)
+    sizes = np.bincount(labels.ravel())[1:]
+
+    return polygonStatistics(sizes, exposedEdges(mask), name, scale)
+
+
+def calculateClearScore(image, dgo_mask):
+    clear = image['bands']['CLEAR']
+    clear_size = np.count_nonzero(np.ma.filled(clear, 0)[dgo_mask] == 1)
+    full_size = np.count_nonzero(~np.ma.getmaskarray(clear)[dgo_mask])
+    return round(clear_size / full_size * 100) if full_size else None
+
+
+def calculateCoverage(image, dgo_mask, dgo_area):
+    # Pixels de l'emprise de l'image dans le DGO (comme image.unmask(0) sur GEE, le collier sans données n'est pas compté)
+    scale = image['scale']
+    aoi_pixel_count = dgo_area / scale**2
+    act_pixels = np.count_nonzero(~np.ma.getmaskarray(image['bands']['blue'])[dgo_mask])
+    return round(act_pixels / aoi_pixel_count * 100) if aoi_pixel_count else None
+
+
+def calculateWaterMetrics(image, dgo_mask, polygon_stats=True):
+    water = classMask(image, 'WATER', dgo_mask)
+    ndwi = image['bands']['NDWI']
+
+    results = polygonMetrics(water, 'WATER', image['scale'], polygon_stats)
+    results.update({
+        'WATER_AREA': int(np.count_nonzero(water)),
+        'MEAN_WATER_NDWI': maskedMean(ndwi, water),
+        'MEAN_NDWI': maskedMean(ndwi, dgo_mask),
+    })
+    return results
+
+
+def calculateVegetationMetrics(image, dgo_mask, polygon_stats=True):
+    vegetation = classMask(image, 'VEGETATION', dgo_mask)
+    ndvi = image['bands']['NDVI']
+    ndwi = image['bands']['NDWI']
+
+    results = polygonMetrics(vegetation, 'VEGETATION', image['scale'], polygon_stats)
+    results.update({
+        'VEGETATION_AREA': int(np.count_nonzero(vegetation)),
+        'MEAN_VEGETATION_NDVI': maskedMean(ndvi, vegetation),
+        'MEAN_VEGETATION_NDWI': maskedMean(ndwi, vegetation),
+        'MEAN_NDVI': maskedMean(ndvi, dgo_mask),
+    })
+    return results
+
+
+def calculateACMetrics(image, dgo_mask):
+    ac = classMask(image, 'AC', dgo_mask)
+
+    return {
+        'AC_AREA': int(np.count_nonzero(ac)),
+        'MEAN_AC_NDVI': maskedMean(image['bands']['NDVI'], ac),
+        'MEAN_AC_NDWI': maskedMean(image['bands']['NDWI'], ac),
+    }
+
+
+def imageDGOMetrics(image, properties, geometry, dgo_mask, polygon_stats=True):
+    metrics = dict(properties)
+    metrics.update({
+        'DATE': image['acquired'].strftime('%Y-%m-%d'),
+        'CLEAR_SCORE': calculateClearScore(image, dgo_mask),
+        'COVERAGE_SCORE': calculateCoverage(image, dgo_mask, geometry.area),
+    })
+    metrics.update(calculateWaterMetrics(image, dgo_mask, polygon_stats))
+    metrics.update(calculateVegetationMetrics(image, dgo_mask, polygon_stats))
+    metrics.update(calculateACMetrics(image, dgo_mask))
+    return metrics
+
+
+def processImage(path, dgos, scale, water_threshold_ndwi, polygon_stats=True, vegetation_threshold_ndvi=0.3):
+    # Lire et classifier une image, puis évaluer tous les DGOs qu'elle recouvre
+    image = readPlanetImage(path, scale)
+    image = calculateIndicators(image)
+    image = classifyObjects(image, water_threshold_ndwi, vegetation_threshold_ndvi)
+
+    dgos = dgos.to_crs(image['crs'])
+    properties = dgos.drop(columns=dgos.geometry.name).to_dict('records')
+
+    rows = []
+    for dgo_properties, geometry in zip(properties, dgos.geometry):
+        dgo_image = cropImage(image, geometry)
+        if dgo_image is None:
+            continue
+        dgo_mask = rasterizeDGO(geometry, dgo_image)
+
+        # Équivalent de filterBounds : ignorer les DGOs hors de l'emprise de l'image
+        valid = ~np.ma.getmaskarray(dgo_image['bands']['blue'])
+        if not np.any(valid & dgo_mask):
+            continue
+
+        rows.append(imageDGOMetrics(dgo_image, dgo_properties, geometry, dgo_mask, polygon_stats))
+
+    return rows
+
+
+######
+## Lecture par tuiles
+
+def gridShape(path, scale):
+    # Dimensions de la grille de l'image rééchantillonnée à `scale`
+    with rasterio.open(path) as src:
+        factor = src.res[0] / scale
+        return int(round(src.height * factor)), int(round(src.width * factor)), src.transform * Affine.scale(1 / factor), src.crs
+
+
+def iterTiles(path, scale=3, tile_size=1024, halo=FOCAL_RADIUS + 1):
+    '''
+    Yield the tiles of a scene on the `scale` grid, one at a time.
+
+    Each block covers its tile plus `halo` pixels on every side, read boundless
+    so that pixels outside the scene are masked. The default halo covers the
+    focalMode kernel for the tile and for the one-pixel ring around it, which is
+    needed to count pixel edges and connectivity across tile borders.
+    '''
+    n_rows, n_cols, _, _ = gridShape(path, scale)
+    with rasterio.open(path) as src:
+        factor = src.res[0] / scale
+
+    for row_off in range(0, n_rows, tile_size):
+        for col_off in range(0, n_cols, tile_size):
+            height = min(tile_size, n_rows - row_off)
+            width = min(tile_size, n_cols - col_off)
+            window = windows.Window((col_off - halo) / factor, (row_off - halo) / factor,
+                                    (width + 2 * halo) / factor, (height + 2 * halo) / factor)
+            yield windows.Window(col_off, row_off, width, height), readPlanetImage(path, scale, window)
+
+
+class ComponentAccumulator:
+    '''
+    8-connected components of one class inside one DGO, stitched across tiles.
+
+    Tiles must be added in row-major order. Only the labels of the last row and
+    last column of each added tile are kept to connect the following tiles; they
+    are freed once no following tile can touch them. Components that no longer
+    reach a kept boundary are finished: only their size is kept (closed).
+    '''
+
+    def __init__(self):
+        self.parent = [0]
+        self.size = [0]
+        self.rows = {}
+        self.cols = {}
+        self.closed = Counter()
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a, b):
+        selected = (a > 0) & (b > 0)
+        for i, j in set(zip(a[selected].tolist(), b[selected].tolist())):
+            root_i, root_j = self.find(i), self.find(j)
+            if root_i != root_j:
+                self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    def boundary(self, segments, index, start, length):
+        # Étiquettes déjà connues le long d'une ligne ou colonne, 0 en dehors de la classe
+        output = np.zeros(length, dtype='int64')
+        for seg_start, labels in segments.get(index, []):
+            lo, hi = max(start, seg_start), min(start + length, seg_start + len(labels))
+            if lo < hi:
+                output[lo - start:hi - start] = labels[lo - seg_start:hi - seg_start]
+        return output
+
+    def prune(self, row_off):
+        # Les tuiles suivantes commencent à row_off ou plus bas : elles ne lisent plus que la ligne row_off - 1
+        # et les segments de colonne qui l'atteignent
+        for index in [r for r in self.rows if r < row_off - 1]:
+            del self.rows[index]
+        for index, segments in list(self.cols.items()):
+            segments[:] = [(start, labels) for start, labels in segments if start + len(labels) > row_off - 1]
+            if not segments:
+                del self.cols[index]
+
+    def compact(self):
+        # Les composantes absentes des bordures conservées sont terminées : seule leur taille est gardée
+        # et les composantes ouvertes sont renumérotées, ce qui borne parent et size
+        roots = np.array([self.find(i) for i in range(len(self.parent))], dtype='int64')
+        sizes = np.bincount(roots, weights=self.size, minlength=len(self.parent)).astype('int64')
+
+        segments = [segment for index in (self.rows, self.cols) for row in index.values() for segment in row]
+        open_roots = np.unique(roots[np.concatenate([labels for _, labels in segments] + [np.zeros(1, dtype='int64')])])
+        open_roots = open_roots[open_roots > 0]
+
+        closed = sizes > 0
+        closed[open_roots] = False
+        self.closed.update(sizes[closed].tolist())
+
+        relabel = np.zeros(len(self.parent), dtype='int64')
+        relabel[open_roots] = np.arange(1, len(open_roots) + 1)
+        relabel = relabel[roots]
+        for index in (self.rows, self.cols):
+            for row in index.values():
+                row[:] = [(start, relabel[labels]) for start, labels in row]
+
+        self.parent = list(range(len(open_roots) + 1))
+        self.size = [0] + sizes[open_roots].tolist()
+
+    def add(self, mask, row_off, col_off):
+        self.prune(row_off)
+        local, n = ndimage.label(mask, structure=EIGHT_CONNECTED)
+        height, width = mask.shape
+
+        offset = len(self.parent)
+        ids = np.where(local > 0, local + offset - 1, 0)
+        self.parent.extend(range(offset, offset + n))
+        self.size.extend(np.bincount(local.ravel(), minlength=n + 1)[1:].tolist())
+
+        # Recoudre avec la ligne au-dessus et la colonne à gauche (voisinage 8-connexe)
+        top = self.boundary(self.rows, row_off - 1, col_off - 1, width + 2)
+        left = self.boundary(self.cols, col_off - 1, row_off - 1, height + 2)
+        for shift in (-1, 0, 1):
+            self.union(ids[0], top[1 + shift:1 + shift + width])
+            self.union(ids[:, 0], left[1 + shift:1 + shift + height])
+
+        self.rows.setdefault(row_off + height - 1, []).append((col_off, ids[-1].copy()))
+        self.cols.setdefault(col_off + width - 1, []).append((row_off, ids[:, -1].copy()))
+        self.compact()
+
+    def sizes(self):
+        roots = [self.find(i) for i in range(1, len(self.parent))]
+        sizes = np.bincount(roots, weights=self.size[1:], minlength=len(self.parent))
+        closed = np.repeat(list(self.closed), list(self.closed.values()))
+        return np.concatenate([closed, sizes[sizes > 0]])
+
+
+class DGOAccumulator:
+    '''
+    Running sums, counts, pixel edges and components of one DGO over the tiles
+    of an image, giving the same metrics as imageDGOMetrics.
+    '''
+
+    polygon_classes = ['WATER', 'VEGETATION']
+
+    def __init__(self, properties, geometry, bbox, grid_shape, polygon_stats=True):
+        self.properties = properties
+        self.polygon_stats = polygon_stats
+        self.geometry = geometry
+        self.bbox = bbox
+        self.grid_shape = grid_shape
+        self.counts = dict.fromkeys(['clear', 'full', 'valid', 'WATER', 'VEGETATION', 'AC'], 0)
+        self.sums = {}
+        self.edges = dict.fromkeys(self.polygon_classes, 0)
+        self.components = {name: ComponentAccumulator() for name in self.polygon_classes}
+
+    def addMean(self, name, values, mask):
+        selected = np.ma.getdata(values)[mask & ~np.ma.getmaskarray(values)]
+        total, count = self.sums.get(name, (0., 0))
+        self.sums[name] = (total + float(selected.sum(dtype='float64')), count + selected.size)
+
+    def mean(self, name):
+        total, count = self.sums.get(name, (0., 0))
+        return total / count if count else None
+
+    def update(self, block, tile):
+        # Intersection du DGO avec le coeur de la tuile, puis bloc élargi d'un pixel autour
+        row_min, row_max, col_min, col_max = self.bbox
+        r0, r1 = max(row_min, tile.row_off), min(row_max, tile.row_off + tile.height)
+        c0, c1 = max(col_min, tile.col_off), min(col_max, tile.col_off + tile.width)
+        if r0 >= r1 or c0 >= c1:
+            return
+
+        halo = (block['bands']['blue'].shape[0] - tile.height) // 2
+        rows = slice(r0 - tile.row_off + halo - 1, r1 - tile.row_off + halo + 1)
+        cols = slice(c0 - tile.col_off + halo - 1, c1 - tile.col_off + halo + 1)
+        ring = sliceImage(block, rows, cols)
+        ring_mask = rasterizeDGO(self.geometry, ring)
+
+        # Les pixels de la bordure situés hors de l'image n'existent pas dans la grille
+        n_rows, n_cols = self.grid_shape
+        ring_rows = np.arange(r0 - 1, r1 + 1)
+        ring_cols = np.arange(c0 - 1, c1 + 1)
+        ring_mask &= ((ring_rows >= 0) & (ring_rows < n_rows))[:, None] & ((ring_cols >= 0) & (ring_cols < n_cols))[None, :]
+
+        core = sliceImage(ring, slice(1, -1), slice(1, -1))
+        dgo_mask = ring_mask[1:-1, 1:-1]
+        bands = core['bands']
+
+        self.counts['clear'] += np.count_nonzero(np.ma.filled(bands['CLEAR'], 0)[dgo_mask] == 1)
+        self.counts['full'] += np.count_nonzero(~np.ma.getmaskarray(bands['CLEAR'])[dgo_mask])
+        self.counts['valid'] += np.count_nonzero(~np.ma.getmaskarray(bands['blue'])[dgo_mask])
+
+        self.addMean('NDWI', bands['NDWI'], dgo_mask)
+        self.addMean('NDVI', bands['NDVI'], dgo_mask)
+
+        for name in ['WATER', 'VEGETATION', 'AC']:
+            mask = classMask(core, name, dgo_mask)
+            self.counts[name] += np.count_nonzero(mask)
+            self.addMean(f'{name}_NDWI', bands['NDWI'], mask)
+            self.addMean(f'{name}_NDVI', bands['NDVI'], mask)
+
+        for name in self.polygon_classes:
+            ring_class = classMask(ring, name, ring_mask)
+
+            # Arêtes dont le pixel droit (ou bas) est dans le coeur ; la dernière arête est comptée
+            # ici seulement si aucune tuile suivante ne couvre ce DGO dans cette direction
+            last_col = ring_class.shape[1] - (1 if c1 == col_max else 2)
+            last_row = ring_class.shape[0] - (1 if r1 == row_max else 2)
+            self.edges[name] += np.count_nonzero(ring_class[1:-1, :last_col] != ring_class[1:-1, 1:last_col + 1])
+            self.edges[name] += np.count_nonzero(ring_class[:last_row, 1:-1] != ring_class[1:last_row + 1, 1:-1])
+
+            if self.polygon_stats:
+                self.components[name].add(ring_class[1:-1, 1:-1], r0, c0)
+
+    def metrics(self, image):
+        scale = image['scale']
+        aoi_pixel_count = self.geometry.area / scale**2
+
+        metrics = dict(self.properties)
+        metrics.update({
+            'DATE': image['acquired'].strftime('%Y-%m-%d'),
+            'CLEAR_SCORE': round(self.counts['clear'] / self.counts['full'] * 100) if self.counts['full'] else None,
+            'COVERAGE_SCORE': round(self.counts['valid'] / aoi_pixel_count * 100) if aoi_pixel_count else None,
+        })
+        for name in self.polygon_classes:
+            metrics.update(polygonStatistics(self.components[name].sizes(), self.edges[name], name, scale, self.polygon_stats))
+        metrics.update({
+            'WATER_AREA': self.counts['WATER'],
+            'MEAN_WATER_NDWI': self.mean('WATER_NDWI'),
+            'MEAN_NDWI': self.mean('NDWI'),
+            'VEGETATION_AREA': self.counts['VEGETATION'],
+            'MEAN_VEGETATION_NDVI': self.mean('VEGETATION_NDVI'),
+            'MEAN_VEGETATION_NDWI': self.mean('VEGETATION_NDWI'),
+            'MEAN_NDVI': self.mean('NDVI'),
+            'AC_AREA': self.counts['AC'],
+            'MEAN_AC_NDVI': self.mean('AC_NDVI'),
+            'MEAN_AC_NDWI': self.mean('AC_NDWI'),
+        })
+        return metrics
+
+
+def processImageTiled(path, dgos, scale, water_threshold_ndwi, tile_size=1024, polygon_stats=True, vegetation_threshold_ndvi=0.3):
+    # Même résultat que processImage, avec une empreinte mémoire bornée par la taille des tuiles
+    n_rows, n_cols, transform, crs = gridShape(path, scale)
+
+    dgos = dgos.to_crs(crs)
+    properties = dgos.drop(columns=dgos.geometry.name).to_dict('records')
+
+    accumulators = []
+    for dgo_properties, geometry in zip(properties, dgos.geometry):
+        bbox = dgoBoundingBox(geometry, transform, n_rows, n_cols)
+        if bbox[0] < bbox[1] and bbox[2] < bbox[3]:
+            accumulators.append(DGOAccumulator(dgo_properties, geometry, bbox, (n_rows, n_cols), polygon_stats))
+
+    image = None
+    for tile, block in iterTiles(path, scale, tile_size):
+        block = calculateIndicators(block)
+        block = classifyObjects(block, water_threshold_ndwi, vegetation_threshold_ndvi)
+        for accumulator in accumulators:
+            accumulator.update(block, tile)
+        image = block
+
+    # Équivalent de filterBounds : ignorer les DGOs hors de l'emprise de l'image
+    return [a.metrics(image) for a in accumulators if a.counts['valid'] > 0]
+
+
+def loadDGOs(dgo_path):
+    return gpd.read_file(dgo_path)
+
+
+# Métriques calculées par le moteur local (mêmes colonnes que dgo_metrics_planet.METRICS)
+METRICS = [
+    'WATER_AREA',
+    'WATER_PERIMETER',
+    'WATER_POLYGONS',
+    *[f'WATER_POLYGONS_p{pc}' for pc in range(0, 110, 10)],
+    'MEAN_WATER_NDWI',
+    'MEAN_NDWI',
+    'VEGETATION_AREA',
+    'VEGETATION_PERIMETER',
+    'VEGETATION_POLYGONS',
+    *[f'VEGETATION_POLYGONS_p{pc}' for pc in range(0, 110, 10)],
+    'MEAN_VEGETATION_NDVI',
+    'MEAN_VEGETATION_NDWI',
+    'MEAN_NDVI',
+    'AC_AREA',
+    'MEAN_AC_NDVI',
+    'MEAN_AC_NDWI',
+    'THRESHOLD_NDWI',
+]
+
+
+def imageShard(path, dgos, scale, water_threshold_ndwi, tile_size=None, polygon_stats=True, vegetation_threshold_ndvi=0.3):
+    # Une image est lue une seule fois et tous les DGOs qu'elle intersecte sont évalués
+    # tile_size : lecture par tuiles pour les scènes plus grandes que la mémoire disponible
+    # polygon_stats=False : périmètres seuls, sans étiquetage des composantes
+    # water_threshold_ndwi='adaptive' : seuil d'Otsu de la scène, enregistré dans la colonne THRESHOLD_NDWI
+    adaptive = water_threshold_ndwi == 'adaptive'
+    if adaptive:
+        water_threshold_ndwi = adaptiveThreshold(path)
+
+    if tile_size:
+        rows = processImageTiled(path, dgos, scale, water_threshold_ndwi, tile_size, polygon_stats, vegetation_threshold_ndvi)
+    else:
+        rows = processImage(path, dgos, scale, water_threshold_ndwi, polygon_stats, vegetation_threshold_ndvi)
+
+    # Seuil appliqué (fixe ou adaptatif), comme la propriété THRESHOLD_NDWI des images sur GEE
+    for row in rows:
+        row['THRESHOLD_NDWI'] = float(water_threshold_ndwi)
+    return rows
+
+
+def calculateDGOsMetrics(image_paths, dgos, scale, water_threshold_ndwi, tile_size=None, workers=1, chunksize=1, polygon_stats=True, metrics=None,
+                         vegetation_threshold_ndvi=0.3):
+    # metrics : colonnes de métriques conservées (voir METRICS), toutes par défaut
+    if metrics is not None:
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise ValueError(f"Metrics {unknown} are not computed by the local backend, expected some of {METRICS}")
+
+    shard = partial(imageShard, dgos=dgos, scale=scale, water_threshold_ndwi=water_threshold_ndwi, tile_size=tile_size, polygon_stats=polygon_stats,
+                    vegetation_threshold_ndvi=vegetation_threshold_ndvi)
+
+    if workers > 1:
+        # Les shards (une image chacun) sont répartis sur un pool de processus ; map conserve
+        # l'ordre des images, ce qui rend la fusion des résultats déterministe
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shards = list(executor.map(shard, image_paths, chunksize=chunksize))
+    else:
+        shards = [shard(path) for path in image_paths]
+
+    results = pd.DataFrame([row for rows in shards for row in rows])
+    if metrics is None:
+        return results
+
+    # Propriétés des DGOs, date et scores, puis les métriques demandées dans l'ordre demandé
+    properties = [c for c in dgos.columns if c != dgos.geometry.name]
+    return results.reindex(columns=properties + ['DATE', 'CLEAR_SCORE', 'COVERAGE_SCORE'] + list(metrics))
+
+
+def runWorkflow(dgo_path, planet_directory, water_threshold_ndwi, output_csv, scale=3, tile_size=None, workers=1, polygon_stats=True, chunksize=1, metrics=None,
+                vegetation_threshold_ndvi=0.3):
+    dgos = loadDGOs(dgo_path)
+    image_paths = listPlanetImages(planet_directory)
+
+    metrics = calculateDGOsMetrics(image_paths, dgos, scale, water_threshold_ndwi, tile_size, workers, chunksize, polygon_stats, metrics,
+                                   vegetation_threshold_ndvi)
+    metrics.to_csv(output_csv, index=False)
+
+    return metrics
@@ -0,0 +1,140 @@
+import ee
+import os
+import re
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Manifestes des runs écrits par startWorkflow : ils donnent directement les identifiants des tâches
+manifest_dir = os.path.join(os.path.expanduser('~'), '.glourbee_planet', 'runs')
+
+# Durée de validité (en secondes) des états de tâches mis en cache
+snapshot_ttl = 30
+
+# Nombre d'appels getOperation simultanés pour lire les tâches d'un run
+lookup_workers = 8
+
+task_cache = {}
+
+
+######
+## Manifests
+
+def manifestPath(run_id):
+    return os.path.join(manifest_dir, f'{run_id}.json')
+
+
+def writeManifest(run_id, **content):
+    # Écriture atomique du manifeste d'un run
+    os.makedirs(manifest_dir, exist_ok=True)
+    path = manifestPath(run_id)
+    with open(f'{path}.part', 'w') as f:
+        json.dump(dict(content, run_id=run_id, created=time.time()), f, indent=2)
+    os.replace(f'{path}.part', path)
+
+
+def readManifest(run_id):
+    path = manifestPath(run_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+######
+## Tasks
+
+def cached(key, compute, ttl):
+    now = time.time()
+    if key not in task_cache or now - task_cache[key][0] > ttl:
+        task_cache[key] = (now, compute())
+    return task_cache[key][1]
+
+
+# États des opérations Earth Engine, exprimés comme ceux des tâches (ee.batch.Task.State)
+OPERATION_STATES = {
+    'PENDING': 'READY',
+    'RUNNING': 'RUNNING',
+    'CANCELLING': 'CANCEL_REQUESTED',
+    'SUCCEEDED': 'COMPLETED',
+    'CANCELLED': 'CANCELLED',
+    'FAILED': 'FAILED',
+}
+
+
+def operationTask(operation):
+    # Opération (ee.data.listOperations / getOperation) au format des tâches utilisé par le paquet
+    metadata = operation.get('metadata', {})
+    return {
+        'id': operation['name'].split('/')[-1],
+        'name': operation['name'],
+        'state': OPERATION_STATES.get(metadata.get('state'), metadata.get('state')),
+        'description': metadata.get('description', ''),
+        'destination_uris': metadata.get('destinationUris', []),
+        'error_message': operation.get('error', {}).get('message'),
+    }
+
+
+def indexOperations():
+    # Un seul appel listOperations pour tous les runs sans manifeste, indexé par run_id
+    by_run = {}
+    for operation in ee.data.listOperations():
+        task = operationTask(operation)
+        match = re.search(r'run (\w+)', task['description'])
+        if match:
+            by_run.setdefault(match.group(1), []).append(task)
+    return {'runs': by_run}
+
+
+def taskSnapshot(ttl=None):
+    return cached('snapshot', indexOperations, snapshot_ttl if ttl is None else ttl)
+
+
+def fetchTasks(operation_names):
+    # Opérations d'un run lues par nom (getOperation), sans parcourir l'historique du compte
+    with ThreadPoolExecutor(max_workers=lookup_workers) as executor:
+        return [operationTask(operation) for operation in executor.map(ee.data.getOperation, operation_names)]
+
+
+def operationNames(manifest):
+    # Noms des opérations donnés par Task.start() (projet d'ee.Initialize, pas forcément celui des assets) ;
+    # les manifestes antérieurs ne gardent que les identifiants, rattachés au projet des assets
+    if manifest.get('operation_names'):
+        return manifest['operation_names']
+    return [f'projects/{manifest.get("ee_project_name")}/operations/{tid}' for tid in manifest.get('task_ids', [])]
+
+
+def runTasks(run_id, ttl=None):
+    '''
+    Tasks of a run. Runs started with a manifest are read by operation name
+    (getOperation), cached per run; older runs are matched on their
+    description in one cached listing of the Earth Engine operations.
+    '''
+    ttl = snapshot_ttl if ttl is None else ttl
+    manifest = readManifest(run_id)
+
+    if manifest and operationNames(manifest):
+        return cached(('run', run_id), lambda: fetchTasks(operationNames(manifest)), ttl)
+
+    return taskSnapshot(ttl)['runs'].get(run_id, [])
+
+
+def stateHistogram(tasks):
+    return Counter(t['state'] for t in tasks)
+
+
+def completedAssets(run_id, ee_project_name, ttl=None):
+    stacked_uris = [t.get('destination_uris', []) for t in runTasks(run_id, ttl) if t['state'] == 'COMPLETED']
+    uris = [uri.split(f'{ee_project_name}/assets/')[1] for sublist in stacked_uris for uri in sublist]
+
+    return [f'projects/{ee_project_name}/assets/{uri}' for uri in uris]
+
+
+def invalidate(run_id=None):
+    # Forcer la relecture des états (après une annulation par exemple), pour un run ou pour tous
+    task_cache.pop('snapshot', None)
+    if run_id is None:
+        task_cache.clear()
+    else:
+        task_cache.pop(('run', run_id), None)
@@ -4,148 +4,445 @@ import uuid
 import numpy as np
 import pandas as pd
 
+import time
+import shutil
+import socket
 import tempfile
 
-from urllib.request import urlretrieve
-from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
 
 from functions import (
     classification_planet,
-    dgo_metrics_planet
+    dgo_metrics_planet,
+    image_index,
+    task_registry
 )
 
 # Définition des noms de bandes 
 tempdir = tempfile.mkdtemp(prefix='glourbee_')
 
+# Types des propriétés exportées (les autres sont des float64)
+properties_dtypes = {
+    'DATE': 'string',
+    'DGO_FID': 'int64',
+    'acquired': 'string',
+}
+
 def startWorkflow(dgo_assetID: str,
                   ee_project_name: str,
                   planet_collection_assetID: str,
-                  water_threshold_ndwi: '-0.2'):
-    
-    dgo_features = ee.FeatureCollection(dgo_assetID)
+                  water_threshold_ndwi: '-0.2',
+                  backend='gee',
+                  workers=1,
+                  metrics_method='iterate',
+                  max_pairs_per_task=None,
+                  previous_results=None,
+                  dedup_images=False,
+                  mosaic_same_day=False,
+                  min_clear_score=None,
+                  min_coverage=None,
+                  image_index_asset=None,
+                  perimeter_method='vector',
+                  polygon_stats=True,
+                  metrics=None,
+                  vegetation_threshold_ndvi=None,
+                  tile_size=None,
+                  chunksize=1):
 
     workflow_id = uuid.uuid4().hex
 
+    # Balayage de seuils : une liste de seuils NDWI (et éventuellement NDVI) calculée en un seul run,
+    # avec une ligne par couple de seuils (colonnes THRESHOLD_NDWI et THRESHOLD_NDVI)
+    sweep = sweepThresholds(water_threshold_ndwi, vegetation_threshold_ndvi)
+    if sweep:
+        ndwi_thresholds, ndvi_thresholds = sweep
+        if backend == 'local':
+            raise ValueError("Threshold sweeps are only available with backend='gee'")
+
+        # Le balayage calcule toujours SWEEP_METRICS par jointure, avec des périmètres raster
+        if metrics is not None or perimeter_method != 'vector' or not polygon_stats or metrics_method != 'iterate':
+            raise ValueError("metrics, perimeter_method, polygon_stats and metrics_method are not available with threshold sweeps")
+
+    # Métriques calculées et téléchargées par getResults (voir dgo_metrics_planet.METRICS)
+    if sweep:
+        selected_metrics = dgo_metrics_planet.SWEEP_METRICS
+    else:
+        selected_metrics = dgo_metrics_planet.selectMetrics(metrics or dgo_metrics_planet.DEFAULT_METRICS, polygon_stats)
+
+    # water_threshold_ndwi='adaptive' : seuil d'Otsu par scène, enregistré dans la colonne THRESHOLD_NDWI
+    if water_threshold_ndwi == 'adaptive' and 'THRESHOLD_NDWI' not in selected_metrics:
+        selected_metrics = selected_metrics + ['THRESHOLD_NDWI']
+
+    if backend == 'local':
+        # Calcul local : dgo_assetID est un GeoPackage et planet_collection_assetID un dossier de GeoTIFF PlanetScope
+        # workers : nombre de processus, chunksize images envoyées à la fois à chaque processus
+        # tile_size : lecture par tuiles de tile_size pixels pour borner la mémoire (None : image entière)
+        if previous_results:
+            raise ValueError("previous_results is only available with backend='gee'")
+
+        from functions import local_planet
+
+        local_csv = os.path.join(tempdir, f'{workflow_id}.local.csv')
+        local_planet.runWorkflow(dgo_path=dgo_assetID,
+                                 planet_directory=planet_collection_assetID,
+                                 water_threshold_ndwi=water_threshold_ndwi,
+                                 vegetation_threshold_ndvi=0.3 if vegetation_threshold_ndvi is None else vegetation_threshold_ndvi,
+                                 output_csv=local_csv,
+                                 tile_size=tile_size,
+                                 workers=workers,
+                                 chunksize=chunksize,
+                                 polygon_stats=any('_POLYGONS' in m for m in selected_metrics),
+                                 metrics=selected_metrics)
+
+        task_registry.writeManifest(workflow_id, backend='local', local_csv=local_csv, metrics=selected_metrics)
+
+        print(f'Local computation done')
+
+        return workflow_id
+    elif backend != 'gee':
+        raise ValueError(f"Unknown backend '{backend}', expected 'gee' or 'local'")
+    
+    dgo_features = ee.FeatureCollection(dgo_assetID)
+
     bnd_names = ['blue', 'green', 'red', 'nir', 'CLEAR']
     scale = 3
 
     # 1 - load Image Collection
     planet_IC = ee.ImageCollection(planet_collection_assetID).select(['B1', 'B2', 'B3', 'B4','Q1'], bnd_names).filterBounds(dgo_features)
 
-    # 2 - Apply NDVI and NDWI calculation
-    collection = classification_planet.calculateIndicators(planet_IC)
+    # Une scène livrée plusieurs fois dans la collection n'est calculée qu'une fois
+    if dedup_images:
+        planet_IC = ee.ImageCollection(planet_IC.distinct('acquired'))
+
+    # Mosaïquer les strips d'une même date pour n'évaluer chaque DGO qu'une fois par date
+    if mosaic_same_day:
+        planet_IC = classification_planet.mosaicSameDay(planet_IC)
+
+    # Index DGO -> images stocké en assets et complété à chaque run (remplace filterBounds par DGO)
+    if image_index_asset:
+        dgo_images = image_index.updateImageIndex(planet_IC, dgo_features, image_index_asset, workflow_id)
+    else:
+        dgo_images = None
+
+    # Mode incrémental : ne calculer que ce qui manque aux résultats d'un run précédent (CSV ou asset)
+    if previous_results:
+        jobs = filterNewAcquisitions(planet_IC, dgo_features, previous_results)
+    else:
+        jobs = [(planet_IC, dgo_features)]
+
+    # Découper le calcul en tâches d'export d'au plus max_pairs_per_task paires image × DGO
+    shards = [shard for images, dgos in jobs for shard in shardWorkflow(images, dgos, max_pairs_per_task)]
+
+    task_ids = []
+    operation_names = []
+    asset_ids = []
+    for i, (shard_IC, shard_dgos) in enumerate(shards):
+        # 2 - Apply NDVI and NDWI calculation
+        collection = classification_planet.calculateIndicators(shard_IC)
+
+        if sweep:
+            # 3/4 - Classification and metrics for all the thresholds at once
+            collection = classification_planet.classifyObjectsSweep(collection, ndwi_thresholds, ndvi_thresholds)
+            metrics = dgo_metrics_planet.calculateDGOsSweepMetrics(collection=collection, dgos=shard_dgos, scale=scale,
+                                                                   ndwi_thresholds=ndwi_thresholds, ndvi_thresholds=ndvi_thresholds,
+                                                                   image_index=dgo_images, min_clear_score=min_clear_score, min_coverage=min_coverage)
+        else:
+            # 3 - Classify the objects using the indicators
+            collection = classification_planet.classifyObjects(collection, water_threshold_ndwi,
+                                                               0.3 if vegetation_threshold_ndvi is None else vegetation_threshold_ndvi)
+
+            # 4 - Metrics calculation
+            metrics = dgo_metrics_planet.calculateDGOsMetrics(collection=collection, dgos=shard_dgos, scale = scale, method=metrics_method,
+                                                              image_index=dgo_images, min_clear_score=min_clear_score, min_coverage=min_coverage,
+                                                              perimeter=perimeter_method, metrics=selected_metrics)
+
+        # Create computation task
+        assetName = f'{workflow_id}' if len(shards) == 1 else f'{workflow_id}_{i}'
+        assetId = f'projects/{ee_project_name}/assets/metrics/tmp/{assetName}'
+
+        task = ee.batch.Export.table.toAsset(
+            collection=metrics,
+            description=f'Computation task {i+1}/{len(shards)} for run {workflow_id}',
+            assetId=assetId
+        )
+        task.start()
+
+        task_ids.append(task.id)
+        operation_names.append(task.operation_name)
+        asset_ids.append(assetId)
+
+    # Le manifeste permet de retrouver les tâches du run sans parcourir tout l'historique du compte
+    # (operation_names : noms complets des opérations, dans le projet d'ee.Initialize)
+    # gated : les paires rejetées par min_clear_score / min_coverage portent la colonne REJECTED
+    task_registry.writeManifest(workflow_id, backend='gee', ee_project_name=ee_project_name,
+                                task_ids=task_ids, operation_names=operation_names, asset_ids=asset_ids, metrics=selected_metrics,
+                                gated=min_clear_score is not None or min_coverage is not None)
+
+    print(f'{len(shards)} computation tasks started')
+    
+    return workflow_id
 
-    # 3 - Classify the objects using the indicators
-    collection = classification_planet.classifyObjects(collection, water_threshold_ndwi)
 
-    # 4 - Metrics calculation
-    metrics = dgo_metrics_planet.calculateDGOsMetrics(collection=collection, dgos=dgo_features, scale = scale)
+def sweepThresholds(water_threshold_ndwi, vegetation_threshold_ndvi):
+    # Listes (NDWI, NDVI) des seuils d'un balayage, None si les deux seuils sont uniques
+    if not isinstance(water_threshold_ndwi, (list, tuple)) and not isinstance(vegetation_threshold_ndvi, (list, tuple)):
+        return None
 
-    # Create computation task
-    assetName = f'{workflow_id}'
-    assetId = f'projects/{ee_project_name}/assets/metrics/tmp/{assetName}'
+    ndwi_thresholds = list(water_threshold_ndwi) if isinstance(water_threshold_ndwi, (list, tuple)) else [water_threshold_ndwi]
+    # Le seuil adaptatif est calculé par scène : il ne peut pas être une des bandes WATER{i} du balayage
+    if 'adaptive' in ndwi_thresholds:
+        raise ValueError("water_threshold_ndwi='adaptive' is not available with threshold sweeps, give numeric NDWI thresholds")
+    if isinstance(vegetation_threshold_ndvi, (list, tuple)):
+        ndvi_thresholds = list(vegetation_threshold_ndvi)
+    else:
+        ndvi_thresholds = [0.3 if vegetation_threshold_ndvi is None else vegetation_threshold_ndvi]
+    return ndwi_thresholds, ndvi_thresholds
 
-    task = ee.batch.Export.table.toAsset(
-        collection=metrics,
-        description=f'Computation task for run {workflow_id}',
-        assetId=assetId
-    )
-    task.start()
 
-    print(f'Computation task started')
-    
-    return workflow_id
+def processedAcquisitions(previous_results):
+    # Dates et DGO_FID déjà présents dans des résultats précédents (CSV ou Parquet écrit par getResults, ou asset)
+    if os.path.isdir(previous_results):
+        df = pd.read_parquet(previous_results, columns=['DATE', 'DGO_FID'])
+        return df['DATE'].astype(str).unique().tolist(), df['DGO_FID'].astype('int64').unique().tolist()
+    elif os.path.exists(previous_results):
+        df = pd.read_csv(previous_results, usecols=['DATE', 'DGO_FID'])
+        return df['DATE'].astype(str).unique().tolist(), df['DGO_FID'].unique().tolist()
 
-def workflowState(run_id):
-    ee_tasks = ee.data.getTaskList()
-    tasks = [t for t in ee_tasks if f'run {run_id}' in t['description']]
+    previous_fc = ee.FeatureCollection(previous_results)
+    return previous_fc.aggregate_array('DATE').distinct().getInfo(), previous_fc.aggregate_array('DGO_FID').distinct().getInfo()
 
-    # Check all tasks
-    completed = len([t for t in tasks if t['state'] == 'COMPLETED'])
-    running = len([t for t in tasks if t['state'] == 'RUNNING'])
-    pending = len([t for t in tasks if t['state'] == 'PENDING'])
-    ready = len([t for t in tasks if t['state'] == 'READY'])
-    failed = len([t for t in tasks if t['state'] == 'FAILED'])
-
-    print(f'{completed} tasks completed.')
-    print(f'{running} tasks running.')
-    print(f'{pending} tasks pending.')
-    print(f'{ready} tasks ready.')
-    print(f'{failed} tasks failed.')
 
-    return tasks
+def filterNewAcquisitions(planet_IC, dgo_features, previous_results):
+    '''
+    Return the (images, DGOs) jobs missing from previous results: the new
+    acquisitions over every DGO, and the already processed acquisitions over
+    the DGOs that were not part of the previous run.
+    '''
+    dates, dgo_fids = processedAcquisitions(previous_results)
 
+    planet_IC = planet_IC.map(lambda image: image.set('DATE', ee.Date(image.get('acquired')).format('YYYY-MM-dd')))
+    new_IC = planet_IC.filter(ee.Filter.inList('DATE', dates).Not())
+    seen_IC = planet_IC.filter(ee.Filter.inList('DATE', dates))
+    new_dgos = dgo_features.filter(ee.Filter.inList('DGO_FID', dgo_fids).Not())
+
+    jobs = [(new_IC, dgo_features), (seen_IC, new_dgos)]
+    sizes = ee.List([new_IC.size(), seen_IC.size().multiply(new_dgos.size())]).getInfo()
+
+    print(f'{sizes[0]} new acquisitions to compute')
+
+    return [job for job, size in zip(jobs, sizes) if size > 0]
 
-def cancelWorkflow(run_id):
-    ee_tasks = ee.data.getTaskList()
-    tasks = [t for t in ee_tasks if f'run {run_id}' in t['description']]
 
-    task_ids = [t['id'] for t in tasks]
+# Durée d'un jour en millisecondes (unité de system:time_start)
+DAY_MS = 24 * 3600 * 1000
 
-    for tid in task_ids:
-        ee.data.cancelTask(tid)
 
+def shardWorkflow(planet_IC, dgo_features, max_pairs_per_task=None):
+    '''
+    Split the (image, DGO) pairs of a run into export shards of at most
+    max_pairs_per_task pairs. Images are cut into windows of whole acquisition
+    days holding about the same number of images and DGOs into contiguous batches.
+    '''
+    if not max_pairs_per_task:
+        return [(planet_IC, dgo_features)]
 
-def getResults(run_id, ee_project_name, output_csv, overwrite=False, remove_tmp=False):
-    ee_tasks = ee.data.getTaskList()
-    stacked_uris = [t['destination_uris'] for t in ee_tasks if f'run {run_id}' in t['description'] and t['state'] == 'COMPLETED']
-    uris = [uri.split(f'{ee_project_name}/assets/')[1] for sublist in stacked_uris for uri in sublist]
+    n_dgos = dgo_features.size().getInfo()
+    dates = planet_IC.aggregate_array('system:time_start').sort().getInfo()
+    n_images = len(dates)
+    if n_images == 0 or n_dgos * n_images <= max_pairs_per_task:
+        return [(planet_IC, dgo_features)]
 
-    assets = [f'projects/{ee_project_name}/assets/{uri}' for uri in uris]
+    images_per_task = min(n_images, max_pairs_per_task)
+    dgos_per_task = max(1, max_pairs_per_task // images_per_task)
+
+    # Bornes des fenêtres : débuts de jours calendaires (UTC), pour que les images d'une même date
+    # (DATE exportée) restent dans la même fenêtre [début du jour, début du jour suivant)
+    days = [t - t % DAY_MS for t in dates]
+    bounds = sorted(set(days[i] for i in range(0, n_images, images_per_task))) + [days[-1] + DAY_MS]
+    date_windows = [planet_IC.filter(ee.Filter.And(ee.Filter.gte('system:time_start', start),
+                                                   ee.Filter.lt('system:time_start', end)))
+                    for start, end in zip(bounds[:-1], bounds[1:])]
+
+    dgo_list = dgo_features.toList(n_dgos)
+    dgo_batches = [ee.FeatureCollection(dgo_list.slice(start, start + dgos_per_task))
+                   for start in range(0, n_dgos, dgos_per_task)]
+
+    return [(images, dgos) for images in date_windows for dgos in dgo_batches]
+
+def workflowState(run_id):
+    tasks = task_registry.runTasks(run_id)
+
+    # Check all tasks
+    states = task_registry.stateHistogram(tasks)
+
+    print(f'{states["COMPLETED"]} tasks completed.')
+    print(f'{states["RUNNING"]} tasks running.')
+    print(f'{states["READY"]} tasks ready (pending).')
+    print(f'{states["FAILED"]} tasks failed.')
+
+    return tasks
+
+
+def cancelWorkflow(run_id):
+    tasks = task_registry.runTasks(run_id, ttl=0)
+
+    # Seules les tâches en attente ou en cours peuvent être annulées
+    for task in tasks:
+        if task['state'] in ('READY', 'RUNNING'):
+            ee.data.cancelOperation(task['name'])
+
+    task_registry.invalidate(run_id)
+
+
+def downloadFile(url, path, timeout=120, retries=4):
+    # Téléchargement atomique (fichier .part renommé à la fin) avec reprise en cas d'erreur temporaire
+    part = f'{path}.part'
+    for attempt in range(retries + 1):
+        try:
+            with urlopen(url, timeout=timeout) as response, open(part, 'wb') as f:
+                shutil.copyfileobj(response, f)
+            os.replace(part, path)
+            return path
+        except HTTPError as e:
+            # Les erreurs client (hors 429) ne sont pas temporaires
+            if (e.code < 500 and e.code != 429) or attempt == retries:
+                raise
+        except (URLError, socket.timeout):
+            if attempt == retries:
+                raise
+        time.sleep(2 ** attempt)
+
+
+def downloadAsset(assetName, path, properties_list, timeout=120, retries=4):
+    asset = ee.FeatureCollection(assetName)
+    clean_fc = asset.select(propertySelectors=properties_list,
+                    retainGeometry=False)
+    try:
+        downloadFile(clean_fc.getDownloadUrl(), path, timeout, retries)
+    except HTTPError:
+        # Si c'est impossible de télécharger l'asset nettoyé, télécharger l'asset complet et le nettoyer localement
+        full_path = f'{path}.full'
+        downloadFile(asset.getDownloadUrl(), full_path, timeout, retries)
+        df = pd.read_csv(full_path, index_col=None, header=0)
+        df = df[properties_list]
+        df.to_csv(f'{path}.part')
+        os.replace(f'{path}.part', path)
+        os.remove(full_path)
+
+    return path
+
+
+def getResults(run_id, ee_project_name, output_csv, overwrite=False, remove_tmp=False, append=False,
+               download_workers=8, timeout=120, retries=4, output_format='csv', dedup=False, metrics=None):
+    # Résultats calculés avec backend='local' : aucune tâche Earth Engine à interroger
+    manifest = task_registry.readManifest(run_id) or {}
+    local_csv = manifest.get('local_csv', os.path.join(tempdir, f'{run_id}.local.csv'))
+
+    assets = [] if manifest.get('backend') == 'local' else task_registry.completedAssets(run_id, ee_project_name)
     temp_csv_list = [os.path.join(tempdir, f'{os.path.basename(a)}.tmp.csv') for a in assets]
 
+    # Colonnes des métriques choisies au lancement du run (manifeste), sinon celles par défaut
+    # REJECTED n'existe que pour les runs lancés avec min_clear_score ou min_coverage
+    metrics = metrics or manifest.get('metrics') or dgo_metrics_planet.DEFAULT_METRICS
     properties_list = [
         'DATE',
         'DGO_FID',
         'acquired',
-        'AC_AREA',
         'CLEAR_SCORE',
         'COVERAGE_SCORE',
-        'MEAN_AC_NDWI',
-        'MEAN_AC_NDVI',
-        'MEAN_NDWI',
-        'MEAN_NDVI',
-        'MEAN_VEGETATION_NDWI',
-        'MEAN_VEGETATION_NDVI',
-        'MEAN_WATER_NDWI',
-        'VEGETATION_AREA',
-        'VEGETATION_PERIMETER',
-        'WATER_AREA',
-        'WATER_PERIMETER']
+        *metrics,
+        *(['REJECTED'] if manifest.get('gated') else [])]
     
-    for assetName, path in zip(assets, temp_csv_list):
-        if not os.path.exists(path) or overwrite:
-            asset = ee.FeatureCollection(assetName)
-            clean_fc = asset.select(propertySelectors=properties_list,
-                            retainGeometry=False)
-            try:
-                urlretrieve(clean_fc.getDownloadUrl(), path)
-            except HTTPError:
-                # Si c'est impossible de télécharger l'asset nettoyé, télécharger l'asset complet et le nettoyer localement
-                urlretrieve(asset.getDownloadUrl(), path)
-                df = pd.read_csv(path, index_col=None, header=0)
-                df = df[properties_list]
-                df.to_csv(path)
-        else:
-            continue
+    # download_workers téléchargements simultanés, chacun avec un timeout et des reprises (backoff exponentiel)
+    # Les fichiers déjà téléchargés sont conservés, ce qui permet de reprendre un téléchargement interrompu
+    to_download = [(a, p) for a, p in zip(assets, temp_csv_list) if not os.path.exists(p) or overwrite]
+
+    with ThreadPoolExecutor(max_workers=download_workers) as executor:
+        futures = [executor.submit(downloadAsset, assetName, path, properties_list, timeout, retries)
+                   for assetName, path in to_download]
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            print(f'{done}/{len(futures)} assets downloaded')
+
+    if os.path.exists(local_csv):
+        temp_csv_list.append(local_csv)
+
+    # Fusion en flux : un seul fichier temporaire est chargé en mémoire à la fois
+    # output_format='parquet' : output_csv est le dossier d'un dataset Parquet partitionné par DGO_FID et année
+    # dedup=True : une seule ligne par DGO et par date (voir dedupResults)
+    if output_format == 'parquet':
+        mergeParquet(temp_csv_list, output_csv, properties_list, run_id, dedup)
+    elif output_format == 'csv':
+        mergeCSV(temp_csv_list, output_csv, properties_list, append, dedup)
+    else:
+        raise ValueError(f"Unknown output_format '{output_format}', expected 'csv' or 'parquet'")
+
+    if remove_tmp:
+        for filename in temp_csv_list:
+            os.remove(filename)
 
-    output_dfs = []
-    for filename in temp_csv_list:
-        df = pd.read_csv(filename, index_col=None, header=0)
-        output_dfs.append(df)
 
-        if remove_tmp:
-            os.remove(filename)
+def dedupResults(df):
+    # Une seule ligne par DGO et par date (plusieurs strips le même jour) : la scène qui couvre le mieux le DGO, puis la plus claire
+    # (une par couple de seuils pour les résultats d'un balayage)
+    keys = ['DGO_FID', 'DATE'] + [c for c in ['THRESHOLD_NDWI', 'THRESHOLD_NDVI'] if c in df.columns]
+    best = df.sort_values(['COVERAGE_SCORE', 'CLEAR_SCORE'], ascending=False, kind='stable')
+    return best.drop_duplicates(keys).sort_index()
 
-    df = pd.concat(output_dfs, axis=0, ignore_index=True)
-    df.to_csv(output_csv)
 
+def readShard(filename, properties_list):
+    # Lire uniquement les propriétés exportées, avec des types explicites
+    df = pd.read_csv(filename, usecols=lambda c: c in properties_list)
+    df = df.reindex(columns=properties_list)
+    return df.astype({p: properties_dtypes.get(p, 'float64') for p in properties_list})
+
+
+def readShards(csv_list, properties_list, dedup=False):
+    # Un fichier temporaire à la fois ; avec dedup, un seul tableau fusionné puis dédoublonné :
+    # les scènes d'un même DGO à une même date peuvent être réparties entre plusieurs shards
+    # (lots de DGOs, runs repris, résultats locaux)
+    if not dedup:
+        for filename in csv_list:
+            yield readShard(filename, properties_list)
+    elif csv_list:
+        yield dedupResults(pd.concat([readShard(filename, properties_list) for filename in csv_list], ignore_index=True))
+
+
+def mergeCSV(csv_list, output_csv, properties_list, append=False, dedup=False):
+    # Ajouter les résultats d'un run incrémental à ceux du run précédent, en conservant ses colonnes
+    if append and os.path.exists(output_csv):
+        columns = pd.read_csv(output_csv, nrows=0).columns
+        mode = 'a'
+    else:
+        columns = None
+        mode = 'w'
+
+    for df in readShards(csv_list, properties_list, dedup):
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        df.to_csv(output_csv, mode=mode, header=(mode == 'w'), index=False)
+        mode = 'a'
 
-def cleanAssets(run_id, ee_project_name):
-    ee_tasks = ee.data.getTaskList()
-    stacked_uris = [t['destination_uris'] for t in ee_tasks if f'run {run_id}' in t['description'] and t['state'] == 'COMPLETED']
-    uris = [uri.split(f'{ee_project_name}/assets/')[1] for sublist in stacked_uris for uri in sublist]
 
-    assets_list = [f'projects/{ee_project_name}/assets/{uri}' for uri in uris]
+def mergeParquet(csv_list, output_dir, properties_list, run_id, dedup=False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for i, df in enumerate(readShards(csv_list, properties_list, dedup)):
+        dates = pd.to_datetime(df['DATE'])
+        df['DATE'] = dates.dt.date
+        df['YEAR'] = dates.dt.year
+
+        # Chaque fichier temporaire est écrit dans les partitions puis libéré ; les noms de fichiers
+        # portent le run pour pouvoir ajouter les runs incrémentaux au même dataset
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        pq.write_to_dataset(table, root_path=output_dir, partition_cols=['DGO_FID', 'YEAR'],
+                            basename_template=f'{run_id}-{i}-{{i}}.parquet')
+
+
+def cleanAssets(run_id, ee_project_name):
+    assets_list = task_registry.completedAssets(run_id, ee_project_name)
     for asset in assets_list:
         ee.data.deleteAsset(asset)
\ No newline at end of file
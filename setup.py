@@ -13,6 +13,12 @@ setup(
         'pandas',
         'geemap',
         'geetools',
+        'rasterio',
+        'scipy',
+        'shapely',
+        'pyarrow',
+        'planet',
+        'requests',
         # 'ipython',
         # 'ipykernel',
         # 'ipyleaflet==0.16',
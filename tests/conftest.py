@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+sys.path.insert(0, TESTS_DIR)
+
+import fake_ee
+
+# Sans l'API Earth Engine, les modules du paquet importent le substitut NumPy
+try:
+    import ee  # noqa: F401
+except ImportError:
+    sys.modules['ee'] = fake_ee
+
+
+@pytest.fixture
+def ee(monkeypatch):
+    # Les fonctions Earth Engine du paquet sont évaluées par le substitut NumPy (voir fake_ee)
+    from functions import classification_planet, dgo_metrics_planet, image_index, task_registry, workflow_planet
+    for module in (classification_planet, dgo_metrics_planet, image_index, task_registry, workflow_planet):
+        monkeypatch.setattr(module, 'ee', fake_ee)
+    monkeypatch.setattr(fake_ee.data, 'operations', [])
+    monkeypatch.setattr(fake_ee.data, 'assets', {})
+    monkeypatch.setattr(fake_ee.data, 'calls', [])
+    task_registry.task_cache.clear()
+    return fake_ee
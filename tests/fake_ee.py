@@ -0,0 +1,750 @@
+'''
+Eager NumPy stand-in for the part of the Earth Engine API used by the functions package.
+
+Every object holds its value: images are masked arrays on one shared pixel grid
+(see setGrid) and geometries are boolean masks on that grid (pixel centres)
+with the fraction of each pixel they cover, so the server-side code of the
+package can be evaluated and compared with the local backend.
+'''
+import re
+from datetime import datetime, timezone
+import numpy as np
+from scipy import ndimage
+
+# Grille commune à toutes les images et géométries
+SHAPE = (1, 1)
+SCALE = 3
+
+EIGHT_CONNECTED = np.ones((3, 3), dtype=bool)
+
+
+def setGrid(shape, scale=3):
+    global SHAPE, SCALE
+    SHAPE = tuple(shape)
+    SCALE = scale
+
+
+def value(obj):
+    # Valeur Python d'un objet du module (Number, Dictionary, List...)
+    if isinstance(obj, Number):
+        return obj.v
+    if isinstance(obj, Array):
+        return obj.a.tolist()
+    if isinstance(obj, dict):
+        return {k: value(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [value(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def exposedEdges(mask):
+    padded = np.pad(mask, 1, constant_values=False)
+    return int(np.count_nonzero(padded[:, 1:] != padded[:, :-1]) + np.count_nonzero(padded[1:, :] != padded[:-1, :]))
+
+
+######
+## Numbers, lists, dictionaries, arrays
+
+class Number:
+    def __init__(self, v):
+        self.v = value(v)
+
+    def _op(self, other, fn):
+        other = value(other)
+        if self.v is None or other is None:
+            return Number(None)
+        return Number(fn(self.v, other))
+
+    def add(self, other): return self._op(other, lambda a, b: a + b)
+    def subtract(self, other): return self._op(other, lambda a, b: a - b)
+    def multiply(self, other): return self._op(other, lambda a, b: a * b)
+    # Comme ee.Number.divide : 0 pour une division par 0
+    def divide(self, other): return self._op(other, lambda a, b: a / b if b else 0)
+    def pow(self, other): return self._op(other, lambda a, b: a ** b)
+    def max(self, other): return self._op(other, max)
+    def min(self, other): return self._op(other, min)
+    def gt(self, other): return self._op(other, lambda a, b: int(a > b))
+    def gte(self, other): return self._op(other, lambda a, b: int(a >= b))
+    def lt(self, other): return self._op(other, lambda a, b: int(a < b))
+    def lte(self, other): return self._op(other, lambda a, b: int(a <= b))
+    def eq(self, other): return self._op(other, lambda a, b: int(a == b))
+    def And(self, other): return self._op(other, lambda a, b: int(bool(a) and bool(b)))
+    def Or(self, other): return self._op(other, lambda a, b: int(bool(a) or bool(b)))
+
+    def round(self):
+        return Number(None if self.v is None else float(np.floor(self.v + 0.5)))
+
+    def format(self):
+        return String(int(self.v) if float(self.v).is_integer() else self.v)
+
+    def getInfo(self):
+        return self.v
+
+    def __bool__(self):
+        return bool(self.v)
+
+    def __repr__(self):
+        return f'Number({self.v!r})'
+
+
+class String(str):
+    def cat(self, other):
+        return String(self + str(value(other)))
+
+
+class Date:
+    def __init__(self, date):
+        date = value(date)
+        self.date = datetime.fromtimestamp(date / 1000, timezone.utc) if isinstance(date, (int, float)) else datetime.fromisoformat(date)
+
+    def format(self, pattern):
+        # Seul le format des dates exportées est pris en charge
+        assert pattern == 'YYYY-MM-dd'
+        return String(self.date.strftime('%Y-%m-%d'))
+
+
+class List(list):
+    @staticmethod
+    def sequence(start, end, step=1):
+        return List(range(int(value(start)), int(value(end)) + 1, int(value(step))))
+
+    def map(self, fn):
+        return List(fn(item) for item in self)
+
+    def distinct(self):
+        output = List()
+        for item in self:
+            if item not in output:
+                output.append(item)
+        return output
+
+    def add(self, element):
+        return List(self + [element])
+
+    def remove(self, element):
+        output = List(self)
+        if element in output:
+            del output[output.index(element)]
+        return output
+
+    def flatten(self):
+        output = List()
+        for item in self:
+            output.extend(List(item).flatten() if isinstance(item, list) else [item])
+        return output
+
+    def get(self, i):
+        return self[int(value(i))]
+
+    def slice(self, start, end=None):
+        return List(self[int(value(start)):None if end is None else int(value(end))])
+
+    def sort(self):
+        return List(sorted(self))
+
+    def size(self):
+        return Number(len(self))
+
+    def getInfo(self):
+        return value(self)
+
+
+class Dictionary(dict):
+    def __init__(self, d=None):
+        super().__init__(value(d) if isinstance(d, Dictionary) else (d or {}))
+
+    def combine(self, other, overwrite=True):
+        output = Dictionary(self)
+        for k, v in dict(other).items():
+            if overwrite or k not in output:
+                output[k] = v
+        return output
+
+    def set(self, key, v):
+        output = Dictionary(self)
+        output[key] = v
+        return output
+
+    def getNumber(self, key):
+        return Number(self[key])
+
+    def getString(self, key):
+        return String(self[key])
+
+    def getInfo(self):
+        return value(self)
+
+
+class Array:
+    def __init__(self, a):
+        self.a = np.array(value(a), dtype='float64')
+
+    def slice(self, axis=0, start=0, end=None, step=1):
+        index = [slice(None)] * self.a.ndim
+        index[axis] = slice(int(value(start)), None if end is None else int(value(end)), step)
+        return Array(self.a[tuple(index)])
+
+    def project(self, axes):
+        return Array(self.a.reshape([self.a.shape[i] for i in axes]))
+
+    def add(self, other): return Array(self.a + _array(other))
+    def subtract(self, other): return Array(self.a - _array(other))
+    def multiply(self, other): return Array(self.a * _array(other))
+
+    def reduce(self, reducer, axes):
+        return Array(reducer.reduceValues(self.a, axis=axes[0], keepdims=True))
+
+    def length(self):
+        return Array(self.a.shape)
+
+    def get(self, position):
+        return Number(self.a[tuple(int(value(i)) for i in position)].item())
+
+    def argmax(self):
+        # Position du premier maximum, comme ee.Array.argmax
+        return List(np.unravel_index(int(np.argmax(self.a)), self.a.shape))
+
+    def sort(self, keys=None):
+        keys = self.a if keys is None else _array(keys)
+        return Array(self.a[np.argsort(keys, kind='stable')])
+
+    def getInfo(self):
+        return self.a.tolist()
+
+
+def _array(obj):
+    return obj.a if isinstance(obj, Array) else np.array(value(obj), dtype='float64')
+
+
+######
+## Reducers
+
+class Reducer:
+    '''
+    Reducer outputs. As on Earth Engine, reduceRegion weights the pixels by the
+    fraction of the pixel inside the geometry (pixels whose centre is outside
+    included); unweighted() reducers give weight 1 to the pixels whose centre
+    is inside.
+    '''
+
+    def __init__(self, outputs, reduceValues=None):
+        # outputs : [(nom, fonction des valeurs et des poids d'une bande, pondéré)]
+        self.outputs = outputs
+        self.reduceValues = reduceValues
+
+    @staticmethod
+    def sum():
+        return Reducer([('sum', lambda v, w: float((v * w).sum()), True)], lambda a, axis, keepdims: a.sum(axis=axis, keepdims=keepdims))
+
+    @staticmethod
+    def mean():
+        return Reducer([('mean', lambda v, w: float((v * w).sum() / w.sum()) if w.sum() else None, True)])
+
+    @staticmethod
+    def count():
+        return Reducer([('count', lambda v, w: int(v.size), True)])
+
+    @staticmethod
+    def percentile(percentiles, outputNames=None):
+        names = outputNames or [f'p{p}' for p in percentiles]
+        return Reducer([(name, lambda v, w, p=p: float(np.percentile(v, p)) if v.size else None, True)
+                        for name, p in zip(names, percentiles)])
+
+    @staticmethod
+    def fixedHistogram(min, max, steps):
+        def histogram(v, w):
+            counts, edges = np.histogram(v, bins=steps, range=(min, max), weights=w)
+            return [[float(e), float(c)] for e, c in zip(edges[:-1], counts)]
+        return Reducer([('histogram', histogram, True)])
+
+    def unweighted(self):
+        return Reducer([(name, fn, False) for name, fn, weighted in self.outputs], self.reduceValues)
+
+    def combine(self, reducer2, outputPrefix='', sharedInputs=False):
+        return Reducer(self.outputs + [(outputPrefix + name, fn, weighted) for name, fn, weighted in reducer2.outputs])
+
+
+######
+## Geometries, features and collections
+
+class Geometry:
+    def __init__(self, mask, coverage=None):
+        # mask : pixels dont le centre est dans la géométrie ; coverage : part de chaque pixel dans la géométrie
+        self.mask = np.asarray(mask, dtype=bool)
+        self.coverage = self.mask.astype('float64') if coverage is None else np.asarray(coverage, dtype='float64')
+
+    def perimeter(self, maxError=None, proj=None):
+        # Longueur des contours des pixels, comme celle des polygones de reduceToVectors
+        return Number(exposedEdges(self.mask) * SCALE)
+
+    def area(self, maxError=None, proj=None):
+        return Number(float(self.coverage.sum()) * SCALE**2)
+
+    def intersects(self, other):
+        return bool(np.any(self.mask & regionMask(other)))
+
+
+def regionMask(region):
+    if region is None:
+        return np.ones(SHAPE, dtype=bool)
+    if isinstance(region, Geometry):
+        return region.mask
+    if isinstance(region, (Feature, Image)):
+        return regionMask(region.geometry())
+    if isinstance(region, (FeatureCollection, ImageCollection)):
+        return regionMask(region.geometry())
+    raise TypeError(f'Unsupported region {region!r}')
+
+
+def regionCoverage(region):
+    # Part de chaque pixel dans la région (poids des réducteurs pondérés)
+    if isinstance(region, Geometry):
+        return region.coverage
+    if isinstance(region, (Feature, Image, FeatureCollection, ImageCollection)):
+        return regionCoverage(region.geometry())
+    return regionMask(region).astype('float64')
+
+
+class Element:
+    def get(self, name):
+        return self.properties.get(name)
+
+    def getNumber(self, name):
+        return Number(self.properties.get(name))
+
+    def getString(self, name):
+        return String(self.properties.get(name))
+
+    def propertyNames(self):
+        return List(self.properties)
+
+    def toDictionary(self, properties=None):
+        names = self.properties if properties is None else properties
+        return Dictionary({k: self.properties[k] for k in names if k in self.properties})
+
+    def _copy(self, **properties):
+        output = self.__class__.__new__(self.__class__)
+        output.__dict__.update(self.__dict__)
+        output.properties = dict(self.properties, **properties)
+        return output
+
+    def set(self, *args):
+        # set(dictionnaire) ou set(clé, valeur, ...)
+        if len(args) == 1:
+            return self._copy(**value(dict(args[0])))
+        return self._copy(**{args[i]: value(args[i + 1]) for i in range(0, len(args), 2)})
+
+    def copyProperties(self, source, properties=None, exclude=None):
+        names = source.properties if properties is None else properties
+        return self._copy(**{k: source.properties[k] for k in names
+                             if k in source.properties and k not in (exclude or [])})
+
+
+class Feature(Element):
+    def __init__(self, geometry, properties=None):
+        if isinstance(geometry, Feature):
+            self.geom, self.properties = geometry.geom, dict(geometry.properties)
+            return
+        self.geom = geometry
+        self.properties = value(dict(properties or {}))
+
+    def geometry(self):
+        return self.geom
+
+    def area(self, maxError=None):
+        return self.geom.area()
+
+    def select(self, propertySelectors, newProperties=None, retainGeometry=True):
+        names = value(propertySelectors)
+        return Feature(self.geom if retainGeometry else None, {k: v for k, v in self.properties.items() if k in names})
+
+
+def parseFilter(filter):
+    # Filtres textuels simples ("label == 1")
+    if isinstance(filter, Filter):
+        return filter
+    match = re.fullmatch(r'\s*(\w+)\s*(==|!=)\s*(\S+)\s*', filter)
+    name, op, raw = match.groups()
+    target = float(raw.strip('\'"')) if re.fullmatch(r'-?[\d.]+', raw) else raw.strip('\'"')
+    return Filter(lambda e: (e.get(name) == target) == (op == '=='))
+
+
+class Filter:
+    def __init__(self, test, pair=None):
+        # test(element) pour les filtres simples, pair(gauche, droite) pour les conditions de jointure
+        self.test = test
+        self.pair = pair
+
+    def Not(self):
+        return Filter(lambda e: not self.test(e), lambda a, b: not self.pair(a, b) if self.pair else None)
+
+    @staticmethod
+    def eq(name, v):
+        return Filter(lambda e: e.get(name) == value(v))
+
+    @staticmethod
+    def gte(name, v):
+        return Filter(lambda e: e.get(name) >= value(v))
+
+    @staticmethod
+    def lt(name, v):
+        return Filter(lambda e: e.get(name) < value(v))
+
+    @staticmethod
+    def inList(name, values):
+        values = value(values)
+        return Filter(lambda e: e.get(name) in values)
+
+    @staticmethod
+    def equals(leftField=None, rightValue=None, rightField=None, leftValue=None):
+        return Filter(lambda e: e.get(leftField) == value(rightValue),
+                      lambda a, b: a.get(leftField) == b.get(rightField))
+
+    @staticmethod
+    def intersects(leftField=None, rightValue=None, rightField=None, leftValue=None, maxError=None):
+        return Filter(lambda e: e.geometry().intersects(rightValue),
+                      lambda a, b: a.geometry().intersects(b.geometry()))
+
+    @staticmethod
+    def listContains(leftField=None, rightValue=None, rightField=None, leftValue=None):
+        return Filter(lambda e: value(rightValue) in (e.get(leftField) or []),
+                      lambda a, b: b.get(rightField) in (a.get(leftField) or []))
+
+    @staticmethod
+    def notNull(properties):
+        return Filter(lambda e: all(e.get(name) is not None for name in properties))
+
+    @staticmethod
+    def And(*filters):
+        return Filter(lambda e: all(f.test(e) for f in filters))
+
+
+class Collection:
+    def __init__(self, elements):
+        self.elements = list(elements)
+
+    def _new(self, elements):
+        return self.__class__(list(elements))
+
+    def map(self, fn):
+        return self._new(fn(e) for e in self.elements)
+
+    def iterate(self, algorithm, first=None):
+        accumulated = first
+        for e in self.elements:
+            accumulated = algorithm(e, accumulated)
+        return accumulated
+
+    def filter(self, filter):
+        filter = parseFilter(filter)
+        return self._new(e for e in self.elements if filter.test(e))
+
+    def filterBounds(self, geometry):
+        return self._new(e for e in self.elements if e.geometry().intersects(geometry))
+
+    def size(self):
+        return Number(len(self.elements))
+
+    def first(self):
+        return self.elements[0] if self.elements else None
+
+    def toList(self, count, offset=0):
+        return List(self.elements[int(value(offset)):int(value(offset)) + int(value(count))])
+
+    def aggregate_array(self, name):
+        return List(e.get(name) for e in self.elements if e.get(name) is not None)
+
+    def merge(self, other):
+        return self._new(self.elements + other.elements)
+
+    def distinct(self, properties):
+        names = [properties] if isinstance(properties, str) else properties
+        seen, output = set(), []
+        for e in self.elements:
+            key = tuple(repr(e.get(name)) for name in names)
+            if key not in seen:
+                seen.add(key)
+                output.append(e)
+        return self._new(output)
+
+    def sort(self, name, ascending=True):
+        return self._new(sorted(self.elements, key=lambda e: e.get(name), reverse=not ascending))
+
+    def geometry(self, maxError=None):
+        mask = np.zeros(SHAPE, dtype=bool)
+        coverage = np.zeros(SHAPE)
+        for e in self.elements:
+            if e.geometry() is not None:
+                mask |= regionMask(e.geometry())
+                coverage = np.maximum(coverage, regionCoverage(e.geometry()))
+        return Geometry(mask, coverage)
+
+    def flatten(self):
+        return FeatureCollection([f for c in self.elements for f in c.elements])
+
+    def getInfo(self):
+        return {'features': [{'properties': value(e.properties)} for e in self.elements]}
+
+
+class FeatureCollection(Collection):
+    def __init__(self, elements):
+        # Une FeatureCollection peut aussi être construite depuis une List de Features ou un asset (data.assets)
+        if isinstance(elements, str):
+            elements = data.assets[elements]
+        super().__init__(elements.elements if isinstance(elements, Collection) else elements)
+
+    def reduceColumns(self, reducer, selectors, weightSelectors=None):
+        values = np.array([e.get(selectors[0]) for e in self.elements], dtype='float64')
+        return Dictionary({name: fn(values, np.ones_like(values)) for name, fn, weighted in reducer.outputs})
+
+
+class ImageCollection(Collection):
+    def __init__(self, elements):
+        super().__init__(elements.elements if isinstance(elements, Collection) else elements)
+
+    def qualityMosaic(self, qualityBand):
+        # Pixel de l'image à la plus forte valeur de qualityBand ; mosaïque non bornée comme sur Earth Engine
+        quality = np.stack([np.ma.filled(image.bands[qualityBand], -np.inf) for image in self.elements])
+        best = np.argmax(quality, axis=0)
+        bands = {}
+        for name in self.elements[0].bands:
+            stack = np.ma.stack([image.bands[name] for image in self.elements])
+            bands[name] = np.take_along_axis(stack, best[None], axis=0)[0]
+        return Image(bands)
+
+
+class Join:
+    def __init__(self, apply):
+        self._apply = apply
+
+    def apply(self, primary, secondary, condition):
+        return self._apply(primary, secondary, condition)
+
+    @staticmethod
+    def inner(primaryKey='primary', secondaryKey='secondary'):
+        return Join(lambda primary, secondary, condition: FeatureCollection([
+            Feature(None, {primaryKey: p, secondaryKey: s})
+            for p in primary.elements for s in secondary.elements if condition.pair(p, s)]))
+
+    @staticmethod
+    def saveAll(matchesKey):
+        return Join(lambda primary, secondary, condition: primary._new(
+            p.set(matchesKey, List(s for s in secondary.elements if condition.pair(p, s))) for p in primary.elements))
+
+    @staticmethod
+    def saveFirst(matchKey):
+        def apply(primary, secondary, condition):
+            output = []
+            for p in primary.elements:
+                matches = [s for s in secondary.elements if condition.pair(p, s)]
+                if matches:
+                    output.append(p.set(matchKey, matches[0]))
+            return primary._new(output)
+        return Join(apply)
+
+
+######
+## Images
+
+class Kernel:
+    def __init__(self, weights):
+        self.weights = np.array(weights, dtype='float64')
+
+    @staticmethod
+    def fixed(width, height, weights, x=-1, y=-1, normalize=False):
+        return Kernel(weights)
+
+
+class Image(Element):
+    '''
+    Image made of masked bands on the grid. footprint is the mask of the pixels
+    that exist (None: unbounded image, e.g. a constant).
+    '''
+
+    def __init__(self, bands=None, properties=None, footprint=None):
+        if isinstance(bands, Image):
+            self.__dict__.update(bands.__dict__)
+            return
+        if isinstance(bands, (int, float)):
+            bands = {'constant': np.ma.MaskedArray(np.full(SHAPE, float(bands)))}
+            footprint = None
+        self.bands = {name: np.ma.MaskedArray(band, dtype='float64') for name, band in (bands or {}).items()}
+        self.properties = dict(properties or {})
+        self.footprint = footprint
+
+    @staticmethod
+    def constant(v):
+        return Image(float(v))
+
+    @staticmethod
+    def cat(images):
+        return Image({name: band for image in images for name, band in image.bands.items()})
+
+    def _bands(self, bands):
+        output = self._copy()
+        output.bands = bands
+        return output
+
+    def select(self, *selectors):
+        names = selectors[0] if len(selectors) == 1 and isinstance(selectors[0], (list, tuple)) else selectors
+        return self._bands({name: self.bands[name] for name in names})
+
+    def rename(self, *names):
+        names = names[0] if len(names) == 1 and isinstance(names[0], (list, tuple)) else names
+        return self._bands(dict(zip(names, self.bands.values())))
+
+    def bandNames(self):
+        return List(self.bands)
+
+    def addBands(self, srcImg, names=None, overwrite=False):
+        bands = dict(self.bands)
+        for name, band in srcImg.bands.items():
+            if name in bands and not overwrite:
+                raise ValueError(f'Duplicate band {name}')
+            bands[name] = band
+        return self._bands(bands)
+
+    def geometry(self):
+        return Geometry(np.ones(SHAPE, dtype=bool) if self.footprint is None else self.footprint)
+
+    def projection(self):
+        return 'EPSG:32631'
+
+    def setDefaultProjection(self, crs):
+        return self
+
+    def _map(self, fn):
+        return self._bands({name: fn(band) for name, band in self.bands.items()})
+
+    def _binary(self, other, fn):
+        if isinstance(other, Image):
+            other_band = next(iter(other.bands.values()))
+            return self._map(lambda band: fn(band, other_band))
+        return self._map(lambda band: fn(band, float(value(other))))
+
+    def add(self, other): return self._binary(other, lambda a, b: a + b)
+    def subtract(self, other): return self._binary(other, lambda a, b: a - b)
+    def multiply(self, other): return self._binary(other, lambda a, b: a * b)
+    def eq(self, other): return self._binary(other, lambda a, b: (a == b).astype('float64'))
+    def gte(self, other): return self._binary(other, lambda a, b: (a >= b).astype('float64'))
+
+    def updateMask(self, mask):
+        mask_band = next(iter(mask.bands.values()))
+        hidden = np.ma.getmaskarray(mask_band) | (np.ma.filled(mask_band, 0) == 0)
+        return self._map(lambda band: np.ma.MaskedArray(np.ma.getdata(band), mask=np.ma.getmaskarray(band) | hidden))
+
+    def unmask(self, value=0, sameFootprint=True):
+        # Les pixels masqués prennent `value` ; hors de l'emprise ils restent masqués sauf avec sameFootprint=False
+        outside = np.zeros(SHAPE, dtype=bool) if (self.footprint is None or not sameFootprint) else ~self.footprint
+        output = self._map(lambda band: np.ma.MaskedArray(np.ma.filled(band, value), mask=outside))
+        if not sameFootprint:
+            output.footprint = None
+        return output
+
+    def clip(self, geometry):
+        # Le masque fractionnaire de clip garde tous les pixels recouverts en partie par la géométrie
+        inside = regionCoverage(geometry) > 0
+        output = self._map(lambda band: np.ma.MaskedArray(np.ma.getdata(band), mask=np.ma.getmaskarray(band) | ~inside))
+        output.footprint = inside if self.footprint is None else inside & self.footprint
+        return output
+
+    def paint(self, featureCollection, color):
+        # Rasterisation des géométries : pixels dont le centre est dans une géométrie
+        inside = regionMask(featureCollection)
+        return self._map(lambda band: np.ma.MaskedArray(np.where(inside, float(value(color)), np.ma.getdata(band)),
+                                                        mask=np.ma.getmaskarray(band) & ~inside))
+
+    def convolve(self, kernel):
+        # Les pixels masqués ne contribuent pas au voisinage
+        return self._map(lambda band: np.ma.MaskedArray(
+            ndimage.correlate(np.ma.filled(band, 0), kernel.weights, mode='constant', cval=0),
+            mask=np.ma.getmaskarray(band)))
+
+    def reduceRegion(self, reducer, geometry=None, scale=None, maxPixels=None, bestEffort=None, tileScale=None, crs=None):
+        region = regionMask(geometry)
+        coverage = regionCoverage(geometry)
+        single = len(reducer.outputs) == 1
+        output = Dictionary()
+        for name, band in self.bands.items():
+            valid = ~np.ma.getmaskarray(band)
+            for output_name, fn, weighted in reducer.outputs:
+                if weighted:
+                    selected = valid & (coverage > 0)
+                    weights = coverage[selected]
+                else:
+                    selected = valid & region
+                    weights = np.ones(np.count_nonzero(selected))
+                output[name if single else f'{name}_{output_name}'] = fn(np.ma.getdata(band)[selected], weights)
+        return output
+
+    def reduceToVectors(self, reducer=None, geometry=None, scale=None, geometryType='polygon', eightConnected=True,
+                        labelProperty='label', maxPixels=None, **kwargs):
+        # Un polygone par groupe connexe de pixels de même valeur, avec le nombre de pixels (count)
+        band = next(iter(self.bands.values()))
+        valid = regionMask(geometry) & ~np.ma.getmaskarray(band)
+        data = np.ma.getdata(band)
+        structure = EIGHT_CONNECTED if eightConnected else None
+        features = []
+        for label in np.unique(data[valid]):
+            components, n = ndimage.label(valid & (data == label), structure=structure)
+            for i in range(1, n + 1):
+                component = components == i
+                features.append(Feature(Geometry(component), {labelProperty: float(label), 'count': int(component.sum())}))
+        return FeatureCollection(features)
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, trueCase, falseCase):
+        return trueCase if value(condition) else falseCase
+
+
+class data:
+    # Opérations Earth Engine (ee.data.listOperations) et assets tables, à renseigner par les tests
+    operations = []
+    calls = []
+    assets = {}
+    project = 'earthengine-legacy'
+
+    @staticmethod
+    def listAssets(params):
+        return {'assets': [{'name': name} for name in data.assets if name.rsplit('/', 1)[0] == params['parent']]}
+
+    @staticmethod
+    def listOperations(project=None):
+        data.calls.append(('listOperations', project))
+        return list(data.operations)
+
+    @staticmethod
+    def getOperation(operation_name):
+        data.calls.append(('getOperation', operation_name))
+        return next(o for o in data.operations if o['name'] == operation_name)
+
+    @staticmethod
+    def cancelOperation(operation_name):
+        data.calls.append(('cancelOperation', operation_name))
+        for operation in data.operations:
+            if operation['name'] == operation_name:
+                operation['metadata']['state'] = 'CANCELLING'
+
+
+class Task:
+    def __init__(self, collection, description, assetId):
+        self.collection, self.description, self.assetId = collection, description, assetId
+        self.id = f'TASK{len(data.assets)}'
+
+    def start(self):
+        # L'opération est créée dans le projet d'ee.Initialize (data.project), qui peut différer de celui des assets
+        self.operation_name = f'projects/{data.project}/operations/{self.id}'
+        # L'export est immédiat : l'asset est lisible dès le démarrage de la tâche
+        data.assets[self.assetId] = [Feature(None, e.properties) for e in self.collection.elements]
+
+
+class batch:
+    class Export:
+        class table:
+            @staticmethod
+            def toAsset(collection, description='myExportTableTask', assetId=None, **kwargs):
+                return Task(collection, description, assetId)
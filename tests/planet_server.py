@@ -0,0 +1,71 @@
+'''
+Local stand-in of the Planet APIs (Data and Orders) served by http.server in a thread.
+
+The behaviour of each request is given by handle(method, path, query, body),
+returning (status, payload, headers). The server records the requests and the
+number of requests in flight.
+'''
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class PlanetServer:
+    def __init__(self, handle, delay=0.0):
+        self.handle = handle
+        self.delay = delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def reply(self, method):
+                url = urlparse(self.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                with server.lock:
+                    server.requests.append((method, url.path))
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                threading.Event().wait(server.delay)
+                try:
+                    status, payload, headers = server.handle(method, url.path, parse_qs(url.query), body)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self.reply('GET')
+
+            def do_POST(self):
+                self.reply('POST')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def count(self, method, path):
+        return sum(1 for request in self.requests if request == (method, path))
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from functions import classification_planet
+
+
+def scene(ee, footprint, acquired, clear=1.0):
+    # Scène couvrant footprint, masquée ailleurs
+    bands = {name: np.ma.masked_array(np.full(ee.SHAPE, v), mask=~footprint)
+             for name, v in [('blue', 500.0), ('CLEAR', clear)]}
+    return ee.Image(bands, {'acquired': acquired, 'system:time_start': 0}, footprint=footprint)
+
+
+def test_same_day_mosaics_are_bounded(ee):
+    ee.setGrid((10, 10))
+    rows, cols = np.indices(ee.SHAPE)
+    left, right, top = cols < 5, (cols >= 5) & (rows >= 3), rows < 3
+    images = ee.ImageCollection([scene(ee, left, '2020-01-01T10:00:00'), scene(ee, right, '2020-01-01T10:00:05'),
+                                 scene(ee, top, '2020-01-02T10:00:00')])
+
+    mosaics = classification_planet.mosaicSameDay(images)
+
+    assert mosaics.aggregate_array('system:index') == ['2020-01-01_2', '2020-01-02_1']
+    first, second = mosaics.elements
+    assert (first.geometry().mask == (left | right)).all()
+    assert (second.geometry().mask == top).all()
+
+    # Un DGO hors de l'emprise du second jour n'est associé qu'à la première mosaïque
+    dgo = ee.Geometry((rows >= 6) & (cols >= 6))
+    assert mosaics.filterBounds(dgo).aggregate_array('DAY') == ['2020-01-01']
+
+
+def test_classify_objects_uses_vegetation_threshold(ee, monkeypatch):
+    # Seuils transmis aux extractions (les extractions elles-mêmes ne sont pas évaluées ici)
+    calls = []
+    monkeypatch.setattr(classification_planet, 'extractWater', lambda image, threshold: calls.append(('water', threshold)) or image)
+    monkeypatch.setattr(classification_planet, 'extractVegetation', lambda image, threshold: calls.append(('vegetation', threshold)) or image)
+    monkeypatch.setattr(classification_planet, 'extractActiveChannel', lambda image: image)
+    ee.setGrid((2, 2))
+
+    collection = classification_planet.classifyObjects(ee.ImageCollection([ee.Image({'NDWI': np.zeros((2, 2))})]), -0.1, 0.45)
+
+    assert calls == [('water', -0.1), ('vegetation', 0.45)]
+    assert collection.first().get('THRESHOLD_NDWI') == -0.1
+
+
+def bimodal(rng, size):
+    # NDWI bimodal : sol sec autour de -0.4, eau autour de 0.3
+    return np.concatenate([rng.normal(-0.4, 0.1, size * 3 // 4), rng.normal(0.3, 0.08, size // 4)]).clip(-1, 0.999)
+
+
+def test_adaptive_threshold_matches_local_otsu(ee):
+    local_planet = pytest.importorskip('functions.local_planet')
+    ee.setGrid((60, 60), scale=30)
+    values = bimodal(np.random.default_rng(0), 3600)
+    image = ee.Image({'NDWI': values.reshape(ee.SHAPE)}, footprint=np.ones(ee.SHAPE, bool))
+
+    threshold = classification_planet.adaptiveWaterThreshold(image).getInfo()
+
+    assert -0.2 < threshold < 0.1
+    assert threshold == local_planet.otsuThreshold(values)
+
+
+def test_otsu_takes_the_first_maximum(ee):
+    local_planet = pytest.importorskip('functions.local_planet')
+    # Deux classes égales : toutes les coupures entre elles ont la même variance inter-classes
+    values = np.repeat([-0.495, 0.505], 10)
+    histogram = ee.Reducer.fixedHistogram(classification_planet.HISTOGRAM_MIN, classification_planet.HISTOGRAM_MAX, classification_planet.HISTOGRAM_BINS).outputs[0][1](values, np.ones_like(values))
+
+    threshold = classification_planet.otsuThreshold(histogram).getInfo()
+
+    assert abs(threshold - (-0.49)) < 1e-9
+    assert threshold == local_planet.otsuThreshold(values)
+
+
+def test_adaptive_threshold_falls_back_on_empty_scenes(ee):
+    ee.setGrid((4, 4), scale=30)
+    image = ee.Image({'NDWI': np.ma.masked_all(ee.SHAPE)}, footprint=np.zeros(ee.SHAPE, bool))
+
+    assert classification_planet.adaptiveWaterThreshold(image).getInfo() == classification_planet.ADAPTIVE_FALLBACK_NDWI
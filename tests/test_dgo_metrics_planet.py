@@ -0,0 +1,182 @@
+import json
+
+import numpy as np
+import pytest
+
+from functions import dgo_metrics_planet
+
+
+def syntheticScene(ee, seed=0, shape=(40, 48)):
+    # Scène synthétique : indices lissés, classes auto-masquées comme dans classification_planet
+    ee.setGrid(shape, scale=3)
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(size=(2,) + shape)
+    kernel = np.ones(5) / 5
+    smooth = np.apply_along_axis(np.convolve, 1, np.apply_along_axis(np.convolve, 2, noise, kernel, 'same'), kernel, 'same')
+    ndwi, ndvi = smooth[0], smooth[1]
+
+    water = np.ma.masked_array(np.ones(shape), mask=ndwi < 0.1)
+    vegetation = np.ma.masked_array(np.ones(shape), mask=(ndvi <= 0.1) | ~water.mask)
+    ac = np.ma.masked_array(np.ones(shape), mask=water.mask & vegetation.mask)
+    image = ee.Image({'NDWI': ndwi, 'NDVI': ndvi, 'WATER': water, 'VEGETATION': vegetation, 'AC': ac},
+                     {'THRESHOLD_NDWI': 0.1})
+
+    # DGO irrégulier (disque décalé) qui coupe des objets de toutes les classes
+    dgo = ee.Feature(disk(ee, shape, (18, 26), 15), {'DGO_FID': 1})
+    return image, dgo
+
+
+def disk(ee, shape, center, radius, oversampling=8):
+    # Disque avec la part de chaque pixel qu'il recouvre : les pixels de bordure ont un poids fractionnaire
+    # dans les réducteurs pondérés, et ceux dont le centre est hors du disque un poids non nul
+    rows, cols = np.indices(shape)
+    inside = lambda dr, dc: (rows + dr - center[0]) ** 2 + (cols + dc - center[1]) ** 2 < radius ** 2
+    offsets = (np.arange(oversampling) + 0.5) / oversampling - 0.5
+    coverage = np.mean([inside(dr, dc) for dr in offsets for dc in offsets], axis=0)
+    return ee.Geometry(inside(0, 0), coverage)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_fused_metrics_match_per_class_metrics(ee, seed):
+    image, dgo = syntheticScene(ee, seed)
+
+    per_class = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, fused=False))
+    fused = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, fused=True))
+
+    assert per_class['WATER_POLYGONS'] > 1 and per_class['VEGETATION_POLYGONS'] > 1
+    assert set(per_class) <= set(fused)
+    for name, expected in per_class.items():
+        assert fused[name] == pytest.approx(expected), name
+
+
+def test_raster_perimeter_matches_vector_perimeter(ee):
+    image, dgo = syntheticScene(ee)
+
+    vector = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, perimeter='vector', metrics=['WATER_PERIMETER', 'VEGETATION_PERIMETER']))
+    raster = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, perimeter='raster', metrics=['WATER_PERIMETER', 'VEGETATION_PERIMETER']))
+
+    assert raster == pytest.approx(vector)
+
+
+def test_metric_selection(ee):
+    image, dgo = syntheticScene(ee)
+
+    selected = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, metrics=['WATER_AREA', 'MEAN_NDVI']))
+    assert list(selected) == ['WATER_AREA', 'MEAN_NDVI']
+
+    with pytest.raises(ValueError):
+        dgo_metrics_planet.selectMetrics(['WATER_VOLUME'])
+
+
+def sweepScene(ee, ndwi_thresholds, seed=0, properties=None):
+    # Scène classée comme par classifyObjectsSweep : une bande WATER{i} par seuil NDWI, VEGETATION0 pour le seuil NDVI
+    image, dgo = syntheticScene(ee, seed)
+    ndwi = image.bands['NDWI']
+    bands = dict(image.bands, blue=np.full(ee.SHAPE, 500.0), CLEAR=np.ones(ee.SHAPE), VEGETATION0=image.bands['VEGETATION'])
+    for i, threshold in enumerate(ndwi_thresholds):
+        bands[f'WATER{i}'] = np.ma.masked_array(np.ones(ee.SHAPE), mask=ndwi < threshold)
+    return ee.Image(bands, dict({'acquired': '2020-01-01T10:00:00'}, **(properties or {}))), dgo
+
+
+def test_sweep_rows_are_flattened(ee):
+    thresholds = [0.0, 0.1, 0.2]
+    images = [sweepScene(ee, thresholds, properties={'system:index': name})[0] for name in 'ab']
+    rows, cols = np.indices(ee.SHAPE)
+    dgos = [ee.Feature(ee.Geometry((cols < 24) & (rows < 30)), {'DGO_FID': 1}),
+            ee.Feature(ee.Geometry(cols >= 24), {'DGO_FID': 2})]
+
+    result = dgo_metrics_planet.calculateDGOsSweepMetrics(ee.ImageCollection(images), ee.FeatureCollection(dgos), 3, thresholds, [0.1])
+
+    # Une Feature par image, DGO et couple de seuils, directement dans la collection
+    assert isinstance(result, ee.FeatureCollection)
+    assert result.size().getInfo() == 2 * 2 * 3
+    assert all(isinstance(f, ee.Feature) and f.get('DGO_FID') in (1, 2) for f in result.elements)
+    assert sorted({f.get('THRESHOLD_NDWI') for f in result.elements}) == thresholds
+
+    # Aire en eau décroissante avec le seuil, pour chaque paire
+    for fid in (1, 2):
+        areas = [f.get('WATER_AREA') for f in result.elements if f.get('DGO_FID') == fid][:3]
+        assert areas == sorted(areas, reverse=True) and areas[0] > areas[-1]
+
+
+def test_sweep_row_matches_single_threshold_metrics(ee):
+    image, dgo = sweepScene(ee, [0.1])
+    row = ee.value(dgo_metrics_planet.calculateSweepMetrics(image, dgo, 3, [0.1], [0.1])[0])
+    single = ee.value(dgo_metrics_planet.classMetrics(image, dgo, 3, perimeter='raster', polygon_stats=False,
+                                                      metrics=[m for m in dgo_metrics_planet.SWEEP_METRICS if m in dgo_metrics_planet.METRICS]))
+
+    for name, expected in single.items():
+        if name != 'THRESHOLD_NDWI':
+            assert row[name] == pytest.approx(expected), name
+
+
+@pytest.mark.parametrize('method', ['iterate', 'join'])
+def test_gates_reject_pairs_before_metrics(ee, method):
+    clear, _ = sweepScene(ee, [0.1], properties={'system:index': 'clear'})
+    cloudy, dgo = sweepScene(ee, [0.1], properties={'system:index': 'cloudy'})
+    cloudy = ee.Image(dict(cloudy.bands, CLEAR=np.zeros(ee.SHAPE)), cloudy.properties)
+
+    result = dgo_metrics_planet.calculateDGOsMetrics(ee.ImageCollection([clear, cloudy]), ee.FeatureCollection([dgo]), 3,
+                                                     method=method, min_clear_score=50, metrics=['WATER_AREA'])
+    rows = {row.get('REJECTED'): row.properties for row in result.elements}
+
+    # La paire claire est calculée, la paire nuageuse ne reçoit qu'une ligne minimale
+    assert sorted(rows) == [0, 1]
+    assert rows[0]['CLEAR_SCORE'] >= 50 and rows[0]['WATER_AREA'] > 0
+    assert rows[1]['CLEAR_SCORE'] == 0 and 'WATER_AREA' not in rows[1]
+    assert rows[1]['DGO_FID'] == 1 and rows[1]['DATE'] == '2020-01-01'
+
+
+@pytest.mark.parametrize('options', [{}, {'min_clear_score': 50}])
+def test_join_matches_iterate(ee, options):
+    rows, cols = np.indices((40, 48))
+    # Trois images d'emprises différentes (dont une nuageuse) et trois DGOs, le troisième hors de toutes les emprises
+    footprints = [cols < 30, rows < 25, (cols < 20) & (rows >= 10)]
+    images = []
+    for i, footprint in enumerate(footprints):
+        image, _ = sweepScene(ee, [0.1], seed=i, properties={'system:index': f'img{i}', 'acquired': f'2020-01-0{i + 1}T10:00:00'})
+        clear = np.full(ee.SHAPE, 0.0 if i == 2 else 1.0)
+        images.append(ee.Image(dict(image.bands, CLEAR=clear), image.properties, footprint=footprint))
+    dgos = [ee.Feature(ee.Geometry((cols < 24) & (rows < 30)), {'DGO_FID': 1}),
+            ee.Feature(ee.Geometry((cols >= 24) & (rows < 20)), {'DGO_FID': 2}),
+            ee.Feature(ee.Geometry((cols >= 40) & (rows >= 30)), {'DGO_FID': 3})]
+
+    def pairs(method):
+        result = dgo_metrics_planet.calculateDGOsMetrics(ee.ImageCollection(images), ee.FeatureCollection(dgos), 3,
+                                                         method=method, **options)
+        # repr : les moyennes d'une classe absente (NaN) se comparent aussi
+        return {(f.get('DGO_FID'), f.get('DATE'), tuple(sorted((k, repr(v)) for k, v in ee.value(f.properties).items())))
+                for f in result.elements}
+
+    iterated, joined = pairs('iterate'), pairs('join')
+
+    assert joined == iterated
+    assert sorted((fid, date) for fid, date, _ in joined) == [
+        (1, '2020-01-01'), (1, '2020-01-02'), (1, '2020-01-03'), (2, '2020-01-01'), (2, '2020-01-02')]
+
+
+class SerializedGraph:
+    # Graphe au format de ee.ComputedObject.serialize() (API cloud) : expressions partagées stockées une fois dans values
+    def __init__(self, graph):
+        self.graph = graph
+
+    def serialize(self):
+        return json.dumps(self.graph)
+
+
+def test_count_operations_on_serialized_graph():
+    invocation = lambda name, **arguments: {'functionInvocationValue': {'functionName': name, 'arguments': arguments}}
+    reference = lambda key: {'valueReference': key}
+    graph = {'result': '0', 'values': {
+        '0': invocation('Dictionary.combine',
+                        first=invocation('Image.reduceRegion', image=reference('1'), reducer=invocation('Reducer.sum')),
+                        second=invocation('Image.reduceRegion', image=reference('1'), reducer=invocation('Reducer.mean'))),
+        # Image partagée par les deux réductions : comptée une fois
+        '1': invocation('Image.select', input=invocation('Image.load', id={'constantValue': 'scene'}),
+                        bandSelectors={'arrayValue': {'values': [{'constantValue': 'WATER'}]}}),
+    }}
+
+    counts = dgo_metrics_planet.countOperations(SerializedGraph(graph))
+
+    assert counts == {'Dictionary.combine': 1, 'Image.reduceRegion': 2, 'Reducer.sum': 1, 'Reducer.mean': 1,
+                      'Image.select': 1, 'Image.load': 1}
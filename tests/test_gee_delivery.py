@@ -0,0 +1,267 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from shapely.geometry import box, mapping
+
+pytest.importorskip('planet')
+requests = pytest.importorskip('requests')
+
+from functions import gee_delivery
+from planet_server import PlanetServer
+
+
+def item(day, n=0):
+    acquired = datetime(2020, 1, 1) + timedelta(days=day)
+    return {'id': f'{acquired:%Y%m%d}_101010_{n:02d}_1234', 'properties': {'acquired': acquired.isoformat()}}
+
+
+def searchHandler(items_by_aoi, throttled=0, max_page_size=250):
+    '''
+    Quick search: the filter names the AOI ({"aoi": name}), optionally in an
+    AndFilter with a DateRangeFilter on acquired (gte); pages of _page_size
+    items (at most max_page_size, as Planet) linked by _links._next. The first
+    `throttled` requests get a 429. The filters received are recorded.
+    '''
+    state = {'throttled': throttled, 'filters': [], 'searches': []}
+
+    def matches(img_filter):
+        if img_filter.get('type') == 'AndFilter':
+            aoi_filter, date_filter = img_filter['config']
+            return [f for f in matches(aoi_filter) if f['properties']['acquired'] >= date_filter['config']['gte']]
+        return list(items_by_aoi[img_filter['aoi']])
+
+    def handle(method, path, query, body):
+        if state['throttled'] > 0:
+            state['throttled'] -= 1
+            return 429, {'message': 'Too Many Requests'}, {'Retry-After': '0.5'}
+
+        if method == 'POST' and path == '/quick-search':
+            state['filters'].append(body['filter'])
+            state['searches'].append(matches(body['filter']))
+            search, page_size, start = len(state['searches']) - 1, int(query['_page_size'][0]), 0
+        elif method == 'GET' and path.startswith('/searches/'):
+            _, _, search, page_size, start = path.split('/')
+            search, page_size, start = int(search), int(page_size), int(start)
+        else:
+            return 404, {}, None
+
+        page_size = min(page_size, max_page_size)
+        features = state['searches'][search][start:start + page_size]
+        return 200, {'features': features, '_links': {'_next': f'{state["url"]}/searches/{search}/{page_size}/{start + page_size}'}}, None
+
+    return handle, state
+
+
+@pytest.fixture
+def planet(monkeypatch):
+    # Serveur Planet local ; les attentes de reprise sont enregistrées au lieu d'être effectuées
+    delays = []
+    monkeypatch.setattr(gee_delivery, 'time', SimpleNamespace(sleep=delays.append, time=time.time))
+
+    servers = []
+    def start(items_by_aoi, throttled=0, delay=0.0):
+        handle, state = searchHandler(items_by_aoi, throttled)
+        server = PlanetServer(handle, delay).__enter__()
+        state['url'] = server.url
+        server.filters = state['filters']
+        servers.append(server)
+        return server, gee_delivery.pooled_session('key'), delays
+
+    yield start
+    for server in servers:
+        server.__exit__()
+
+
+@pytest.mark.parametrize('n_items, pages, n_requests', [(7, [3, 3, 1], 3), (6, [3, 3], 3), (0, [], 1)])
+def test_search_pagination(planet, n_items, pages, n_requests):
+    items = [item(i) for i in range(n_items)]
+    server, session, _ = planet({'a': items})
+
+    result = list(gee_delivery.iter_search_pages('PSScene', {'aoi': 'a'}, session, server.url, page_size=3))
+
+    assert [len(page) for page in result] == pages
+    assert [f for page in result for f in page] == items
+    # Une page courte termine la recherche sans requête supplémentaire
+    assert len(server.requests) == n_requests
+
+
+def test_search_page_size_is_capped(planet):
+    # Une page de 250 résultats (maximum de Planet) ne doit pas passer pour une dernière page courte
+    items = [item(i // 3, i % 3) for i in range(600)]
+    server, session, _ = planet({'a': items})
+
+    result = list(gee_delivery.iter_search_pages('PSScene', {'aoi': 'a'}, session, server.url, page_size=500))
+
+    assert [len(page) for page in result] == [250, 250, 100]
+    assert [f for page in result for f in page] == items
+
+
+def test_search_retries_rate_limits(planet):
+    items = [item(i) for i in range(5)]
+    server, session, delays = planet({'a': items}, throttled=2)
+
+    assert gee_delivery.request_itemids('PSScene', {'aoi': 'a'}, session, server.url) == [f['id'] for f in items]
+    assert delays == [0.5, 0.5]
+    assert server.count('POST', '/quick-search') == 3
+
+
+def test_search_gives_up_after_max_retries(planet):
+    server, session, delays = planet({'a': []}, throttled=10)
+
+    with pytest.raises(requests.HTTPError):
+        gee_delivery.planet_request(session, 'POST', f'{server.url}/quick-search', max_retries=3,
+                                    json={'filter': {'aoi': 'a'}}, params={'_page_size': 3})
+    assert len(delays) == 3
+    assert len(server.requests) == 4
+
+
+def test_concurrent_searches(planet):
+    items_by_aoi = {f'aoi{i}': [item(d, i) for d in range(i + 1)] for i in range(6)}
+    server, session, _ = planet(items_by_aoi, delay=0.1)
+
+    filters = {name: {'aoi': name} for name in items_by_aoi}
+    result = gee_delivery.request_itemids_concurrently('PSScene', filters, session, server.url, max_workers=3)
+
+    assert result == {name: [f['id'] for f in items] for name, items in items_by_aoi.items()}
+    assert 1 < server.max_active <= 3
+
+
+def filter_images_by_interval_reference(image_ids, interval_days):
+    # Implémentation historique (une recherche des images de la date par date retenue), référence du test
+    dates_images = sorted([(datetime.strptime(image_id.split('_')[0], '%Y%m%d'), image_id) for image_id in image_ids], key=lambda x: x[0])
+    filtered_image_ids = []
+    last_selected_date = None
+    for date, image_id in dates_images:
+        if last_selected_date is None or date >= last_selected_date + timedelta(days=interval_days):
+            last_selected_date = date
+            filtered_image_ids.extend([img_id for img_date, img_id in dates_images if img_date == date])
+    return filtered_image_ids
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('interval_days', [1, 3, 10])
+def test_interval_selection_matches_reference(seed, interval_days):
+    import random
+    rng = random.Random(seed)
+    # Plusieurs scènes par date, dans le désordre
+    image_ids = [item(rng.randrange(120), n)['id'] for n in range(300)]
+    rng.shuffle(image_ids)
+
+    assert gee_delivery.filter_images_by_interval(image_ids, interval_days) == filter_images_by_interval_reference(image_ids, interval_days)
+
+
+def record(day, n=0, clear=100, footprint=None):
+    # Item record (feature de recherche) avec pourcentage clair et emprise
+    f = item(day, n)
+    f['properties']['clear_percent'] = clear
+    f['geometry'] = mapping(footprint if footprint is not None else box(0, 0, 10, 10))
+    return f
+
+
+def test_best_selection_over_aoi():
+    aoi = mapping(box(0, 0, 10, 10))
+    # Jour 0 : deux strips qui se chevauchent sur la moitié ouest (la zone commune n'est comptée qu'une fois)
+    overlapping = [record(0, 0, footprint=box(0, 0, 5, 10)), record(0, 1, footprint=box(-2, 0, 5, 10))]
+    # Jour 1 : deux strips adjacents couvrant tout l'AOI, à 80 % clairs
+    adjacent = [record(1, 0, 80, box(0, 0, 5, 10)), record(1, 1, 80, box(5, 0, 10, 10))]
+    # Jour 2 : une scène entièrement claire sur 60 % de l'AOI
+    partial = [record(2, 0, 100, box(0, 0, 6, 10))]
+
+    items = partial + overlapping + adjacent
+    assert gee_delivery.clear_coverage(overlapping, aoi) == pytest.approx(50)
+    assert gee_delivery.filter_images_by_interval(items, 3, mode='best', aoi=aoi) == [f['id'] for f in adjacent]
+
+
+def test_best_selection_without_aoi():
+    # Sans AOI, seul le pourcentage clair moyen des scènes de la date compte ; fenêtres de 2 jours
+    items = [record(0, 0, 40), record(0, 1, 60), record(1, 0, 70), record(2, 0, 10), record(3, 0, 20), record(3, 1, 30)]
+
+    assert gee_delivery.filter_images_by_interval(items, 2, mode='best') == [items[2]['id'], items[4]['id'], items[5]['id']]
+
+
+def test_best_selection_ties_keep_earliest_date():
+    items = [record(2, 0, 90), record(1, 0, 50), record(1, 1, 50), record(0, 0, 90)]
+
+    assert gee_delivery.filter_images_by_interval(items, 3, mode='best') == [items[3]['id']]
+
+
+def test_best_selection_needs_item_records():
+    with pytest.raises(ValueError):
+        gee_delivery.filter_images_by_interval([item(0)['id'], item(1)['id']], 3, mode='best')
+    with pytest.raises(ValueError):
+        gee_delivery.filter_images_by_interval([item(0)], 3, mode='best', aoi=mapping(box(0, 0, 1, 1)))
+
+
+@pytest.mark.parametrize('as_record', [False, True])
+def test_remove_delivered_keeps_missing_items_in_order(as_record):
+    items = [record(3, 0), record(0, 0), record(2, 1), record(1, 0), record(2, 0)]
+    image_ids = items if as_record else [f['id'] for f in items]
+    listed = []
+
+    def list_ids(collection_assetID):
+        listed.append(collection_assetID)
+        return {items[1]['id'], items[4]['id'], 'other'}
+
+    missing = gee_delivery.remove_delivered(image_ids, 'projects/p/assets/collection', list_ids=list_ids)
+
+    # Une seule liste de la collection ; les éléments manquants gardent leur ordre et leur forme
+    assert listed == ['projects/p/assets/collection']
+    assert missing == [image_ids[0], image_ids[2], image_ids[3]]
+
+
+@pytest.fixture
+def clock(planet, monkeypatch):
+    # Horloge du cache de recherche, avancée par les tests
+    now = [1e9]
+    monkeypatch.setattr(gee_delivery.time, 'time', lambda: now[0])
+    return now
+
+
+def test_search_cache_is_fresh_within_ttl(planet, clock, tmp_path):
+    items = [item(i) for i in range(5)]
+    server, session, _ = planet({'a': items})
+    cache = str(tmp_path / 'cache.sqlite')
+
+    first = gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+    clock[0] += 23 * 3600
+    second = gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+
+    assert first == second == items
+    assert server.count('POST', '/quick-search') == 1
+
+
+def test_search_cache_refreshes_incrementally(planet, clock, tmp_path):
+    items = [item(i) for i in range(5)]
+    server, session, _ = planet({'a': items})
+    cache = str(tmp_path / 'cache.sqlite')
+    gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+
+    # Nouvelles acquisitions après expiration : seules celles à partir du dernier acquired en cache sont demandées,
+    # y compris une scène publiée plus tard à la même heure d'acquisition
+    items += [item(4, 1), item(5), item(6)]
+    clock[0] += 25 * 3600
+    result = gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+
+    assert result == items
+    assert server.filters[-1] == {'type': 'AndFilter', 'config': [
+        {'aoi': 'a'}, {'type': 'DateRangeFilter', 'field_name': 'acquired', 'config': {'gte': items[4]['properties']['acquired']}}]}
+
+
+def test_search_cache_full_refresh(planet, clock, tmp_path):
+    items = [item(i) for i in range(5)]
+    server, session, _ = planet({'a': items})
+    cache = str(tmp_path / 'cache.sqlite')
+    gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+
+    # Une scène retirée du catalogue ne disparaît du cache qu'avec une relecture complète
+    del items[2]
+    clock[0] += 25 * 3600
+    incremental = gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache)
+    clock[0] += 25 * 3600
+    full = gee_delivery.cached_request_items('PSScene', {'aoi': 'a'}, session, server.url, cache_path=cache, incremental=False)
+
+    assert len(incremental) == 5
+    assert full == items
+    assert server.filters[-1] == {'aoi': 'a'}
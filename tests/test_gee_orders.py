@@ -0,0 +1,103 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('planet')
+requests = pytest.importorskip('requests')
+
+from functions import gee_delivery, gee_orders
+from planet_server import PlanetServer
+
+
+class OrdersAPI:
+    '''
+    Orders API stand-in: POST /orders creates an order (400 for the names in
+    `rejected`), GET /orders/<id> moves each order one state forward per poll
+    (503 once for the (order id, poll number) in `unavailable`).
+    '''
+
+    progression = ['queued', 'running', 'running', 'success']
+
+    def __init__(self, rejected=(), unavailable=()):
+        self.rejected = set(rejected)
+        # (order id, poll number) answered 503 instead of the state
+        self.unavailable = set(unavailable)
+        self.orders = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, method, path, query, body):
+        if method == 'POST' and path == '/orders':
+            if body['name'] in self.rejected:
+                return 400, {'field': {'name': 'invalid'}}, None
+            with self.lock:
+                order_id = f'order-{len(self.orders)}'
+                self.orders[order_id] = {'body': body, 'polls': 0}
+            return 202, {'id': order_id, 'state': 'queued'}, None
+
+        if method == 'GET' and path.startswith('/orders/'):
+            order = self.orders[path.split('/')[-1]]
+            with self.lock:
+                if (path.split('/')[-1], order['polls']) in self.unavailable:
+                    self.unavailable.discard((path.split('/')[-1], order['polls']))
+                    return 503, {'message': 'unavailable'}, None
+                state = self.progression[min(order['polls'], len(self.progression) - 1)]
+                order['polls'] += 1
+            return 200, {'state': state}, None
+
+        return 404, {}, None
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(gee_orders, 'time', SimpleNamespace(sleep=delays.append))
+    monkeypatch.setattr(gee_delivery, 'time', SimpleNamespace(sleep=delays.append, time=time.time))
+    return delays
+
+
+def test_submit_orders_reports_failures(no_sleep):
+    api = OrdersAPI(rejected={'run_3of5'})
+    orders = gee_orders.build_orders('run', [f'item{i}' for i in range(10)], {}, {}, max_items=2)
+
+    with PlanetServer(api, delay=0.1) as server:
+        order_ids, failures = gee_orders.submit_orders(orders, gee_delivery.pooled_session('key'), f'{server.url}/orders', max_workers=3)
+
+    assert len(order_ids) == 4 and len(set(order_ids)) == 4
+    # Identifiants dans l'ordre des commandes
+    assert [api.orders[oid]['body']['name'] for oid in order_ids] == ['run_1of5', 'run_2of5', 'run_4of5', 'run_5of5']
+    assert list(failures) == ['run_3of5']
+    assert isinstance(failures['run_3of5'], requests.HTTPError)
+    assert 1 < server.max_active <= 3
+
+
+def test_order_images_submits_and_polls(no_sleep):
+    api = OrdersAPI()
+    item_ids = [f'item{i}' for i in range(1200)]
+
+    with PlanetServer(api) as server:
+        states, failures = gee_orders.order_images('run', item_ids, {'type': 'Polygon'}, {'google_earth_engine': {}},
+                                                   gee_delivery.pooled_session('key'), f'{server.url}/orders')
+
+    assert failures == {}
+    assert states == {f'order-{i}': 'success' for i in range(3)}
+    assert sorted(len(o['body']['products'][0]['item_ids']) for o in api.orders.values()) == [200, 500, 500]
+    assert all(o['polls'] == 4 for o in api.orders.values())
+    # Attente minimale après un changement d'état, doublée quand rien ne bouge
+    assert no_sleep == [10, 10, 20]
+
+
+def test_poll_orders_retries_unavailable_orders(no_sleep):
+    api = OrdersAPI(unavailable={('order-0', 1)})
+
+    with PlanetServer(api) as server:
+        session = gee_delivery.pooled_session('key')
+        order_ids, _ = gee_orders.submit_orders(gee_orders.build_orders('run', ['item0'], {}, {}), session, f'{server.url}/orders')
+        states = gee_orders.poll_orders(order_ids, session, f'{server.url}/orders')
+
+    # La commande indisponible garde son état et est relue au tour suivant
+    assert states == {'order-0': 'success'}
+    assert api.orders['order-0']['polls'] == 4
+    # Tours : queued, 503 (inchangé), running, running, success
+    assert no_sleep == [10, 20, 10, 20]
@@ -0,0 +1,62 @@
+import numpy as np
+
+from functions import dgo_metrics_planet, image_index
+
+INDEX = 'projects/p/assets/index/river'
+
+
+def footprints(ee):
+    # Emprises synthétiques : bandes horizontales qui se chevauchent et une image isolée dans un coin
+    ee.setGrid((20, 20))
+    rows, cols = np.indices(ee.SHAPE)
+    images = {'a': rows < 8, 'b': (rows >= 6) & (rows < 14), 'c': rows >= 12, 'd': (rows < 2) & (cols >= 18)}
+    dgos = {1: (rows < 5) & (cols < 5), 2: (rows >= 7) & (rows < 13) & (cols < 10), 3: (rows >= 15) & (cols >= 5) & (cols < 15)}
+    return ({name: ee.Image({'blue': np.zeros(ee.SHAPE)}, {'system:index': name}, footprint=mask) for name, mask in images.items()},
+            {fid: ee.Feature(ee.Geometry(mask), {'DGO_FID': fid}) for fid, mask in dgos.items()})
+
+
+def expectedPairs(images, dgos):
+    return sorted((fid, name) for fid, dgo in dgos.items() for name, image in images.items()
+                  if (dgo.geometry().mask & image.geometry().mask).any())
+
+
+def pairs(index):
+    return sorted((f.get('DGO_FID'), f.get('IMAGE')) for f in index.elements)
+
+
+def update(ee, images, dgos, run_id):
+    collection = ee.ImageCollection(list(images.values()))
+    return image_index.updateImageIndex(collection, ee.FeatureCollection(list(dgos.values())), INDEX, run_id)
+
+
+def test_index_is_built_and_completed_incrementally(ee):
+    images, dgos = footprints(ee)
+    first_images = {k: images[k] for k in 'ab'}
+    first_dgos = {k: dgos[k] for k in (1, 2)}
+
+    index = update(ee, first_images, first_dgos, 'r1')
+    assert pairs(index) == expectedPairs(first_images, first_dgos)
+    assert list(ee.data.assets) == [f'{INDEX}_r1']
+
+    # Second run : seules les paires de la nouvelle image et du nouveau DGO sont jointes et exportées
+    index = update(ee, images, dgos, 'r2')
+    assert pairs(index) == expectedPairs(images, dgos)
+    added = pairs(image_index.indexPairs(ee.FeatureCollection(f'{INDEX}_r2')))
+    assert added == sorted(set(expectedPairs(images, dgos)) - set(expectedPairs(first_images, first_dgos)))
+
+    # Rien de nouveau (y compris l'image d qui n'intersecte aucun DGO) : complément vide
+    index = update(ee, images, dgos, 'r3')
+    assert pairs(index) == expectedPairs(images, dgos)
+    assert ee.data.assets[f'{INDEX}_r3'] == []
+
+
+def test_attach_image_index(ee):
+    images, dgos = footprints(ee)
+    index = update(ee, images, dgos, 'r1')
+
+    attached = dgo_metrics_planet.attachImageIndex(ee.FeatureCollection(list(dgos.values())), index)
+
+    expected = expectedPairs(images, dgos)
+    assert {f.get('DGO_FID'): sorted(f.get('IMAGES')) for f in attached.elements} == \
+        {fid: sorted(name for f, name in expected if f == fid) for fid in dgos}
+    assert all('index' not in f.properties for f in attached.elements)
@@ -0,0 +1,193 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+gpd = pytest.importorskip('geopandas')
+
+from rasterio.transform import from_origin
+from scipy import ndimage
+from shapely.geometry import Polygon, box
+
+from functions import local_planet
+
+SCENE = '20200101_101010_00_1234_3B_AnalyticMS_SR.tif'
+
+
+def writeScene(path, shape=(300, 260), seed=0):
+    # Scène PlanetScope synthétique (bleu, vert, rouge, PIR, masque clair) à 3 m, avec un coin sans données
+    rng = np.random.default_rng(seed)
+    field = lambda: ndimage.gaussian_filter(rng.normal(size=shape), 4) * 4000
+    data = np.stack([500 + np.zeros(shape), 1000 + field(), 800 + field() * 0.75, 1000 + field(),
+                     (field() > -80).astype(float)]).clip(1, None)
+    data[:, :20, :40] = 0
+    with rasterio.open(path, 'w', driver='GTiff', height=shape[0], width=shape[1], count=5, dtype='float32',
+                       crs='EPSG:32631', transform=from_origin(600000, 5000000, 3, 3)) as dst:
+        dst.write(data.astype('float32'))
+    return str(path)
+
+
+@pytest.fixture
+def scene(tmp_path):
+    return writeScene(tmp_path / SCENE)
+
+
+@pytest.fixture
+def dgos():
+    geoms = [Polygon([(600010, 4999990), (600700, 4999500), (600500, 4999200), (600020, 4999400)]),
+             box(600100, 4999300, 600790, 4999120), box(600700, 4999150, 600900, 4998900)]
+    return gpd.GeoDataFrame({'DGO_FID': [1, 2, 3]}, geometry=geoms, crs='EPSG:32631')
+
+
+def assertSameMetrics(expected, actual):
+    assert len(expected) == len(actual)
+    for a, b in zip(expected, actual):
+        assert a.keys() == b.keys()
+        for k in a:
+            if a[k] is None or isinstance(a[k], str):
+                assert a[k] == b[k], k
+            else:
+                assert b[k] == pytest.approx(a[k], rel=1e-6), k
+
+
+@pytest.mark.parametrize('tile_size', [37, 64, 1000])
+def test_tiled_matches_in_memory(scene, dgos, tile_size):
+    full = local_planet.processImage(scene, dgos, 3, -0.05)
+    assert full[0]['WATER_POLYGONS'] > 1
+
+    assertSameMetrics(full, local_planet.processImageTiled(scene, dgos, 3, -0.05, tile_size))
+
+
+@pytest.mark.parametrize('tile_size', [None, 37])
+def test_coverage_excludes_nodata(scene, tile_size):
+    # DGO à moitié dans le coin sans données de la scène : seuls les pixels de l'emprise comptent, comme sur GEE
+    dgos = gpd.GeoDataFrame({'DGO_FID': [1]}, geometry=[box(600060, 4999940, 600180, 5000000)], crs='EPSG:32631')
+
+    if tile_size:
+        metrics = local_planet.processImageTiled(scene, dgos, 3, -0.05, tile_size)
+    else:
+        metrics = local_planet.processImage(scene, dgos, 3, -0.05)
+
+    assert metrics[0]['COVERAGE_SCORE'] == 50
+
+
+def test_component_accumulator_is_bounded():
+    # Composantes d'une grande grille ajoutée par tuiles : mêmes tailles que ndimage.label,
+    # avec un état limité aux bordures de la rangée de tuiles courante
+    rng = np.random.default_rng(1)
+    mask = ndimage.gaussian_filter(rng.normal(size=(400, 400)), 2) > 0.05
+    tile = 50
+
+    accumulator = local_planet.ComponentAccumulator()
+    largest = 0
+    for r in range(0, 400, tile):
+        for c in range(0, 400, tile):
+            accumulator.add(mask[r:r + tile, c:c + tile], r, c)
+            largest = max(largest, len(accumulator.parent))
+            assert len(accumulator.rows) <= 2
+            assert all(len(segments) <= 2 for segments in accumulator.cols.values())
+
+    labels, n = ndimage.label(mask, structure=local_planet.EIGHT_CONNECTED)
+    expected = np.bincount(labels.ravel())[1:]
+    assert sorted(accumulator.sizes()) == sorted(expected)
+    assert largest < n / 4
+
+
+def test_run_workflow_workers_and_tiles(tmp_path, dgos):
+    scenes = tmp_path / 'scenes'
+    scenes.mkdir()
+    writeScene(scenes / SCENE)
+    writeScene(scenes / SCENE.replace('20200101', '20200201'), seed=1)
+    dgo_path = tmp_path / 'dgos.gpkg'
+    dgos.to_file(dgo_path)
+
+    single = local_planet.runWorkflow(str(dgo_path), str(scenes), -0.05, str(tmp_path / 'single.csv'))
+    pooled = local_planet.runWorkflow(str(dgo_path), str(scenes), -0.05, str(tmp_path / 'pooled.csv'),
+                                      tile_size=64, workers=2, chunksize=2)
+
+    assert list(single['DATE'].unique()) == ['2020-01-01', '2020-02-01']
+    assertSameMetrics(single.to_dict('records'), pooled.to_dict('records'))
+
+
+def syntheticShapes():
+    # Formes dont le contour vectoriel est connu : carré, L, anneau (trou), carrés en contact par un coin, taches
+    shapes = {}
+    mask = np.zeros((12, 12), dtype=bool)
+    mask[2:6, 3:9] = True
+    shapes['square'] = mask.copy()
+    mask[6:10, 3:5] = True
+    shapes['L'] = mask.copy()
+    ring = np.zeros((12, 12), dtype=bool)
+    ring[1:11, 1:11] = True
+    ring[4:7, 3:8] = False
+    shapes['ring'] = ring
+    diagonal = np.zeros((12, 12), dtype=bool)
+    diagonal[2:5, 2:5] = True
+    diagonal[5:8, 5:8] = True
+    shapes['diagonal'] = diagonal
+    shapes['border'] = np.ones((12, 12), dtype=bool)
+    rng = np.random.default_rng(3)
+    shapes['blobs'] = ndimage.gaussian_filter(rng.normal(size=(60, 60)), 1.5) > 0.1
+    return shapes
+
+
+@pytest.mark.parametrize('name, mask', syntheticShapes().items())
+def test_raster_perimeter_matches_vector_outlines(name, mask):
+    # Périmètre raster (arêtes de pixels) et longueur des contours des polygones vectorisés (trous compris)
+    from rasterio import features
+    from rasterio.transform import Affine
+    from shapely.geometry import shape
+
+    scale = 3
+    polygons = [shape(geometry) for geometry, value in features.shapes(mask.astype('uint8'), mask=mask, connectivity=8,
+                                                                       transform=Affine.scale(scale))]
+    vector_perimeter = sum(polygon.length for polygon in polygons)
+
+    metrics = local_planet.polygonMetrics(mask, 'WATER', scale)
+    assert metrics['WATER_PERIMETER'] == pytest.approx(vector_perimeter)
+    assert metrics['WATER_POLYGONS'] == len(polygons)
+
+
+def test_local_metrics_match_gee_registry():
+    from functions import dgo_metrics_planet
+    assert set(local_planet.METRICS) == set(dgo_metrics_planet.METRICS)
+
+
+def test_metric_selection(scene, dgos):
+    selected = local_planet.calculateDGOsMetrics([scene], dgos, 3, -0.05, metrics=['WATER_AREA', 'THRESHOLD_NDWI'])
+    assert list(selected.columns) == ['DGO_FID', 'DATE', 'CLEAR_SCORE', 'COVERAGE_SCORE', 'WATER_AREA', 'THRESHOLD_NDWI']
+    assert (selected['THRESHOLD_NDWI'] == -0.05).all()
+
+    full = local_planet.calculateDGOsMetrics([scene], dgos, 3, -0.05)
+    assert selected['WATER_AREA'].tolist() == full['WATER_AREA'].tolist()
+
+    with pytest.raises(ValueError):
+        local_planet.calculateDGOsMetrics([scene], dgos, 3, -0.05, metrics=['WATER_VOLUME'])
+
+
+def test_vegetation_threshold(scene, dgos):
+    default = local_planet.calculateDGOsMetrics([scene], dgos, 3, -0.05)
+    strict = local_planet.calculateDGOsMetrics([scene], dgos, 3, -0.05, vegetation_threshold_ndvi=0.6)
+
+    assert (strict['VEGETATION_AREA'] <= default['VEGETATION_AREA']).all()
+    assert strict['VEGETATION_AREA'].sum() < default['VEGETATION_AREA'].sum()
+    assert strict['WATER_AREA'].tolist() == default['WATER_AREA'].tolist()
+
+
+def test_otsu_threshold_on_bimodal_values():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([rng.normal(-0.4, 0.1, 3000), rng.normal(0.3, 0.08, 1000)])
+
+    assert -0.2 < local_planet.otsuThreshold(values) < 0.1
+    assert local_planet.otsuThreshold(np.array([])) is None
+
+
+def test_histogram_read_averages_pixels(scene):
+    # Lecture à 30 m : moyenne des blocs de 10 x 10 pixels à 3 m (et non un pixel sur dix)
+    with rasterio.open(scene) as src:
+        green = src.read(2)
+    averaged = local_planet.readPlanetImage(scene, 30, resampling=local_planet.Resampling.average)
+    nearest = local_planet.readPlanetImage(scene, 30)
+
+    blocks = green[20:, 40:].reshape(28, 10, 22, 10).mean(axis=(1, 3))
+    assert np.allclose(averaged['bands']['green'][2:, 4:], blocks, rtol=1e-5)
+    assert not np.allclose(nearest['bands']['green'][2:, 4:], blocks, rtol=1e-5)
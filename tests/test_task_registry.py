@@ -0,0 +1,68 @@
+import pytest
+
+from functions import task_registry, workflow_planet
+
+
+def operation(task_id, state, description='', uris=None, project='p'):
+    return {'name': f'projects/{project}/operations/{task_id}', 'done': state in ('SUCCEEDED', 'FAILED', 'CANCELLED'),
+            'metadata': {'state': state, 'description': description, 'destinationUris': uris or []}}
+
+
+@pytest.fixture
+def manifests(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_registry, 'manifest_dir', str(tmp_path))
+
+
+def test_manifest_runs_fetch_their_own_operations(ee, manifests):
+    ee.data.operations = [
+        operation('A', 'SUCCEEDED', uris=['https://code.earthengine.google.com/?asset=projects/p/assets/run1_0']),
+        operation('B', 'RUNNING'),
+        operation('C', 'PENDING', 'Computation task 1/1 for run old'),
+    ]
+    task_registry.writeManifest('run1', backend='gee', ee_project_name='p', task_ids=['A', 'B'])
+
+    tasks = task_registry.runTasks('run1')
+    assert [(t['id'], t['state']) for t in tasks] == [('A', 'COMPLETED'), ('B', 'RUNNING')]
+    assert task_registry.completedAssets('run1', 'p') == ['projects/p/assets/run1_0']
+
+    # Seules les opérations du run sont lues, une fois par durée de validité du cache
+    assert sorted(ee.data.calls) == [('getOperation', 'projects/p/operations/A'), ('getOperation', 'projects/p/operations/B')]
+
+
+def test_operations_live_in_the_initialized_project(ee, manifests):
+    # Assets dans le projet p, opérations créées dans le projet d'ee.Initialize
+    ee.data.operations = [
+        operation('A', 'SUCCEEDED', uris=['https://code.earthengine.google.com/?asset=projects/p/assets/run1_0'], project='compute'),
+        operation('B', 'RUNNING', project='compute'),
+    ]
+    task_registry.writeManifest('run1', backend='gee', ee_project_name='p', task_ids=['A', 'B'],
+                                operation_names=['projects/compute/operations/A', 'projects/compute/operations/B'])
+
+    assert [t['state'] for t in task_registry.runTasks('run1')] == ['COMPLETED', 'RUNNING']
+    assert task_registry.completedAssets('run1', 'p') == ['projects/p/assets/run1_0']
+    assert sorted(ee.data.calls) == [('getOperation', 'projects/compute/operations/A'),
+                                     ('getOperation', 'projects/compute/operations/B')]
+
+
+def test_legacy_runs_use_one_listing(ee, manifests):
+    ee.data.operations = [
+        operation('C', 'PENDING', 'Computation task 1/2 for run old'),
+        operation('D', 'SUCCEEDED', 'Computation task 2/2 for run old'),
+        operation('E', 'RUNNING', 'Computation task 1/1 for run other'),
+    ]
+
+    # Runs sans manifeste : retrouvés par leur description dans une seule liste
+    assert [t['id'] for t in task_registry.runTasks('old')] == ['C', 'D']
+    assert [t['id'] for t in task_registry.runTasks('other')] == ['E']
+    assert ee.data.calls == [('listOperations', None)]
+
+
+def test_cancel_workflow_cancels_unfinished_operations(ee, manifests):
+    ee.data.operations = [operation('A', 'SUCCEEDED'), operation('B', 'RUNNING'), operation('C', 'PENDING')]
+    task_registry.writeManifest('run1', backend='gee', ee_project_name='p', task_ids=['A', 'B', 'C'])
+
+    workflow_planet.cancelWorkflow('run1')
+
+    cancelled = [name for call, name in ee.data.calls if call == 'cancelOperation']
+    assert cancelled == ['projects/p/operations/B', 'projects/p/operations/C']
+    assert [t['state'] for t in task_registry.runTasks('run1')] == ['COMPLETED', 'CANCEL_REQUESTED', 'CANCEL_REQUESTED']
@@ -0,0 +1,272 @@
+import os
+import threading
+from collections import Counter
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.error import HTTPError
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import task_registry, workflow_planet
+
+
+@pytest.fixture
+def manifests(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_registry, 'manifest_dir', str(tmp_path / 'runs'))
+    return tmp_path
+
+
+@pytest.mark.parametrize('gated', [False, True])
+def test_rejected_column_only_for_gated_runs(manifests, gated):
+    local_csv = manifests / 'run.local.csv'
+    pd.DataFrame({'DATE': ['2020-01-01'], 'DGO_FID': [1], 'acquired': ['2020-01-01T10:00:00'],
+                  'CLEAR_SCORE': [90.0], 'COVERAGE_SCORE': [100.0], 'WATER_AREA': [12.0]}).to_csv(local_csv, index=False)
+    task_registry.writeManifest('run', backend='local', local_csv=str(local_csv), metrics=['WATER_AREA'], gated=gated)
+
+    output = manifests / 'results.csv'
+    workflow_planet.getResults('run', 'project', str(output))
+
+    assert ('REJECTED' in pd.read_csv(output).columns) == gated
+
+
+def test_get_results_local_backend_skips_task_lookup(manifests, monkeypatch):
+    local_csv = manifests / 'run.local.csv'
+    pd.DataFrame({'DATE': ['2020-01-01'], 'DGO_FID': [1], 'acquired': ['2020-01-01T10:00:00'],
+                  'CLEAR_SCORE': [90.0], 'COVERAGE_SCORE': [100.0], 'WATER_AREA': [12.0]}).to_csv(local_csv, index=False)
+    task_registry.writeManifest('run', backend='local', local_csv=str(local_csv), metrics=['WATER_AREA'])
+
+    def no_lookup(*args, **kwargs):
+        raise AssertionError('Earth Engine tasks looked up for a local run')
+    monkeypatch.setattr(task_registry, 'completedAssets', no_lookup)
+
+    output = manifests / 'results.csv'
+    workflow_planet.getResults('run', 'project', str(output))
+
+    df = pd.read_csv(output)
+    assert df['WATER_AREA'].tolist() == [12.0]
+    assert df['DGO_FID'].tolist() == [1]
+
+
+def test_sweep_thresholds():
+    assert workflow_planet.sweepThresholds(-0.2, None) is None
+    assert workflow_planet.sweepThresholds([-0.2, 0.0], None) == ([-0.2, 0.0], [0.3])
+    # Un seuil NDVI nul est un seuil légitime
+    assert workflow_planet.sweepThresholds([-0.2, 0.0], 0.0) == ([-0.2, 0.0], [0.0])
+    assert workflow_planet.sweepThresholds(-0.2, [0.0, 0.3]) == ([-0.2], [0.0, 0.3])
+
+
+@pytest.mark.parametrize('water_threshold_ndwi, vegetation_threshold_ndvi', [('adaptive', [0.2, 0.3]), ([-0.2, 'adaptive'], None)])
+def test_sweep_rejects_adaptive_threshold(water_threshold_ndwi, vegetation_threshold_ndvi):
+    with pytest.raises(ValueError, match='adaptive'):
+        workflow_planet.startWorkflow('dgos', 'project', 'collection', water_threshold_ndwi,
+                                      vegetation_threshold_ndvi=vegetation_threshold_ndvi)
+
+
+@pytest.mark.parametrize('option', [{'metrics': ['WATER_AREA']}, {'perimeter_method': 'raster'},
+                                    {'polygon_stats': False}, {'metrics_method': 'join'}])
+def test_sweep_rejects_ignored_options(option):
+    with pytest.raises(ValueError):
+        workflow_planet.startWorkflow('dgos', 'project', 'collection', [-0.2, 0.0], **option)
+
+
+@pytest.mark.parametrize('source', ['csv', 'parquet', 'asset'])
+def test_filter_new_acquisitions(ee, tmp_path, source):
+    # Résultats précédents : 2020-01-01 et 2020-01-02 sur les DGOs 1 et 2 ; le nouveau run ajoute 2020-01-03 et le DGO 3
+    ee.setGrid((4, 4))
+    previous = pd.DataFrame({'DATE': ['2020-01-01', '2020-01-01', '2020-01-02', '2020-01-02'], 'DGO_FID': [1, 2, 1, 2],
+                             'CLEAR_SCORE': 100.0, 'COVERAGE_SCORE': 100.0})
+    if source == 'csv':
+        previous_results = str(tmp_path / 'previous.csv')
+        previous.to_csv(previous_results, index=False)
+    elif source == 'parquet':
+        previous_results = str(tmp_path / 'previous')
+        previous.to_csv(tmp_path / 'shard.csv', index=False)
+        workflow_planet.mergeParquet([tmp_path / 'shard.csv'], previous_results, list(previous.columns), 'run')
+    else:
+        previous_results = 'projects/p/assets/metrics/previous'
+        ee.data.assets[previous_results] = [ee.Feature(None, row) for row in previous.to_dict('records')]
+
+    images = ee.ImageCollection([ee.Image({'blue': np.zeros((4, 4))}, {'acquired': f'2020-01-0{day}T10:00:00'}) for day in (1, 2, 3)])
+    dgos = ee.FeatureCollection([ee.Feature(ee.Geometry(np.ones((4, 4))), {'DGO_FID': fid}) for fid in (1, 2, 3)])
+
+    jobs = workflow_planet.filterNewAcquisitions(images, dgos, previous_results)
+
+    # Nouvelles dates sur tous les DGOs, dates déjà calculées sur les nouveaux DGOs seulement
+    assert [(images.aggregate_array('DATE'), dgos.aggregate_array('DGO_FID')) for images, dgos in jobs] == [
+        (['2020-01-03'], [1, 2, 3]),
+        (['2020-01-01', '2020-01-02'], [3]),
+    ]
+
+
+def test_filter_new_acquisitions_drops_empty_jobs(ee, tmp_path):
+    ee.setGrid((4, 4))
+    previous_results = str(tmp_path / 'previous.csv')
+    pd.DataFrame({'DATE': ['2020-01-01'], 'DGO_FID': [1]}).to_csv(previous_results, index=False)
+
+    images = ee.ImageCollection([ee.Image({'blue': np.zeros((4, 4))}, {'acquired': '2020-01-01T10:00:00'})])
+    dgos = ee.FeatureCollection([ee.Feature(ee.Geometry(np.ones((4, 4))), {'DGO_FID': 1})])
+
+    assert workflow_planet.filterNewAcquisitions(images, dgos, previous_results) == []
+
+
+def test_local_backend_rejects_previous_results():
+    with pytest.raises(ValueError):
+        workflow_planet.startWorkflow('dgos.gpkg', 'project', 'scenes', -0.2, backend='local', previous_results='previous.csv')
+
+
+def test_shards_keep_calendar_days_together(ee):
+    ee.setGrid((4, 4))
+    hour = 3600 * 1000
+    day = 24 * hour
+    d1 = 18262 * day  # 2020-01-01 00:00 UTC
+    times = [d1 + 8 * hour, d1 + 10 * hour, d1 + 23 * hour, d1 + day + hour, d1 + 2 * day + 2 * hour]
+    images = ee.ImageCollection([ee.Image({'blue': np.zeros((4, 4))}, {'system:time_start': t}) for t in times])
+    dgos = ee.FeatureCollection([ee.Feature(ee.Geometry(np.ones((4, 4))), {'DGO_FID': 1})])
+
+    shards = workflow_planet.shardWorkflow(images, dgos, max_pairs_per_task=2)
+
+    windows = [[t // day for t in shard_images.aggregate_array('system:time_start')] for shard_images, _ in shards]
+    assert sorted(t for window in windows for t in window) == sorted(t // day for t in times)
+    # Aucun jour n'est partagé entre deux fenêtres
+    for i, window in enumerate(windows):
+        for other in windows[i + 1:]:
+            assert not set(window) & set(other)
+    assert windows[0].count(d1 // day) == 3
+
+
+######
+## Downloads against a local HTTP server
+
+class AssetServer:
+    '''
+    Local stand-in of the Earth Engine download URLs: serves one CSV per asset,
+    answers 503 to the first `failures[name]` requests of an asset and records
+    the number of simultaneous requests.
+    '''
+
+    def __init__(self, files, failures=None, delay=0.1):
+        self.files = files
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.requests = Counter()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = self.path.strip('/')
+                with server.lock:
+                    server.requests[name] += 1
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    failing = server.failures.get(name, 0) >= server.requests[name]
+                threading.Event().wait(server.delay)
+                with server.lock:
+                    server.active -= 1
+
+                if name not in server.files:
+                    self.send_error(404)
+                elif failing:
+                    self.send_error(503)
+                else:
+                    body = server.files[name].encode()
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class DownloadableAsset:
+    # Asset dont l'URL de téléchargement pointe vers le serveur local
+    def __init__(self, server, name):
+        self.server, self.name = server, name
+
+    def select(self, propertySelectors, retainGeometry=True):
+        return self
+
+    def getDownloadUrl(self):
+        return f'{self.server.url}/{self.name.split("/")[-1]}'
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(workflow_planet.time, 'sleep', delays.append)
+    return delays
+
+
+def shardCSV(fid):
+    return pd.DataFrame({'DATE': ['2020-01-01'], 'DGO_FID': [fid], 'acquired': ['2020-01-01T10:00:00'],
+                         'CLEAR_SCORE': [90.0], 'COVERAGE_SCORE': [100.0], 'WATER_AREA': [float(fid)]}).to_csv(index=False)
+
+
+def test_download_file_retries_server_errors(tmp_path, no_backoff):
+    with AssetServer({'a': 'x,y\n1,2\n'}, failures={'a': 2}) as server:
+        path = workflow_planet.downloadFile(f'{server.url}/a', str(tmp_path / 'a.csv'), timeout=5, retries=4)
+
+    assert open(path).read() == 'x,y\n1,2\n'
+    assert server.requests['a'] == 3
+    assert no_backoff == [1, 2]
+    assert not os.path.exists(f'{path}.part')
+
+
+def test_download_file_does_not_retry_client_errors(tmp_path, no_backoff):
+    with AssetServer({}) as server:
+        with pytest.raises(HTTPError):
+            workflow_planet.downloadFile(f'{server.url}/missing', str(tmp_path / 'missing.csv'), timeout=5, retries=4)
+
+    assert server.requests['missing'] == 1
+    assert no_backoff == []
+
+
+def test_get_results_downloads_concurrently(tmp_path, manifests, monkeypatch, no_backoff):
+    assets = [f'projects/p/assets/shard_{i}' for i in range(8)]
+    files = {f'shard_{i}': shardCSV(i) for i in range(8)}
+    monkeypatch.setattr(workflow_planet, 'tempdir', str(tmp_path))
+    monkeypatch.setattr(task_registry, 'completedAssets', lambda run_id, project: assets)
+
+    with AssetServer(files, failures={'shard_3': 1}) as server:
+        monkeypatch.setattr(workflow_planet, 'ee', SimpleNamespace(FeatureCollection=partial(DownloadableAsset, server)))
+        output = tmp_path / 'results.csv'
+        workflow_planet.getResults('run', 'p', str(output), download_workers=4, timeout=5, metrics=['WATER_AREA'])
+
+    df = pd.read_csv(output)
+    assert sorted(df['DGO_FID']) == list(range(8))
+    assert 1 < server.max_active <= 4
+    assert server.requests['shard_3'] == 2
+
+
+def test_dedup_across_shards(tmp_path):
+    # Deux scènes du même DGO à la même date, exportées dans deux shards différents
+    rows = [('2020-01-01', 1, 80.0, 60.0), ('2020-01-02', 1, 90.0, 100.0), ('2020-01-01', 2, 50.0, 100.0)]
+    first = pd.DataFrame(rows, columns=['DATE', 'DGO_FID', 'CLEAR_SCORE', 'COVERAGE_SCORE'])
+    second = pd.DataFrame([('2020-01-01', 1, 70.0, 95.0)], columns=first.columns)
+    shards = [tmp_path / 'a.csv', tmp_path / 'b.csv']
+    first.to_csv(shards[0], index=False)
+    second.to_csv(shards[1], index=False)
+
+    output = tmp_path / 'results.csv'
+    workflow_planet.mergeCSV(shards, output, ['DATE', 'DGO_FID', 'CLEAR_SCORE', 'COVERAGE_SCORE'], dedup=True)
+
+    df = pd.read_csv(output).sort_values(['DGO_FID', 'DATE'])
+    assert df.values.tolist() == [['2020-01-01', 1, 70.0, 95.0], ['2020-01-02', 1, 90.0, 100.0], ['2020-01-01', 2, 50.0, 100.0]]